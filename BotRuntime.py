@@ -0,0 +1,147 @@
+import os
+import random
+import signal
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+def pin_current_thread(cpu: int) -> bool:
+    """將目前執行緒綁定到指定 CPU 核心（僅 Linux 支援）"""
+    if not hasattr(os, "sched_setaffinity"):
+        print(f"⚠️ 此平台不支援 CPU 綁定，忽略 pin_cpu={cpu}")
+        return False
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError as e:
+        print(f"⚠️ CPU 綁定失敗（cpu={cpu}）：{e}")
+        return False
+    print(f"✅ strategy worker 已綁定 CPU {cpu}")
+    return True
+
+
+class FakeQuoteSource:
+    """
+    離線假行情：
+    - 以隨機漫步產生類似 shioaji TickFOPv1 的物件（close、volume、bid_price、ask_price、datetime）
+    - 以背景執行緒呼叫與實盤相同的 tick callback(exchange, tick)
+    - count 用完後自動觸發 on_finished（例如通知 runtime 結束）
+    """
+
+    def __init__(self, callback, start_price: float = 22000.0, interval: float = 0.2, count: int | None = None,
+                 seed: int | None = None, start_time: datetime | None = None, on_finished=None):
+        self.callback = callback
+        self.price = start_price
+        self.interval = interval
+        self.count = count
+        self.on_finished = on_finished
+        self._random = random.Random(seed)
+        self._time = start_time
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _next_tick(self):
+        self.price += self._random.choice([-3, -2, -1, 0, 0, 1, 2, 3])
+        if self._time is None:
+            ts = datetime.now()
+        else:
+            self._time += timedelta(seconds=self.interval)
+            ts = self._time
+        return SimpleNamespace(
+            close=self.price,
+            volume=self._random.randint(1, 10),
+            bid_price=self.price - 1,
+            ask_price=self.price + 1,
+            datetime=ts
+        )
+
+    def _run(self):
+        sent = 0
+        while not self._stop.is_set() and (self.count is None or sent < self.count):
+            self.callback("TAIFEX", self._next_tick())
+            sent += 1
+            if self.interval > 0:
+                self._stop.wait(self.interval)
+        if self.on_finished and not self._stop.is_set():
+            self.on_finished()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fake-quote", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+class BotRuntime:
+    """
+    執行期入口：
+    - 主執行緒阻塞在 Event 上等待，不再 busy-wait 佔滿 CPU
+    - 處理 SIGINT / SIGTERM，收到後依序：停止行情 → 清空 tick 佇列 → 關閉 TickRecorder（寫出 buffer）→ 關閉 TradeLogger → 執行 shutdown hooks（退訂、登出）
+    - pin_cpu 可將 strategy worker 綁定到指定核心
+    """
+
+    def __init__(self, ingestor, tick_recorder=None, trade_logger=None, quote_source=None, pin_cpu: int | None = None):
+        self.ingestor = ingestor
+        self.tick_recorder = tick_recorder
+        self.trade_logger = trade_logger
+        self.quote_source = quote_source
+        self.pin_cpu = pin_cpu
+        self.shutdown_hooks = []
+        self._stop_event = threading.Event()
+        self._shutdown_lock = threading.Lock()
+        self._shut_down = False
+
+    def add_shutdown_hook(self, hook):
+        """註冊關閉時執行的函式（例如退訂合約、登出）"""
+        self.shutdown_hooks.append(hook)
+
+    def request_stop(self, *_):
+        self._stop_event.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGINT, self.request_stop)
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, self.request_stop)
+
+    def start(self):
+        if self.pin_cpu is not None:
+            self.ingestor.on_start = lambda: pin_current_thread(self.pin_cpu)
+        self.ingestor.start()
+        if self.quote_source is not None:
+            self.quote_source.start()
+
+    def run(self):
+        """啟動並阻塞到收到停止訊號，最後執行 shutdown()"""
+        if threading.current_thread() is threading.main_thread():
+            self.install_signal_handlers()
+        self.start()
+        print("🚀 等待 Tick 資料中...（Ctrl+C 結束）")
+        try:
+            # 以 timeout 分段等待，Windows 上才能即時響應 Ctrl+C
+            while not self._stop_event.wait(1.0):
+                pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        with self._shutdown_lock:
+            if self._shut_down:
+                return
+            self._shut_down = True
+        print("🛑 收到停止訊號，開始關閉...")
+        if self.quote_source is not None:
+            self.quote_source.stop()
+        self.ingestor.stop(drain=True)
+        if self.tick_recorder:
+            self.tick_recorder.close()
+        if self.trade_logger:
+            self.trade_logger.close()
+        for hook in self.shutdown_hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"⚠️ shutdown hook 失敗：{e}")
+        print(f"✅ 已關閉｜佇列統計：{self.ingestor.stats()}")
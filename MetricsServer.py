@@ -0,0 +1,159 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MetricsServer:
+    """
+    本機監控端點（Prometheus text format，GET /metrics）：
+    - 獨立 HTTP 執行緒，只在被抓取時讀取現有物件的屬性組出文字，tick 迴圈完全不需配合
+    - 內容：tick 數、佇列統計、各階段延遲分位數（有啟用 LatencyMonitor 時）、
+      StrategyState 持倉狀態、已實現／未實現損益與累計績效、連敗次數與停單時間、recorder / logger 未寫出筆數
+    - 抓取本身不改變任何狀態：每秒 tick 數請以 rate(mfbot_ticks_processed_total[1m]) 計算
+    - 預設只綁 127.0.0.1；port=0 由系統挑選（實際 port 見 self.port）
+    """
+
+    PREFIX = "mfbot"
+    DIRECTIONS = {"long": 1, "short": -1}
+
+    def __init__(self, tick_engine, ingestor=None, tick_recorder=None, trade_logger=None,
+                 host: str = "127.0.0.1", port: int = 9108):
+        self.tick_engine = tick_engine
+        self.ingestor = ingestor
+        self.tick_recorder = tick_recorder
+        self.trade_logger = trade_logger
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    # ====== 指標收集 ======
+    def collect(self) -> str:
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            full = f"{self.PREFIX}_{name}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for labels, value in samples:
+                label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+                lines.append(f"{full}{label_text} {_format_value(value)}")
+
+        engine = self.tick_engine
+        state = engine.state
+
+        # ---- tick 與佇列 ----
+        metric("ticks_processed_total", "counter", "TickEngine 已處理的 tick 數", [({}, engine.tick_count)])
+        if self.ingestor is not None:
+            stats = self.ingestor.stats()
+            metric("queue_depth", "gauge", "tick 佇列目前深度", [({}, stats["depth"])])
+            metric("queue_max_depth", "gauge", "tick 佇列最大深度", [({}, stats["max_depth"])])
+            for key in ("received", "processed", "dropped", "coalesced", "errors"):
+                metric(f"queue_{key}_total", "counter", f"tick 佇列 {key} 筆數", [({}, stats[key])])
+
+        # ---- 各階段延遲（µs）----
+        latency = engine.latency
+        if latency is not None:
+            samples, totals = [], []
+            for stage, h in latency.histograms.items():
+                if h.count:
+                    samples += [({"stage": stage, "quantile": q}, h.percentile(q * 100) / 1000) for q in (0.5, 0.99)]
+                    samples.append(({"stage": stage, "quantile": 1}, h.max / 1000))
+                    totals.append((stage, h.total / 1000, h.count))
+            metric("stage_latency_microseconds", "summary", "tick 流水線各階段延遲（quantile=1 為最大值）", samples)
+            name = f"{self.PREFIX}_stage_latency_microseconds"
+            for stage, total, count in totals:
+                lines.append(f'{name}_sum{{stage="{stage}"}} {_format_value(total)}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        # ---- 持倉狀態 ----
+        status = state.get_status()
+        last_price = engine.close_prices.last()
+        in_position = bool(status["in_position"])
+        metric("in_position", "gauge", "是否持倉", [({}, in_position)])
+        metric("position_direction", "gauge", "持倉方向（1 多、-1 空、0 無）",
+               [({}, self.DIRECTIONS.get(status["direction"], 0) if in_position else 0)])
+        metric("position_size", "gauge", "持倉口數", [({}, status["current_position_size"] if in_position else 0)])
+        metric("entry_price", "gauge", "進場價（無持倉為 0）", [({}, status["entry_price"] if in_position else 0)])
+        metric("ticks_since_entry", "gauge", "進場後經過的 tick 數", [({}, status["tick_since_entry"])])
+        metric("position_max_profit", "gauge", "本筆持倉最大浮盈（點）", [({}, status["max_profit"])])
+        metric("position_max_loss", "gauge", "本筆持倉最大浮虧（點）", [({}, status["max_loss"])])
+        unrealized = state.get_unrealized_profit(last_price) if in_position and last_price is not None else 0.0
+        metric("unrealized_pnl", "gauge", "未實現損益（點，依最新成交價）", [({}, unrealized)])
+        if last_price is not None:
+            metric("last_price", "gauge", "最新成交價", [({}, last_price)])
+
+        # ---- 累計績效 ----
+        performance = engine.performance
+        if performance is not None:
+            m = performance.metrics()
+            metric("trades_total", "counter", "已平倉筆數", [({}, m["trades"])])
+            metric("realized_pnl", "gauge", "累計已實現淨損益（扣手續費）", [({}, m["total_pnl"])])
+            metric("win_rate_percent", "gauge", "勝率（%）", [({}, m["win_rate"])])
+            metric("max_drawdown", "gauge", "累計淨損益最大回撤", [({}, m["max_drawdown"])])
+
+        # ---- 風控 ----
+        disable_until = state.disable_until
+        metric("consecutive_losses", "gauge", "目前連續虧損筆數", [({}, state.consecutive_losses)])
+        metric("disable_until_timestamp_seconds", "gauge", "連敗停單到期時間（Unix 秒，未停單為 0）",
+               [({}, disable_until.timestamp() if disable_until else 0)])
+        metric("trading_disabled", "gauge", "目前是否因連敗停單",
+               [({}, bool(disable_until and state.clock.now() < disable_until))])
+
+        # ---- 記錄器 ----
+        if self.tick_recorder is not None:
+            metric("tick_recorder_buffered", "gauge", "TickRecorder 尚未寫出的筆數", [({}, self.tick_recorder.buffered)])
+        if self.trade_logger is not None:
+            metric("trade_logger_buffered", "gauge", "TradeLogger 尚未寫出的筆數", [({}, self.trade_logger.buffered)])
+            metric("trade_logger_write_errors_total", "counter", "TradeLogger 寫檔失敗次數", [({}, self.trade_logger.write_errors)])
+        return "\n".join(lines) + "\n"
+
+    # ====== HTTP ======
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    body = server.collect().encode("utf-8")
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        print(f"✅ 監控端點：http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
@@ -36,15 +36,16 @@ class StrategyLoop:
             {"price": 27210, "volume": 30, "bid": 27209, "ask": 27211, "timestamp": datetime.now(), "rsi": 50}
         ]
 
+        last = None
         for tick in ticks:
-            self.tick_engine.on_tick(tick)
+            last = self.tick_engine.on_tick(tick)
             time.sleep(1)
 
         # 模擬結束後保險檢查：若還有持倉，強制平倉
         if self.state.in_position:
             print("[FORCE_EXIT] 模擬結束仍有持倉，強制平倉")
-            self.logger.log("EXIT", self.state.get_status(), ticks[-1]["price"], ticks[-1])
-            self.state.exit(ticks[-1]["price"])
+            self.logger.log("EXIT", self.state.get_status(), last.price, last)
+            self.state.exit(last.price)
 
     def run(self):
         self.initialize()
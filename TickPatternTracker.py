@@ -1,12 +1,12 @@
+from RingBuffer import RingBuffer
+
 class TickPatternTracker:
-    def __init__(self):
-        self.prices = []
+    def __init__(self, capacity: int = 50):
+        self.prices = RingBuffer(capacity)  # 保留最近 50 筆
 
     def update(self, price: float):
         """更新價格序列"""
         self.prices.append(price)
-        if len(self.prices) > 50:  # 保留最近 50 筆
-            self.prices.pop(0)
 
     def get_momentum(self) -> float:
         """計算最新動能（最後一筆與前一筆差值）"""
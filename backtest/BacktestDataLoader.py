@@ -1,70 +1,202 @@
 # strategy_v4/backtest/BacktestDataLoader.py
 
+import numpy as np
 import pandas as pd
-from typing import List, Dict
-from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from TickRecord import TickRecord
+
+# 欄位名稱先轉小寫，再套用別名
+COLUMN_ALIASES = {
+    "date": "timestamp",
+    "datetime": "timestamp",
+    "ts": "timestamp",
+    "time": "timestamp",
+    "close": "price",
+}
+
+# OHLCV 之外，預留給 IndicatorEngine 的指標欄位
+INDICATOR_COLUMNS = [
+    "rsi", "macd", "macd_signal", "kd_k", "kd_d", "atr", "adx", "vwap",
+    "ema5", "ema20", "bband_pos", "bband_width", "vol_roc",
+    "rsi_1m", "ema_1m", "rsi_5m", "ema_5m", "rsi_15m", "ema_15m",
+]
+PRICE_COLUMNS = ["price", "volume", "open", "high", "low"]
+
+
+class TickBatch:
+    """
+    欄位式 tick 批次：
+    - timestamp 為 datetime64[ns]，其餘為 float64（缺值為 NaN）
+    - 缺少的指標欄位不建立陣列，columns 只列出實際存在的欄位
+    - iter_ticks() 以 generator 逐筆產生精簡 tick dict；to_ticks() 產生舊格式完整 dict
+    - iter_records() 直接由欄位陣列建立 TickRecord（內容同 iter_ticks），回測餵 TickEngine 時不經過逐筆 dict
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        self._py_timestamps = None
+
+    def __len__(self):
+        return len(self.columns["price"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.iter_ticks()
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.columns)
+
+    def timestamps(self) -> np.ndarray:
+        """轉成 Python datetime（object 陣列），只轉一次"""
+        if self._py_timestamps is None:
+            self._py_timestamps = pd.DatetimeIndex(self.columns["timestamp"]).to_pydatetime()
+        return self._py_timestamps
+
+    def slice(self, start: int, stop: int) -> "TickBatch":
+        """零複製切片（各欄位為 view）"""
+        return TickBatch({k: v[start:stop] for k, v in self.columns.items()})
+
+    def _tick_names(self, fields: List[str] | None) -> List[str]:
+        return [n for n in (fields or PRICE_COLUMNS + INDICATOR_COLUMNS) if n in self.columns and n != "timestamp"]
+
+    def iter_ticks(self, fields: List[str] | None = None) -> Iterator[Dict]:
+        """逐筆產生 tick（timestamp、price、volume、open、high、low 與已存在的指標欄位）"""
+        names = self._tick_names(fields)
+        values = [self.columns[n].tolist() for n in names]
+        for ts, row in zip(self.timestamps(), zip(*values)):
+            tick = dict(zip(names, row))
+            tick["timestamp"] = ts
+            yield tick
+
+    def iter_records(self, fields: List[str] | None = None) -> Iterator[TickRecord]:
+        """逐筆產生 TickRecord（欄位同 iter_ticks）；只有 price / volume 時直接以位置參數建立"""
+        tick_names = self._tick_names(fields)
+        names = [n for n in tick_names if n not in ("price", "volume")]
+        prices = self.columns["price"].tolist()
+        volumes = self.columns["volume"].tolist() if "volume" in tick_names else [0.0] * len(prices)
+        if not names:
+            yield from map(TickRecord, self.timestamps(), prices, volumes)
+            return
+        values = [self.columns[n].tolist() for n in names]
+        for ts, price, volume, row in zip(self.timestamps(), prices, volumes, zip(*values)):
+            record = TickRecord(ts, price, volume)
+            for name, value in zip(names, row):
+                record[name] = value
+            yield record
+
+    def tick(self, index: int, fields: List[str] | None = None) -> Dict:
+        """第 index 筆 tick（內容同 iter_ticks 產生的 dict），供只需少數幾筆的事件驅動回測"""
+        tick = {n: self.columns[n][index].item() for n in self._tick_names(fields)}
+        tick["timestamp"] = self.timestamps()[index]
+        return tick
+
+    def to_ticks(self) -> List[Dict]:
+        """舊格式：每筆包含全部預留欄位，缺值為 None"""
+        ticks = []
+        for tick in self.iter_ticks():
+            for name in PRICE_COLUMNS:
+                tick.setdefault(name, 0.0)
+            for name in INDICATOR_COLUMNS:
+                value = tick.get(name)
+                tick[name] = None if value is None or value != value else value
+            ticks.append(tick)
+        return ticks
+
 
 class BacktestDataLoader:
     """
     回測資料載入器：
-    - 從 CSV 或 DataFrame 載入 K 線資料
-    - 轉換成 tick 格式供 BacktestRunner 使用
+    - 從 CSV、Parquet、pandas DataFrame、Polars DataFrame / LazyFrame 載入 K 線資料
+    - 欄位名稱一次正規化（小寫 + 別名），以欄位為單位轉成 NumPy 陣列（不逐列迭代）
+    - to_batch() 回傳 TickBatch；iter_ticks() 為惰性 generator；to_ticks() 保留舊的 list[dict] 介面
     """
 
-    def __init__(self, file_path: str | None = None, df: pd.DataFrame | None = None):
+    def __init__(self, file_path: str | None = None, df=None):
         self.file_path = file_path
         self.df = df
 
     def load(self) -> pd.DataFrame:
-        """載入資料"""
+        """載入資料（pandas）"""
         if self.df is not None:
-            return self.df
+            if isinstance(self.df, pd.DataFrame):
+                return self.df
+            return self._load_polars(self.df).to_pandas()
         if self.file_path:
+            if Path(self.file_path).suffix.lower() == ".parquet":
+                return pd.read_parquet(self.file_path)
             return pd.read_csv(self.file_path)
         raise ValueError("必須提供 file_path 或 df")
 
-    def to_ticks(self) -> List[Dict]:
-        """轉換成 tick 格式"""
-        df = self.load()
+    @staticmethod
+    def _normalize_names(names) -> Dict[str, str]:
+        """原始欄位 → 正規化欄位；同名衝突時保留已存在的正式名稱（例如同時有 price 與 close）"""
+        lowered = {name: str(name).lower() for name in names}
+        present = set(lowered.values())
+        mapping = {}
+        for name, low in lowered.items():
+            target = COLUMN_ALIASES.get(low, low)
+            if target != low and target in present:
+                continue
+            if target in mapping.values():
+                continue
+            mapping[name] = target
+        return mapping
 
-        ticks = []
-        for _, row in df.iterrows():
-            tick = {
-                "timestamp": self._parse_time(row.get("timestamp") or row.get("Date")),
-                "price": float(row.get("close") or row.get("Close")),
-                "volume": float(row.get("volume") or row.get("Volume", 0)),
-                "open": float(row.get("open") or row.get("Open", 0)),
-                "high": float(row.get("high") or row.get("High", 0)),
-                "low": float(row.get("low") or row.get("Low", 0)),
-                # 預留指標欄位，方便 IndicatorEngine 使用
-                "rsi": row.get("rsi", None),
-                "macd": row.get("macd", None),
-                "macd_signal": row.get("macd_signal", None),
-                "kd_k": row.get("kd_k", None),
-                "kd_d": row.get("kd_d", None),
-                "atr": row.get("atr", None),
-                "adx": row.get("adx", None),
-                "vwap": row.get("vwap", None),
-                "ema5": row.get("ema5", None),
-                "ema20": row.get("ema20", None),
-                "bband_pos": row.get("bband_pos", None),
-                "bband_width": row.get("bband_width", None),
-                "vol_roc": row.get("vol_roc", None),
-                "rsi_1m": row.get("rsi_1m", None),
-                "ema_1m": row.get("ema_1m", None),
-                "rsi_5m": row.get("rsi_5m", None),
-                "ema_5m": row.get("ema_5m", None),
-                "rsi_15m": row.get("rsi_15m", None),
-                "ema_15m": row.get("ema_15m", None),
-            }
-            ticks.append(tick)
-        return ticks
+    def _load_polars(self, frame):
+        """Polars DataFrame / LazyFrame：先在 lazy 階段改名與挑欄位，再 collect"""
+        import polars as pl
+        lazy = frame.lazy() if isinstance(frame, pl.DataFrame) else frame
+        mapping = self._normalize_names(lazy.collect_schema().names())
+        wanted = set(["timestamp"] + PRICE_COLUMNS + INDICATOR_COLUMNS)
+        lazy = lazy.select([pl.col(src).alias(dst) for src, dst in mapping.items() if dst in wanted])
+        return lazy.collect()
+
+    def to_batch(self) -> TickBatch:
+        """轉成欄位式 TickBatch"""
+        if self.df is not None and not isinstance(self.df, pd.DataFrame):
+            df = self._load_polars(self.df).to_pandas()
+        elif self.df is None and self.file_path and Path(self.file_path).suffix.lower() == ".parquet":
+            import polars as pl
+            df = self._load_polars(pl.scan_parquet(self.file_path)).to_pandas()
+        else:
+            df = self.load()
+            df = df.rename(columns=self._normalize_names(df.columns))
+
+        if "price" not in df.columns:
+            raise ValueError("資料缺少 close / price 欄位")
+        if "timestamp" not in df.columns:
+            raise ValueError("資料缺少 timestamp / Date 欄位")
+
+        timestamps = pd.to_datetime(df["timestamp"], errors="coerce")
+        valid = timestamps.notna().to_numpy()
+        if not valid.all():
+            print(f"⚠️ 有 {int((~valid).sum())} 筆 timestamp 無法解析，已略過")
 
-    def _parse_time(self, ts) -> datetime:
-        """轉換 timestamp"""
-        if isinstance(ts, datetime):
-            return ts
-        try:
-            return pd.to_datetime(ts)
-        except Exception:
-            return datetime.now()
+        columns = {"timestamp": timestamps.to_numpy(dtype="datetime64[ns]")[valid]}
+        for name in PRICE_COLUMNS + INDICATOR_COLUMNS:
+            if name in df.columns:
+                values = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                columns[name] = values[valid]
+            elif name == "volume":
+                columns[name] = np.zeros(int(valid.sum()), dtype=np.float64)
+        return TickBatch(columns)
+
+    def iter_ticks(self) -> Iterator[Dict]:
+        """惰性產生 tick（精簡欄位）"""
+        return self.to_batch().iter_ticks()
+
+    def tick(self, index: int, fields: List[str] | None = None) -> Dict:
+        """第 index 筆 tick（同 TickBatch.tick）"""
+        return self.to_batch().tick(index, fields)
+
+    def to_ticks(self) -> List[Dict]:
+        """轉換成 tick 格式（舊介面）"""
+        return self.to_batch().to_ticks()
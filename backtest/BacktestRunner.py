@@ -0,0 +1,272 @@
+# strategy_v4/backtest/BacktestRunner.py
+
+import contextlib
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from BacktestDataLoader import TickBatch
+from Clock import SimulatedClock, to_datetime
+from FeatureMatrix import FEATURE_COLUMNS, build_feature_matrix, decode_feature_row
+from StrategyLogging import silent
+from StrategyState import StrategyState
+from TickEngine import TickEngine
+from TickRecord import TickRecord
+from TickRecorder import MemoryTickRecorder
+from TradeAnalyzer import TradeAnalyzer
+from TradeLogger import MemoryTradeLogger
+
+
+class _NullWriter:
+    """丟棄所有輸出（回測時取代 stdout）"""
+
+    def write(self, _):
+        return 0
+
+    def flush(self):
+        pass
+
+
+@dataclass
+class BacktestResult:
+    mode: str
+    tick_count: int
+    elapsed: float
+    ticks_per_sec: float
+    trade_rows: List[Dict[str, Any]] = field(default_factory=list)
+    trades: List[Dict[str, Any]] = field(default_factory=list)
+    tick_rows: List[List[Any]] = field(default_factory=list)
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> Dict[str, Any]:
+        """單行摘要（給 ReportExporter / Optimizer 用）"""
+        return {
+            "mode": self.mode,
+            "ticks": self.tick_count,
+            "ticks_per_sec": round(self.ticks_per_sec, 1),
+            **self.metrics
+        }
+
+
+class BacktestRunner:
+    """
+    無介面回測執行器：
+    - 依序將 ticks 餵給 TickEngine，時間以 SimulatedClock 推進（冷卻、持倉秒數依 tick 時間）
+    - mode：rule_based（DecisionEngine）或 regression_based（DecisionEngine_v2，權重來自 params_store）
+    - 交易與 tick 紀錄寫入記憶體（MemoryTradeLogger / MemoryTickRecorder），不產生 CSV
+    - quiet=True 時策略 log 切到 silent（不建立任何 LogRecord），其餘 print 一併吞掉
+    - 結束時若仍持倉，以最後一筆價格強制平倉，回傳 BacktestResult（含實測 ticks/sec）
+    - 傳入 features（build_feature_matrix 的結果）時不再逐筆計算指標，供 Optimizer 重複使用
+    - 設定 feature_cache 且 ticks 為 TickBatch 時，指標矩陣自動從 FeatureCache 取得（沒有才計算）
+    - rule_based + quiet + 不記錄 tick 時走事件驅動路徑（event_driven=False 可關閉），交易紀錄與逐筆 TickEngine 相同
+    """
+
+    STATE_PARAMS = ("cooldown_seconds", "hard_stoploss", "hard_time_seconds", "max_ticks_hold", "max_position_size")
+
+    def __init__(self, mode: str = "rule_based", state_params: Dict[str, Any] | None = None,
+                 decision_params: Dict[str, Any] | None = None, record_ticks: bool = False,
+                 quiet: bool = True, market_bias: str = "auto", feature_cache=None, params_store=None,
+                 event_driven: bool = True):
+        if mode not in ("rule_based", "regression_based"):
+            raise ValueError(f"尚未支援的回測模式：{mode}")
+        self.mode = mode
+        self.state_params = dict(state_params or {})
+        self.decision_params = dict(decision_params or {})
+        self.record_ticks = record_ticks
+        self.quiet = quiet
+        self.market_bias = market_bias
+        self.feature_cache = feature_cache
+        self.params_store = params_store
+        self.event_driven = event_driven
+
+        unknown = set(self.state_params) - set(self.STATE_PARAMS)
+        if unknown:
+            raise ValueError(f"未知的 StrategyState 參數：{sorted(unknown)}")
+
+    def build_engine(self, clock: SimulatedClock) -> TickEngine:
+        state = StrategyState(clock=clock)
+        for key, value in self.state_params.items():
+            setattr(state, key, value)
+        tick_recorder = MemoryTickRecorder(clock=clock, keep_rows=self.record_ticks)
+        trade_logger = MemoryTradeLogger(tick_recorder=tick_recorder, clock=clock)
+        engine = TickEngine(state, self.market_bias, {}, trade_logger, tick_recorder, clock=clock,
+                            verbose=not self.quiet, mode=self.mode, params_store=self.params_store)
+        engine.decision_cfg.update(self.decision_params)
+        return engine
+
+    def run(self, ticks: Iterable[Dict[str, Any]], features=None) -> BacktestResult:
+        clock = SimulatedClock()
+        engine = self.build_engine(clock)
+        if features is None and self.feature_cache is not None and isinstance(ticks, TickBatch):
+            features = self.feature_cache.get(ticks)
+
+        out = contextlib.ExitStack()
+        if self.quiet:
+            out.enter_context(silent())
+            out.enter_context(contextlib.redirect_stdout(_NullWriter()))
+        start = time.perf_counter()
+        with out:
+            if self._use_events():
+                count = self._run_events(engine, ticks, features)
+            else:
+                count = self._run_ticks(engine, ticks, features)
+        elapsed = time.perf_counter() - start
+
+        trade_rows = engine.logger.rows
+        analyzer = TradeAnalyzer(fee_per_trade=2.1)
+        analyzer.analyze(trade_rows)
+
+        return BacktestResult(
+            mode=self.mode,
+            tick_count=count,
+            elapsed=elapsed,
+            ticks_per_sec=count / elapsed if elapsed > 0 else 0.0,
+            trade_rows=trade_rows,
+            trades=analyzer.results,
+            tick_rows=engine.tick_recorder.rows,
+            metrics=self._metrics(analyzer.results)
+        )
+
+    def _use_events(self) -> bool:
+        return self.event_driven and self.mode == "rule_based" and self.quiet and not self.record_ticks
+
+    @staticmethod
+    def _run_ticks(engine: TickEngine, ticks: Iterable[Dict[str, Any]], features) -> int:
+        """逐筆餵給 TickEngine；結束時仍持倉以最後一筆強制平倉（TickBatch 直接由欄位陣列建立 TickRecord）"""
+        if features is not None:
+            engine.attach_features(features)
+        if isinstance(ticks, TickBatch):
+            ticks = ticks.iter_records()
+        on_tick = engine.on_tick
+        count = 0
+        last = None
+        for tick in ticks:
+            last = on_tick(tick)
+            count += 1
+        if last is not None and engine.state.in_position:
+            engine.logger.log("EXIT", engine.state.get_status(), last.price, last)
+            engine.state.exit(last.price)
+        return count
+
+    def _run_events(self, engine: TickEngine, ticks: Iterable[Dict[str, Any]], features) -> int:
+        """
+        事件驅動回測（rule_based）：
+        - 指標矩陣一次算好，進場訊號由 DecisionEngine.evaluate_batch 整批算出
+        - 空手時直接跳到下一個進場訊號；持倉期間才逐筆推進 StrategyState 檢查出場（順序同 TickEngine._handle_position）
+        - 只有寫入交易紀錄的 tick 才建立 TickRecord；時鐘推進到該筆之前出現過的最大時間
+        - 冷卻中的進場訊號同樣記一筆 ENTER（與 TickEngine 行為一致）
+        """
+        if isinstance(ticks, TickBatch):
+            tick_at = ticks.tick
+            prices = ticks["price"].tolist()
+            volumes = ticks["volume"] if "volume" in ticks else np.zeros(len(ticks))
+            stamps = list(ticks.timestamps())
+        else:
+            ticks = ticks if isinstance(ticks, (list, tuple)) else list(ticks)
+            tick_at = ticks.__getitem__
+            prices = [float(tick["price"]) for tick in ticks]
+            volumes = np.array([tick.get("volume", 0.0) for tick in ticks], dtype=np.float64)
+            stamps = [to_datetime(tick["timestamp"]) for tick in ticks]
+        n = len(prices)
+        if not n:
+            return 0
+        if features is None:
+            features = build_feature_matrix(stamps, prices, volumes)
+
+        decision = engine.decision_engine
+        signals = decision.evaluate_batch(features, volume=volumes)
+        entry_score = signals["entry_score"].tolist()
+        momentum = signals["momentum"].tolist()
+        direction_score = signals["direction_score"].tolist()
+        bias = signals["bias"].tolist()
+        atr = features[:, FEATURE_COLUMNS.index("atr")].tolist()
+        candidates = np.flatnonzero(signals["enter"])
+        market_bias = decision.market_bias
+        state, logger, clock = engine.state, engine.logger, engine.clock
+
+        def record(i: int, flat: bool) -> TickRecord:
+            # 與 TickEngine.on_tick 在第 i 筆寫入的欄位相同
+            tick = TickRecord.from_dict(tick_at(i))
+            values = decode_feature_row(features[i].tolist())
+            tick.set_indicators(values)
+            tick.set_timeframes(values)
+            tick.is_ready = i + 1 >= 30
+            state.snapshot_into(tick, prices[i])
+            score = entry_score[i]
+            tick.entry_score = score
+            tick.bias = decision.BIAS_NAMES[bias[i]]
+            if score != -99:
+                tick.momentum = momentum[i]
+                tick.direction_score = direction_score[i]
+                if flat and market_bias != "auto":
+                    tick.bias = market_bias  # should_enter 以固定 bias 覆寫
+            return tick
+
+        synced = -1  # 時鐘已推進到第 synced 筆
+
+        def advance(i: int):
+            nonlocal synced
+            clock.advance_to(max(stamps[synced + 1:i + 1]))
+            synced = i
+
+        i = 0
+        while True:
+            k = int(np.searchsorted(candidates, i))
+            if k == len(candidates):
+                break
+            i = int(candidates[k])
+            advance(i)
+            price = prices[i]
+            tick = record(i, flat=True)
+            state.enter(engine._choose_direction(tick), price)
+            logger.log("ENTER", state.get_status(), price, tick)
+            i += 1
+            if not state.in_position:
+                continue
+            while i < n:
+                advance(i)
+                price = prices[i]
+                state.update_profit_loss(price)
+                if not state.just_entered(seconds=3):
+                    action = self._exit_action(state, price, atr[i])
+                    if action:
+                        logger.log(action, state.get_status(), price, record(i, flat=False))
+                        state.exit(price)
+                        break
+                i += 1
+            i += 1
+
+        if state.in_position:
+            last = record(n - 1, flat=False)
+            logger.log("EXIT", state.get_status(), last.price, last)
+            state.exit(last.price)
+        return n
+
+    @staticmethod
+    def _exit_action(state: StrategyState, price: float, atr: float) -> str | None:
+        """TickEngine._handle_position 持倉中的出場判斷（rule_based）"""
+        if state.should_stoploss(price, atr):
+            return "STOPLOSS"
+        if state.should_takeprofit(price, atr):
+            return "TAKEPROFIT"
+        if state.should_exit_by_tick():
+            return "TIME_EXIT"
+        if not state.should_hold():
+            return "EXIT"
+        return None
+
+    @staticmethod
+    def _metrics(results: List[Dict[str, Any]]) -> Dict[str, float]:
+        n = len(results)
+        if not n:
+            return {"trades": 0, "win_rate": 0.0, "avg_pnl": 0.0, "total_pnl": 0.0}
+        total = sum(r["net_pnl"] for r in results)
+        wins = sum(1 for r in results if r["outcome"] == "win")
+        return {
+            "trades": n,
+            "win_rate": round(wins / n * 100, 2),
+            "avg_pnl": round(total / n, 3),
+            "total_pnl": round(total, 2)
+        }
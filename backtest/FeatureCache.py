@@ -0,0 +1,71 @@
+# strategy_v4/backtest/FeatureCache.py
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from BacktestDataLoader import TickBatch
+from FeatureMatrix import build_feature_matrix, feature_config
+
+# 快取根目錄固定在專案根目錄（strategy_v4/cache），不隨啟動時的工作目錄改變
+CACHE_ROOT = Path(__file__).resolve().parent.parent / "cache"
+
+
+class FeatureCache:
+    """
+    指標矩陣磁碟快取：
+    - 指標只取決於 tick 資料（timestamp、price、volume）與指標設定，與決策／風控參數無關
+    - 以「資料內容雜湊 + 指標設定雜湊」為檔名，存成 .npy，讀取時以 memory map 開啟（不載入整份到記憶體）
+    - 寫入先寫暫存檔再 os.replace，中斷時不會留下半份快取
+    """
+
+    def __init__(self, cache_dir: str | Path = CACHE_ROOT / "features"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def data_hash(batch: TickBatch) -> str:
+        """只雜湊指標用到的欄位"""
+        h = hashlib.sha1()
+        for name in ("timestamp", "price", "volume"):
+            values = np.ascontiguousarray(batch[name])
+            h.update(name.encode("utf-8"))
+            h.update(values.dtype.str.encode("utf-8"))
+            h.update(values.view(np.uint8))
+        return h.hexdigest()[:16]
+
+    @staticmethod
+    def config_hash(indicator_mode: str = "compat") -> str:
+        text = json.dumps(feature_config(indicator_mode), sort_keys=True)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+    def path_for(self, batch: TickBatch, indicator_mode: str = "compat") -> Path:
+        return self.cache_dir / f"features_{self.data_hash(batch)}_{self.config_hash(indicator_mode)}.npy"
+
+    def get(self, batch: TickBatch, indicator_mode: str = "compat") -> np.ndarray:
+        """回傳指標矩陣（memory map）；沒有快取時計算並寫入"""
+        path = self.path_for(batch, indicator_mode)
+        if path.exists():
+            self.hits += 1
+            return np.load(path, mmap_mode="r")
+
+        self.misses += 1
+        start = time.perf_counter()
+        matrix = build_feature_matrix(batch.timestamps(), batch["price"], batch["volume"], indicator_mode)
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp, path)
+        print(f"✅ 指標快取已建立：{path.name}｜{matrix.shape}｜{time.perf_counter() - start:.1f}s")
+        return np.load(path, mmap_mode="r")
+
+    def clear(self):
+        """刪除所有快取檔"""
+        for path in self.cache_dir.glob("features_*.npy"):
+            path.unlink()
@@ -0,0 +1,268 @@
+# strategy_v4/backtest/Optimizer.py
+
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from BacktestDataLoader import BacktestDataLoader, TickBatch
+from BacktestRunner import BacktestRunner
+from Clock import SimulatedClock
+from FeatureCache import CACHE_ROOT, FeatureCache
+from FeatureMatrix import build_feature_matrix
+from ReportExporter import ReportExporter
+
+
+def expand_grid(param_grid: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """{"a": [1, 2], "b": [3]} → [{"a": 1, "b": 3}, {"a": 2, "b": 3}]；單一值視為只有一個候選"""
+    keys = list(param_grid)
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in param_grid.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def param_key(params: Dict[str, Any]) -> str:
+    """參數組合的穩定雜湊（與 key 順序無關），用於續跑比對"""
+    text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def split_params(params: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """拆成 StrategyState 參數與 DecisionEngine.cfg 參數"""
+    state_params = {k: v for k, v in params.items() if k in BacktestRunner.STATE_PARAMS}
+    decision_params = {k: v for k, v in params.items() if k not in BacktestRunner.STATE_PARAMS}
+    return state_params, decision_params
+
+
+def _parse_value(text: str):
+    """CSV 字串轉回 int / float（失敗則原樣）"""
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except (TypeError, ValueError):
+            pass
+    return text
+
+
+class SharedArrays:
+    """
+    共享記憶體陣列組：
+    - 多個 NumPy 陣列放進同一塊 SharedMemory（各自 64 bytes 對齊）
+    - spec 只含名稱與 layout，可 pickle 給 worker；worker attach 後直接取得 view，不複製資料
+    - 建立者 close() 時負責 unlink
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, layout: list, owner: bool):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, dtype, shape, offset in layout
+        }
+
+    @classmethod
+    def create(cls, arrays: Dict[str, np.ndarray]) -> "SharedArrays":
+        layout = []
+        offset = 0
+        for name, array in arrays.items():
+            offset = (offset + 63) // 64 * 64
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        shared = cls(shm, layout, owner=True)
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec: Tuple[str, list]) -> "SharedArrays":
+        name, layout = spec
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    @property
+    def spec(self) -> Tuple[str, list]:
+        return self.shm.name, self.layout
+
+    @property
+    def nbytes(self) -> int:
+        return self.shm.size
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# worker 行程內的共享資料：shared、batch（TickBatch view）、features、mode
+# Optimizer 與 WalkforwardTester 的 worker 函式共用；由 init_worker / bind_worker 設定，release_worker 清除
+WORKER: Dict[str, Any] = {}
+
+
+def init_worker(spec, mode: str):
+    """ProcessPoolExecutor 的 initializer：依 SharedArrays.spec attach 共享記憶體後綁定"""
+    bind_worker(SharedArrays.attach(spec), mode)
+
+
+def bind_worker(shared: SharedArrays, mode: str):
+    """把 SharedArrays（需含 timestamp、price、volume、features）綁到 WORKER；單行程執行時直接在主行程呼叫"""
+    arrays = shared.arrays
+    batch = TickBatch({name: arrays[name] for name in ("timestamp", "price", "volume")})
+    batch.timestamps()  # datetime 轉換每個行程只做一次
+    WORKER.update(shared=shared, batch=batch, features=arrays["features"], mode=mode)
+
+
+def release_worker():
+    """清除 WORKER 的 view，SharedArrays.close() 之前呼叫"""
+    WORKER.clear()
+
+
+def worker_pool(max_workers: int, shared: SharedArrays, mode: str) -> ProcessPoolExecutor:
+    """
+    建立已綁定共享資料的 process pool（worker 由 init_worker 綁定）：
+    - 以 spawn 啟動：主行程可能已用過 Polars / BLAS 的執行緒池（例如先以 workers=1 跑過），fork 出來的 worker 會卡死
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_worker, initargs=(shared.spec, mode))
+
+
+def _run_one(params: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], float]:
+    state_params, decision_params = split_params(params)
+    runner = BacktestRunner(WORKER["mode"], state_params, decision_params)
+    result = runner.run(WORKER["batch"], features=WORKER["features"])
+    return params, result.summary(), result.elapsed
+
+
+class Optimizer:
+    """
+    多參數組合最佳化：
+    - param_grid 展開成所有組合；StrategyState 參數（BacktestRunner.STATE_PARAMS）以外的 key 視為決策參數（rule_based：DecisionEngine.cfg；regression_based：DecisionEngine_v2.cfg）
+    - 指標只與 tick 有關，FeatureMatrix 由 FeatureCache 取得（同一份資料跨次執行只算一次），連同 tick 欄位放進共享記憶體，worker 直接讀 view
+    - ProcessPoolExecutor 平行回測（預設用滿所有核心），每完成一組即以 ReportExporter.append_csv 寫出
+    - 結果檔以 run_id（參數雜湊）續跑：中斷後重跑同一組 param_grid 只會補跑尚未完成的組合
+    """
+
+    def __init__(self, ticks, mode: str = "rule_based", workers: int | None = None, output_dir: str = "reports",
+                 results_file: str | None = None, indicator_mode: str = "compat", features: np.ndarray | None = None,
+                 cache_dir: str | Path | None = CACHE_ROOT / "features"):
+        self.batch = ticks if isinstance(ticks, TickBatch) else BacktestDataLoader(df=pd.DataFrame(list(ticks))).to_batch()
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.exporter = ReportExporter(output_dir)
+        self.results_file = results_file
+        self.indicator_mode = indicator_mode
+        self.features = features
+        self.feature_cache = FeatureCache(cache_dir) if cache_dir else None
+        self.results: List[Dict[str, Any]] = []
+
+    def prepare_features(self) -> np.ndarray:
+        """沿用已傳入的指標矩陣，否則讀快取，都沒有才計算"""
+        if self.features is None and self.feature_cache is not None:
+            self.features = self.feature_cache.get(self.batch, self.indicator_mode)
+        elif self.features is None:
+            start = time.perf_counter()
+            self.features = build_feature_matrix(
+                self.batch.timestamps(), self.batch["price"], self.batch["volume"], self.indicator_mode
+            )
+            print(f"✅ 指標矩陣計算完成：{self.features.shape}｜{time.perf_counter() - start:.1f}s")
+        if len(self.features) != len(self.batch):
+            raise ValueError(f"指標矩陣列數 {len(self.features)} 與 tick 數 {len(self.batch)} 不符")
+        return self.features
+
+    def _validate(self, combos: List[Dict[str, Any]]):
+        """在主行程先檢查參數名稱，避免每個 worker 各自失敗"""
+        state_params, decision_params = split_params(combos[0])
+        engine = BacktestRunner(self.mode, state_params, decision_params).build_engine(SimulatedClock())
+        unknown = set(decision_params) - set(engine.decision_cfg)
+        if unknown:
+            raise ValueError(f"未知的決策參數（{self.mode}）：{sorted(unknown)}")
+
+    def load_completed(self, results_file: str) -> Dict[str, Dict[str, Any]]:
+        """讀回已完成的結果（最後一列若寫到一半則忽略）"""
+        completed = {}
+        for row in self.exporter.read_csv(results_file):
+            if None in row.values() or not row.get("run_id"):
+                continue
+            completed[row["run_id"]] = {k: _parse_value(v) for k, v in row.items()}
+            completed[row["run_id"]]["run_id"] = row["run_id"]
+        return completed
+
+    def run(self, param_grid: Dict[str, Any]) -> List[Dict[str, Any]]:
+        combos = expand_grid(param_grid)
+        if not combos:
+            return []
+        self._validate(combos)
+        results_file = self.results_file or f"optimizer_{self.mode}_{param_key(param_grid)}.csv"
+
+        completed = self.load_completed(results_file)
+        pending = [p for p in combos if param_key(p) not in completed]
+        print(f"🔧 參數組合 {len(combos)} 組｜已完成 {len(combos) - len(pending)}｜待跑 {len(pending)}｜workers={self.workers}")
+
+        if pending:
+            features = self.prepare_features()
+            shared = SharedArrays.create({
+                "timestamp": self.batch["timestamp"],
+                "price": self.batch["price"],
+                "volume": self.batch["volume"],
+                "features": features,
+            })
+            try:
+                self._dispatch(shared, pending, completed, results_file)
+            finally:
+                release_worker()
+                shared.close()
+
+        self.results = [completed[param_key(p)] for p in combos if param_key(p) in completed]
+        return self.results
+
+    def _dispatch(self, shared: SharedArrays, pending: List[Dict[str, Any]], completed: Dict, results_file: str):
+        start = time.perf_counter()
+        done = 0
+
+        def record(params, summary, elapsed):
+            nonlocal done
+            run_id = param_key(params)
+            row = {"run_id": run_id, **params, **summary, "elapsed": round(elapsed, 2)}
+            self.exporter.append_csv(row, results_file)
+            completed[run_id] = row
+            done += 1
+            print(f"[Optimizer] {done}/{len(pending)}｜{params}｜trades={summary['trades']}｜avg_pnl={summary['avg_pnl']}")
+
+        if self.workers <= 1:
+            bind_worker(shared, self.mode)
+            for params in pending:
+                try:
+                    record(*_run_one(params))
+                except Exception as e:
+                    print(f"⚠️ 參數 {params} 回測失敗：{e}")
+        else:
+            with worker_pool(self.workers, shared, self.mode) as pool:
+                futures = {pool.submit(_run_one, params): params for params in pending}
+                for future in as_completed(futures):
+                    try:
+                        record(*future.result())
+                    except Exception as e:
+                        print(f"⚠️ 參數 {futures[future]} 回測失敗：{e}")
+
+        print(f"✅ 最佳化完成 {done}/{len(pending)} 組｜{time.perf_counter() - start:.1f}s｜結果：{self.exporter.output_dir / results_file}")
+
+    def find_best(self, param_grid: Dict[str, Any], mode: str | None = None, metric: str = "avg_pnl") -> Dict[str, Any] | None:
+        """跑完 param_grid 並回傳 metric 最高的一組"""
+        if mode is not None:
+            self.mode = mode
+        results = self.run(param_grid)
+        if not results:
+            return None
+        best = max(results, key=lambda r: r.get(metric, float("-inf")))
+        print(f"🏆 最佳參數（{metric}={best.get(metric)}）：{ {k: best[k] for k in param_grid} }")
+        return best
+
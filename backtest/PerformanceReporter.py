@@ -0,0 +1,243 @@
+# strategy_v4/backtest/PerformanceReporter.py
+
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from TradeLogger import EXIT_ACTIONS
+
+
+def _empty_metrics() -> Dict[str, float]:
+    return {
+        "trades": 0, "win_rate": 0.0, "total_pnl": 0.0, "avg_pnl": 0.0, "profit_factor": 0.0,
+        "sharpe": 0.0, "sortino": 0.0, "max_drawdown": 0.0, "max_dd_trades": 0, "max_dd_seconds": 0.0,
+        "avg_hold_seconds": 0.0, "max_win_streak": 0, "max_loss_streak": 0,
+    }
+
+
+def _max_run(flags: np.ndarray) -> int:
+    """布林陣列中最長的連續 True 長度"""
+    if not flags.any():
+        return 0
+    padded = np.concatenate([[0], flags.astype(np.int8), [0]])
+    edges = np.flatnonzero(np.diff(padded))
+    return int((edges[1::2] - edges[0::2]).max())
+
+
+def compute_metrics(net_pnl: np.ndarray, entry_time: np.ndarray | None = None, exit_time: np.ndarray | None = None) -> Dict[str, float]:
+    """
+    向量化績效指標（每筆交易一個值）：
+    - sharpe = 平均 / 標準差（ddof=1）；sortino = 平均 / 下檔偏差 sqrt(mean(min(pnl, 0)²))，皆為每筆交易尺度
+    - 權益曲線從 0 起算；max_dd_trades / max_dd_seconds 為從前高到回到前高（或資料結束）的最長交易數 / 時間
+    - entry_time、exit_time 為 datetime64，缺少時不計算持倉與回撤時間
+    """
+    pnl = np.asarray(net_pnl, dtype=np.float64)
+    n = len(pnl)
+    if not n:
+        return _empty_metrics()
+    wins = pnl > 0
+    total = float(pnl.sum())
+    mean = total / n
+    std = float(pnl.std(ddof=1)) if n > 1 else 0.0
+    downside = math.sqrt(float(np.mean(np.minimum(pnl, 0.0) ** 2)))
+    gross_win = float(pnl[wins].sum())
+    gross_loss = float(-pnl[~wins].sum())
+
+    equity = np.concatenate([[0.0], np.cumsum(pnl)])
+    peak = np.maximum.accumulate(equity)
+    drawdown = peak - equity
+    # 每個點最近一次創高（或持平前高）的位置
+    last_peak = np.maximum.accumulate(np.where(equity >= peak, np.arange(n + 1), 0))
+    dd_trades = np.arange(n + 1) - last_peak
+
+    metrics = {
+        "trades": n,
+        "win_rate": round(float(wins.mean()) * 100, 2),
+        "total_pnl": round(total, 2),
+        "avg_pnl": round(mean, 3),
+        "profit_factor": round(gross_win / gross_loss, 3) if gross_loss > 0 else (math.inf if gross_win > 0 else 0.0),
+        "sharpe": round(mean / std, 4) if std > 0 else 0.0,
+        "sortino": round(mean / downside, 4) if downside > 0 else 0.0,
+        "max_drawdown": round(float(drawdown.max()), 2),
+        "max_dd_trades": int(dd_trades.max()),
+        "max_dd_seconds": 0.0,
+        "avg_hold_seconds": 0.0,
+        "max_win_streak": _max_run(wins),
+        "max_loss_streak": _max_run(~wins),
+    }
+    if exit_time is not None:
+        # 權益點 0 的時間以第一筆出場代替
+        times = np.asarray(exit_time, dtype="datetime64[ns]")
+        times = np.concatenate([times[:1], times])
+        dd_seconds = (times - times[last_peak]) / np.timedelta64(1, "s")
+        metrics["max_dd_seconds"] = round(float(np.nanmax(dd_seconds)), 1)
+        if entry_time is not None:
+            hold = (np.asarray(exit_time, dtype="datetime64[ns]") - np.asarray(entry_time, dtype="datetime64[ns]")) / np.timedelta64(1, "s")
+            metrics["avg_hold_seconds"] = round(float(np.nanmean(hold)), 1)
+    return metrics
+
+
+def pair_trades(rows: pd.DataFrame, fee_per_trade: float = 2.1) -> pd.DataFrame:
+    """
+    向量化配對進出場（規則同 TradeAnalyzer.analyze）：
+    - 只看 ENTER 與出場動作，出場列的前一筆事件是 ENTER 才成一筆交易（連續 ENTER 以最後一筆為準）
+    - 回傳 entry_time、exit_time、direction、entry_price、exit_price、pnl、net_pnl 欄位
+    """
+    events = rows[rows["action"].isin(("ENTER",) + EXIT_ACTIONS)].reset_index(drop=True)
+    is_exit = events["action"].isin(EXIT_ACTIONS).to_numpy()
+    prev_enter = np.concatenate([[False], (events["action"] == "ENTER").to_numpy()[:-1]])
+    exit_idx = np.flatnonzero(is_exit & prev_enter)
+    entries = events.iloc[exit_idx - 1].reset_index(drop=True)
+    exits = events.iloc[exit_idx].reset_index(drop=True)
+
+    entry_price = pd.to_numeric(entries["price"], errors="coerce").to_numpy(dtype=np.float64)
+    exit_price = pd.to_numeric(exits["price"], errors="coerce").to_numpy(dtype=np.float64)
+    sign = np.where(entries["direction"].to_numpy() == "short", -1.0, 1.0)
+    pnl = (exit_price - entry_price) * sign
+    valid = ~np.isnan(pnl)
+    trades = pd.DataFrame({
+        "entry_time": pd.to_datetime(entries["timestamp"], errors="coerce"),
+        "exit_time": pd.to_datetime(exits["timestamp"], errors="coerce"),
+        "direction": entries["direction"],
+        "entry_price": entry_price,
+        "exit_price": exit_price,
+        "pnl": pnl,
+        "net_pnl": pnl - fee_per_trade,
+    })
+    return trades[valid].reset_index(drop=True)
+
+
+class PerformanceReporter:
+    """
+    績效報告：
+    - 讀 trade_log.csv（或記憶體中的交易列，例如 BacktestRunner 的 trade_rows），一次配對成欄位式交易表
+    - Sharpe、Sortino、最大回撤與回撤期間、平均持倉時間、獲利因子、連勝連敗皆以 NumPy 向量化計算
+    - 實盤累計績效請用 RunningPerformance（每筆平倉 O(1) 更新，不需重讀檔案）
+    """
+
+    def __init__(self, trade_log: str | Path = "trade_log.csv", fee_per_trade: float = 2.1, rows: List[Dict[str, Any]] | None = None):
+        self.trade_log = Path(trade_log)
+        self.fee = fee_per_trade
+        self.rows = rows
+        self.trades: pd.DataFrame | None = None
+
+    def load(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.rows) if self.rows is not None else pd.read_csv(self.trade_log, dtype={"action": str, "direction": str})
+        if df.empty:
+            self.trades = pd.DataFrame(columns=["entry_time", "exit_time", "direction", "entry_price", "exit_price", "pnl", "net_pnl"])
+        else:
+            self.trades = pair_trades(df, self.fee)
+        return self.trades
+
+    def metrics(self) -> Dict[str, float]:
+        if self.trades is None:
+            self.load()
+        t = self.trades
+        return compute_metrics(t["net_pnl"].to_numpy(), t["entry_time"].to_numpy(), t["exit_time"].to_numpy())
+
+    def report(self) -> Dict[str, float]:
+        m = self.metrics()
+        print(f"📊 交易次數：{m['trades']}｜勝率：{m['win_rate']:.1f}%｜總淨損益：{m['total_pnl']:.1f}｜平均：{m['avg_pnl']:.2f}")
+        print(f"📈 Sharpe（每筆）：{m['sharpe']:.3f}｜Sortino：{m['sortino']:.3f}｜獲利因子：{m['profit_factor']}")
+        print(f"📉 最大回撤：{m['max_drawdown']:.1f}｜回撤期間：{m['max_dd_trades']} 筆 / {m['max_dd_seconds']:.0f} 秒")
+        print(f"⏱ 平均持倉：{m['avg_hold_seconds']:.1f} 秒｜🔥 最大連勝：{m['max_win_streak']}｜最大連敗：{m['max_loss_streak']}")
+        return m
+
+
+class RunningPerformance:
+    """
+    即時累計績效：
+    - on_trade_closed() 每筆平倉 O(1) 更新（Welford 平均／變異數、下檔平方和、權益高點與回撤、連勝連敗）
+    - 可直接註冊為 StrategyState.add_trade_listener 的 callback
+    - metrics() 與 compute_metrics 相同欄位與算法
+    """
+
+    def __init__(self, fee_per_trade: float = 2.1):
+        self.fee = fee_per_trade
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._down_sq = 0.0
+        self.wins = 0
+        self.gross_win = 0.0
+        self.gross_loss = 0.0
+        self.equity = 0.0
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+        self._peak_trade = 0
+        self._peak_time = None
+        self.max_dd_trades = 0
+        self.max_dd_seconds = 0.0
+        self._hold_sum = 0.0
+        self._hold_count = 0
+        self._streak = 0  # 正數為連勝、負數為連敗
+        self.max_win_streak = 0
+        self.max_loss_streak = 0
+
+    def update(self, net_pnl: float, entry_time: datetime | None = None, exit_time: datetime | None = None):
+        self.n += 1
+        delta = net_pnl - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (net_pnl - self.mean)
+        if net_pnl < 0:
+            self._down_sq += net_pnl * net_pnl
+
+        if net_pnl > 0:
+            self.wins += 1
+            self.gross_win += net_pnl
+            self._streak = self._streak + 1 if self._streak > 0 else 1
+            self.max_win_streak = max(self.max_win_streak, self._streak)
+        else:
+            self.gross_loss -= net_pnl
+            self._streak = self._streak - 1 if self._streak < 0 else -1
+            self.max_loss_streak = max(self.max_loss_streak, -self._streak)
+
+        if self._peak_time is None:
+            self._peak_time = exit_time
+        self.equity += net_pnl
+        if self.equity >= self.peak:
+            self.peak = self.equity
+            self._peak_trade = self.n
+            self._peak_time = exit_time
+        else:
+            self.max_drawdown = max(self.max_drawdown, self.peak - self.equity)
+        self.max_dd_trades = max(self.max_dd_trades, self.n - self._peak_trade)
+        if exit_time is not None and self._peak_time is not None:
+            self.max_dd_seconds = max(self.max_dd_seconds, (exit_time - self._peak_time).total_seconds())
+        if entry_time is not None and exit_time is not None:
+            self._hold_sum += (exit_time - entry_time).total_seconds()
+            self._hold_count += 1
+
+    def on_trade_closed(self, trade: Dict[str, Any]):
+        """StrategyState 平倉 callback：trade 含 pnl（點數）、entry_time、exit_time"""
+        self.update(trade["pnl"] - self.fee, trade.get("entry_time"), trade.get("exit_time"))
+
+    @property
+    def total_pnl(self) -> float:
+        return self.equity
+
+    def metrics(self) -> Dict[str, float]:
+        if not self.n:
+            return _empty_metrics()
+        std = math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+        downside = math.sqrt(self._down_sq / self.n)
+        return {
+            "trades": self.n,
+            "win_rate": round(self.wins / self.n * 100, 2),
+            "total_pnl": round(self.equity, 2),
+            "avg_pnl": round(self.mean, 3),
+            "profit_factor": round(self.gross_win / self.gross_loss, 3) if self.gross_loss > 0 else (math.inf if self.gross_win > 0 else 0.0),
+            "sharpe": round(self.mean / std, 4) if std > 0 else 0.0,
+            "sortino": round(self.mean / downside, 4) if downside > 0 else 0.0,
+            "max_drawdown": round(self.max_drawdown, 2),
+            "max_dd_trades": self.max_dd_trades,
+            "max_dd_seconds": round(self.max_dd_seconds, 1),
+            "avg_hold_seconds": round(self._hold_sum / self._hold_count, 1) if self._hold_count else 0.0,
+            "max_win_streak": self.max_win_streak,
+            "max_loss_streak": self.max_loss_streak,
+        }
+
@@ -9,6 +9,7 @@ class ReportExporter:
     報告匯出器：
     - 將回測與最佳化結果輸出成 CSV 或 Markdown
     - 支援多組結果比較
+    - append_csv() 逐筆附加（最佳化過程中每完成一組就寫出），read_csv() 讀回以便續跑
     """
 
     def __init__(self, output_dir: str = "reports"):
@@ -31,6 +32,24 @@ class ReportExporter:
 
         print(f"[Exporter] 已匯出 CSV 報告：{path}")
 
+    def append_csv(self, row: Dict[str, Any], filename: str = "report.csv"):
+        """附加一列到 CSV（檔案不存在時先寫標題列），每次寫完即關檔"""
+        path = self.output_dir / filename
+        new_file = not path.exists() or path.stat().st_size == 0
+        with path.open("a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+    def read_csv(self, filename: str = "report.csv") -> List[Dict[str, str]]:
+        """讀回 CSV（值皆為字串）；檔案不存在時回傳空 list"""
+        path = self.output_dir / filename
+        if not path.exists():
+            return []
+        with path.open("r", newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
     def export_markdown(self, results: List[Dict[str, Any]], filename: str = "report.md", title: str = "回測報告"):
         """匯出成 Markdown"""
         path = self.output_dir / filename
@@ -0,0 +1,234 @@
+# strategy_v4/backtest/WalkforwardTester.py
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from BacktestDataLoader import BacktestDataLoader, TickBatch
+from BacktestRunner import BacktestRunner
+from ConfigManager import ConfigManager
+from DecisionEngine_v2 import FEATURE_ORDER, extract_feature_matrix
+from FeatureCache import CACHE_ROOT, FeatureCache
+from FeatureMatrix import FEATURE_COLUMNS, feature_config
+from Optimizer import WORKER, SharedArrays, bind_worker, release_worker, worker_pool
+from ParamsStore import ParamsStore
+from RegressionCalibrator import RegressionCalibrator
+from ReportExporter import ReportExporter
+
+
+def _fit_segment(calibrator: RegressionCalibrator, batch: TickBatch, features: np.ndarray, start: int, stop: int) -> int:
+    """以一個區段的指標矩陣累積校正統計量（標籤不跨區段，避免偷看測試段）"""
+    columns = {name: features[start:stop, i] for i, name in enumerate(FEATURE_COLUMNS)}
+    columns["volume"] = batch["volume"][start:stop]
+    prices = batch["price"][start:stop]
+    h = calibrator.horizon
+    if len(prices) <= h:
+        return 0
+    X = extract_feature_matrix(columns)
+    return calibrator.partial_fit(X[:-h], np.sign(prices[h:] - prices[:-h]))
+
+
+def _calibrate(job: Dict[str, Any], batch: TickBatch, features: np.ndarray) -> Tuple[Dict[str, float], float]:
+    calibrator = RegressionCalibrator(**job["calibrator"])
+    for start, stop in job["train"]:
+        _fit_segment(calibrator, batch, features, start, stop)
+    return calibrator.solve(), calibrator.r2()
+
+
+def _run_fold(job: Dict[str, Any]) -> Dict[str, Any]:
+    """worker：校正訓練段 → 寫出該 fold 權重 → 以 regression_based 回測測試段"""
+    batch, features = WORKER["batch"], WORKER["features"]
+    start_time = time.perf_counter()
+    weights, r2 = _calibrate(job, batch, features)
+    store = ParamsStore(job["weights_path"])
+    store.update(job["version"], weights)
+
+    start, stop = job["test"]
+    runner = BacktestRunner("regression_based", job["state_params"], job["decision_params"], params_store=store)
+    result = runner.run(batch.slice(start, stop), features=features[start:stop])
+    return {
+        "fold": job["fold"],
+        "version": job["version"],
+        "train_start": job["train_start"],
+        "test_start": job["test_start"],
+        "test_end": job["test_end"],
+        "train_ticks": sum(b - a for a, b in job["train"]),
+        "test_ticks": stop - start,
+        "r2": round(r2, 5),
+        **{k: v for k, v in result.summary().items() if k not in ("mode", "ticks", "ticks_per_sec")},
+        "elapsed": round(time.perf_counter() - start_time, 2),
+        "weights": weights,
+    }
+
+
+class WalkforwardTester:
+    """
+    走勢分段校正（split → calibrate → run → analyze → version）：
+    - ticks 依 segment_size（tick 數）或 "day"（日期）切段；第 i 個 fold 以前 train_segments 段校正、第 i 段回測
+    - 指標矩陣整段只算一次（FeatureCache），連同 tick 欄位放進共享記憶體，各 fold 在 worker 行程平行執行
+    - 每個 fold 的結果（權重與績效）以「各段資料雜湊串接到測試段為止 + 校正設定 + 回測設定」為 key 快取，新增一天只需跑新的 fold
+      （指標有暖機期，與更早的資料有關，所以用串接雜湊而非只看訓練段本身）
+    - 每個 fold 的權重以版本號寫入 weights/fold_XXX.json；最後以最近 train_segments 段校正的權重更新 params_path 的 ParamsStore
+    - 輸出每個 fold 的績效表（CSV / Markdown）
+    """
+
+    def __init__(self, params_path: str | Path = "calibrated_params.json", config_path: str | Path = "strategy_config.json",
+                 output_dir: str = "reports/walkforward", cache_dir: str | Path = CACHE_ROOT, horizon: int = 20, ridge: float = 1.0,
+                 state_params: Dict[str, Any] | None = None, workers: int | None = None):
+        self.params_store = ParamsStore(params_path)
+        self.decision_params = ConfigManager(config_path).get_decision_params()
+        self.output_dir = Path(output_dir)
+        self.weights_dir = self.output_dir / "weights"
+        self.weights_dir.mkdir(parents=True, exist_ok=True)
+        self.fold_cache_dir = Path(cache_dir) / "walkforward"
+        self.fold_cache_dir.mkdir(parents=True, exist_ok=True)
+        self.feature_cache = FeatureCache(Path(cache_dir) / "features")
+        self.exporter = ReportExporter(str(self.output_dir))
+        self.calibrator_cfg = {"horizon": horizon, "ridge": ridge}
+        self.state_params = dict(state_params or {})
+        self.workers = workers or os.cpu_count() or 1
+        self.results: List[Dict[str, Any]] = []
+
+    # ---------- 切段與快取 key ----------
+
+    @staticmethod
+    def split_segments(batch: TickBatch, segment_size: int | str) -> List[Tuple[int, int]]:
+        """回傳各段 [start, stop)；"day" 依 timestamp 日期切段，整數則每 segment_size 筆一段（最後一段可較短）"""
+        n = len(batch)
+        if segment_size == "day":
+            days = batch["timestamp"].astype("datetime64[D]")
+            cuts = (np.flatnonzero(days[1:] != days[:-1]) + 1).tolist()
+            bounds = [0] + cuts + [n]
+        else:
+            bounds = list(range(0, n, int(segment_size))) + [n]
+        return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    def _config_key(self) -> str:
+        config = {
+            "calibrator": self.calibrator_cfg,
+            "feature_order": FEATURE_ORDER,
+            "features": feature_config(),
+            "decision": self.decision_params,
+            "state": self.state_params,
+        }
+        return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+    @staticmethod
+    def chain_hashes(segment_hashes: List[str]) -> List[str]:
+        """第 i 個值代表第 0..i 段的全部資料（前段不變時，後面新增資料不影響既有的值）"""
+        chained, prev = [], ""
+        for h in segment_hashes:
+            prev = hashlib.sha1((prev + h).encode("utf-8")).hexdigest()[:16]
+            chained.append(prev)
+        return chained
+
+    def _fold_key(self, chained: List[str], train_segments: int, test: int) -> str:
+        text = "|".join([self._config_key(), str(train_segments), chained[test]])
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def _load_cached(self, key: str) -> Dict[str, Any] | None:
+        path = self.fold_cache_dir / f"fold_{key}.json"
+        if not path.exists():
+            return None
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _store_cached(self, key: str, result: Dict[str, Any]):
+        path = self.fold_cache_dir / f"fold_{key}.json"
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp, path)
+
+    # ---------- 主流程 ----------
+
+    def run_walkforward(self, ticks, segment_size: int | str = 500, train_segments: int = 3) -> List[Dict[str, Any]]:
+        batch = ticks if isinstance(ticks, TickBatch) else BacktestDataLoader(df=pd.DataFrame(list(ticks))).to_batch()
+        segments = self.split_segments(batch, segment_size)
+        if len(segments) <= train_segments:
+            raise ValueError(f"資料只有 {len(segments)} 段，不足 train_segments={train_segments} + 1")
+        chained = self.chain_hashes([FeatureCache.data_hash(batch.slice(a, b)) for a, b in segments])
+        timestamps = pd.DatetimeIndex(batch["timestamp"])
+
+        jobs, cached = [], []
+        for i in range(train_segments, len(segments)):
+            train = list(range(i - train_segments, i))
+            key = self._fold_key(chained, train_segments, i)
+            hit = self._load_cached(key)
+            if hit is not None:
+                cached.append(hit)
+                continue
+            jobs.append({
+                "fold": i - train_segments + 1,
+                "key": key,
+                "version": f"wf-{timestamps[segments[i][0]]:%Y%m%d%H%M}-{key[:8]}",
+                "weights_path": str(self.weights_dir / f"fold_{i - train_segments + 1:03d}.json"),
+                "train": [segments[j] for j in train],
+                "test": segments[i],
+                "train_start": str(timestamps[segments[train[0]][0]]),
+                "test_start": str(timestamps[segments[i][0]]),
+                "test_end": str(timestamps[segments[i][1] - 1]),
+                "calibrator": self.calibrator_cfg,
+                "decision_params": self.decision_params,
+                "state_params": self.state_params,
+            })
+        print(f"🔁 Walk-forward：{len(segments)} 段｜fold {len(segments) - train_segments}｜快取命中 {len(cached)}｜待跑 {len(jobs)}")
+
+        features = self.feature_cache.get(batch)
+        fresh = self._dispatch(batch, features, jobs) if jobs else []
+        self.results = sorted(cached + fresh, key=lambda r: r["fold"])
+
+        # 以最近 train_segments 段（含最後一段）校正，作為下一交易段使用的版本
+        live_job = {"calibrator": self.calibrator_cfg, "train": segments[-train_segments:]}
+        weights, _ = _calibrate(live_job, batch, features)
+        live_key = self._fold_key(chained, train_segments, len(segments) - 1)
+        version = f"wf-live-{timestamps[-1]:%Y%m%d%H%M}-{live_key[:8]}"
+        self.params_store.update(version, weights)
+        print(f"✅ ParamsStore 已更新：{version}")
+
+        self.export()
+        return self.results
+
+    def _dispatch(self, batch: TickBatch, features: np.ndarray, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        shared = SharedArrays.create({
+            "timestamp": batch["timestamp"],
+            "price": batch["price"],
+            "volume": batch["volume"],
+            "features": np.asarray(features),
+        })
+        results = []
+
+        def record(job, result):
+            result["key"] = job["key"]
+            self._store_cached(job["key"], result)
+            results.append(result)
+            print(f"[Walkforward] fold {result['fold']}｜{result['test_start']}｜trades={result['trades']}｜avg_pnl={result['avg_pnl']}")
+
+        try:
+            if self.workers <= 1 or len(jobs) == 1:
+                bind_worker(shared, "regression_based")
+                for job in jobs:
+                    record(job, _run_fold(job))
+            else:
+                with worker_pool(min(self.workers, len(jobs)), shared, "regression_based") as pool:
+                    futures = {pool.submit(_run_fold, job): job for job in jobs}
+                    for future in as_completed(futures):
+                        record(futures[future], future.result())
+        finally:
+            release_worker()
+            shared.close()
+        return results
+
+    def export(self):
+        """每個 fold 一列的績效表（不含權重明細）"""
+        table = [{k: v for k, v in r.items() if k not in ("weights", "key")} for r in self.results]
+        self.exporter.export_csv(table, "walkforward_folds.csv")
+        self.exporter.export_markdown(table, "walkforward_folds.md", title="Walk-forward 分段績效")
+
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+
+def to_datetime(ts) -> datetime:
+    """將 tick timestamp（datetime / pandas.Timestamp / ISO 字串）轉為 datetime"""
+    if isinstance(ts, datetime):
+        return ts
+    if isinstance(ts, str):
+        return datetime.fromisoformat(ts.replace("/", "-"))
+    raise TypeError(f"無法解析 timestamp：{ts!r}")
+
+
+class LiveClock:
+    """實盤時鐘：now() 即系統時間，advance_to() 不做事"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def advance_to(self, ts) -> None:
+        pass
+
+
+class SimulatedClock:
+    """
+    模擬時鐘（回測 / 重播用）：
+    - now() 回傳最近一筆 tick 的時間，冷卻、持倉秒數都以 tick 時間計算
+    - advance_to() 由 TickEngine 在每筆 tick 呼叫，時間只會前進不會倒退
+    """
+
+    def __init__(self, start: datetime | None = None):
+        self._now = to_datetime(start) if start is not None else None
+
+    def now(self) -> datetime:
+        if self._now is None:
+            raise RuntimeError("SimulatedClock 尚未收到任何 tick 時間")
+        return self._now
+
+    def advance_to(self, ts) -> None:
+        ts = to_datetime(ts)
+        if self._now is None or ts > self._now:
+            self._now = ts
+
+
+# 預設共用的實盤時鐘
+LIVE_CLOCK = LiveClock()
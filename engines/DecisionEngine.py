@@ -1,4 +1,24 @@
+import numpy as np
+
+from TickRecord import TickRecord, as_tick_record
+
+
+def _on_dict(method, tick: dict, outputs: tuple):
+    """dict 呼叫端：轉成 TickRecord 計算，再把寫入的欄位同步回 dict（與舊版就地寫入 dict 相同）"""
+    record = as_tick_record(tick)
+    result = method(record)
+    for name in outputs:
+        value = record.get(name)
+        if value is not None:
+            tick[name] = value
+    return result
+
+
 class DecisionEngine:
+    # evaluate_batch() 回傳的 bias 代碼
+    BIAS_CODES = {"bullish": 1, "bearish": -1, "neutral": 0}
+    BIAS_NAMES = {1: "bullish", -1: "bearish", 0: "neutral"}
+
     def __init__(self, market_bias: str, indicators: dict, tick_tracker=None):
         self.market_bias = market_bias
         self.indicators = indicators
@@ -18,14 +38,15 @@ class DecisionEngine:
             "atr_low": 5      # ATR 低波動門檻
         }
 
-    def detect_market_bias(self, tick: dict) -> str:
-        adx = tick.get("adx", 0)
+    def detect_market_bias(self, tick: TickRecord | dict) -> str:
+        tick = as_tick_record(tick)
+        adx = tick.adx
         if adx < self.cfg["adx_consolidation"]:
             return "neutral"
 
-        ema5, ema20 = tick.get("ema5", 0), tick.get("ema20", 0)
-        macd, signal, hist = tick.get("macd", 0), tick.get("macd_signal", 0), tick.get("macd_hist", 0)
-        rsi = tick.get("rsi", 50)
+        ema5, ema20 = tick.ema5, tick.ema20
+        macd, signal, hist = tick.macd, tick.macd_signal, tick.macd_hist
+        rsi = tick.rsi
 
         score = 0
         score += 1 if ema5 > ema20 else -1
@@ -37,16 +58,18 @@ class DecisionEngine:
         if score < 0: return "bearish"
         return "neutral"
 
-    def entry_strength_score(self, tick: dict) -> int:
+    def entry_strength_score(self, tick: TickRecord | dict) -> int:
+        if not isinstance(tick, TickRecord):
+            return _on_dict(self.entry_strength_score, tick, ("momentum", "direction_score"))
         score = 0
-        macd, signal, hist = tick.get("macd", 0), tick.get("macd_signal", 0), tick.get("macd_hist", 0)
-        rsi = tick.get("rsi", 50)
-        ema5, ema20 = tick.get("ema5", 0), tick.get("ema20", 0)
-        vwap = tick.get("vwap", 0)
-        close = tick.get("close", 0)
-        adx = tick.get("adx", 0)
-        atr = tick.get("atr", 0)
-        volume = tick.get("volume", 0)
+        macd, signal, hist = tick.macd, tick.macd_signal, tick.macd_hist
+        rsi = tick.rsi
+        ema5, ema20 = tick.ema5, tick.ema20
+        vwap = tick.vwap
+        close = tick.close
+        adx = tick.adx
+        atr = tick.atr
+        volume = tick.volume
 
         # 盤整過濾
         if adx < self.cfg["adx_consolidation"] and abs(macd - signal) < 0.3:
@@ -57,8 +80,8 @@ class DecisionEngine:
         if close > vwap and ema5 > ema20 and rsi > self.cfg["rsi_bullish_min"]: score += 1
 
         # 多週期確認
-        if tick.get("is_ready_5m") and tick.get("is_ready_15m"):
-            if tick.get("rsi_5m", 50) > 55 and tick.get("ema_15m", 0) > tick.get("ema_5m", 0):
+        if tick.is_ready_5m and tick.is_ready_15m:
+            if tick.rsi_5m > 55 and tick.ema_15m > tick.ema_5m:
                 score += 1
 
         # VWAP + 成交量
@@ -79,38 +102,120 @@ class DecisionEngine:
                 score += 1
             momentum = self.tick_tracker.get_momentum()
             direction_score = self.tick_tracker.get_direction_score()
-            tick["momentum"] = momentum
-            tick["direction_score"] = direction_score
+            tick.momentum = momentum
+            tick.direction_score = direction_score
             if abs(momentum) >= self.cfg["momentum_abs_min"]: score += 1
             score += direction_score
 
         return score
 
-    def score_entry(self, tick: dict) -> int:
+    def score_entry(self, tick: TickRecord | dict) -> int:
         return self.entry_strength_score(tick)
 
-    def should_enter(self, tick: dict) -> bool:
+    def should_enter(self, tick: TickRecord | dict) -> bool:
+        if not isinstance(tick, TickRecord):
+            return _on_dict(self.should_enter, tick, ("bias", "momentum", "direction_score"))
         score = self.entry_strength_score(tick)
         if score == -99:
             return False
 
         bias = self.market_bias if self.market_bias != "auto" else self.detect_market_bias(tick)
-        tick["bias"] = bias
+        tick.bias = bias
 
         if abs(tick.get("momentum", 0)) < self.cfg["momentum_abs_min"]:
             return False
         if tick.get("direction_score", 0) == 0:
             return False
-        if not tick.get("is_ready", False):
+        if not tick.is_ready:
             return False
 
         if bias == "bullish":
             return (score >= self.cfg["bull_score_min"] and
-                    tick.get("close", 0) > tick.get("vwap", 0) and
-                    tick.get("ema5", 0) > tick.get("ema20", 0) and
-                    tick.get("rsi", 50) < self.cfg["rsi_overbought"])
+                    tick.close > tick.vwap and
+                    tick.ema5 > tick.ema20 and
+                    tick.rsi < self.cfg["rsi_overbought"])
         elif bias == "bearish":
             return (score <= self.cfg["bear_score_max"] and
-                    tick.get("ema5", 0) < tick.get("ema20", 0))
+                    tick.ema5 < tick.ema20)
         else:
             return abs(score) >= self.cfg["neutral_score_abs"]
+
+    def evaluate_batch(self, features, volume=None, is_ready=None) -> dict:
+        """
+        整批向量化評估（結果與逐筆 detect_market_bias / score_entry / should_enter 完全相同）：
+        - features：FeatureMatrix 矩陣（欄位順序 FEATURE_COLUMNS）或 {欄位名: 陣列}，需含 volume（或另外傳入）
+        - 視為從第 0 列開始的一次完整回放：TickPatternTracker 形態由 close 序列推得，is_ready 預設為第 30 筆起
+        - should_enter 逐列計算（不考慮持倉狀態），bias 以 BIAS_CODES 編碼
+        - 回傳 bias、entry_score、enter、momentum、direction_score 陣列
+        """
+        if isinstance(features, np.ndarray):
+            from FeatureMatrix import FEATURE_COLUMNS
+            columns = {name: features[:, i] for i, name in enumerate(FEATURE_COLUMNS)}
+        else:
+            columns = features
+        col = lambda name: np.asarray(columns[name], dtype=np.float64)
+        cfg = self.cfg
+
+        close, vwap, adx, atr, rsi = col("close"), col("vwap"), col("adx"), col("atr"), col("rsi")
+        ema5, ema20 = col("ema5"), col("ema20")
+        macd, signal, hist = col("macd"), col("macd_signal"), col("macd_hist")
+        volume = np.asarray(columns["volume"] if volume is None else volume, dtype=np.float64)
+        n = len(close)
+        if is_ready is None:
+            is_ready = np.arange(1, n + 1) >= 30
+        is_ready = np.asarray(is_ready, dtype=bool)
+
+        # detect_market_bias
+        bias_score = (np.where(ema5 > ema20, 1, -1) + np.where(macd > signal, 1, -1)
+                      + np.where(hist > 0.3, 1, np.where(hist < -0.3, -1, 0))
+                      + np.where(rsi > 65, 1, np.where(rsi < 35, -1, 0)))
+        bias = np.sign(bias_score).astype(np.int8)
+        bias[adx < cfg["adx_consolidation"]] = 0
+
+        # entry_strength_score
+        score = ((macd > signal) & (hist > 0.8)).astype(np.int64)
+        score += (close > vwap) & (ema5 > ema20) & (rsi > cfg["rsi_bullish_min"])
+        ready_mtf = (col("is_ready_5m") != 0) & (col("is_ready_15m") != 0)
+        score += ready_mtf & (col("rsi_5m") > 55) & (col("ema_15m") > col("ema_5m"))
+        score += (close > vwap) & (volume >= 5)
+        score += np.where((adx > 20) & (atr >= cfg["atr_high"]), 1, np.where(atr <= cfg["atr_low"], -1, 0))
+
+        momentum = np.zeros(n, dtype=np.float64)
+        direction_score = np.zeros(n, dtype=np.int64)
+        if self.tick_tracker:
+            # TickPatternTracker 以每筆 price（= close）更新
+            momentum[1:] = close[1:] - close[:-1]
+            direction_score[2:] = np.where(close[2:] > close[:-2], 1, -1)
+            three_up = np.zeros(n, dtype=bool)
+            three_up[2:] = (close[2:] > close[1:-1]) & (close[1:-1] > close[:-2])
+            sharp = np.zeros(n, dtype=bool)
+            sharp[2:] = (close[:-2] - close[1:-1] > 10) & (close[2:] > close[1:-1])
+            score += three_up
+            score += sharp
+            score += np.abs(momentum) >= cfg["momentum_abs_min"]
+            score += direction_score
+        consolidation = (adx < cfg["adx_consolidation"]) & (np.abs(macd - signal) < 0.3)
+        score[consolidation] = -99
+
+        # should_enter
+        if self.market_bias != "auto":
+            enter_bias = np.full(n, self.BIAS_CODES.get(self.market_bias, 0), dtype=np.int8)
+        else:
+            enter_bias = bias
+        bull = ((score >= cfg["bull_score_min"]) & (close > vwap) & (ema5 > ema20)
+                & (rsi < cfg["rsi_overbought"]))
+        bear = (score <= cfg["bear_score_max"]) & (ema5 < ema20)
+        neutral = np.abs(score) >= cfg["neutral_score_abs"]
+        enter = np.where(enter_bias == 1, bull, np.where(enter_bias == -1, bear, neutral))
+        enter &= score != -99
+        enter &= ~(np.abs(momentum) < cfg["momentum_abs_min"])
+        enter &= direction_score != 0
+        enter &= is_ready
+
+        return {
+            "bias": bias,
+            "entry_score": score,
+            "enter": enter,
+            "momentum": momentum,
+            "direction_score": direction_score,
+        }
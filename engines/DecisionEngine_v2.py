@@ -0,0 +1,279 @@
+import math
+import threading
+
+import numpy as np
+
+from ParamsStore import ParamsStore
+from TickRecord import TickRecord
+from StrategyLogging import get_logger
+
+log = get_logger("decision_v2")
+
+# 權重向量的特徵順序（ParamsStore 權重 key 需在此清單內；"intercept" 為常數項）
+FEATURE_ORDER = [
+    "rsi", "macd", "macd_signal", "macd_hist", "kd_k", "kd_d", "atr", "adx",
+    "vwap", "ema5", "ema20", "bband_pos", "bband_width", "volume", "rsi_5m", "rsi_15m",
+]
+
+# ParamsStore 沒有權重時使用
+DEFAULT_WEIGHTS = {
+    "rsi": 0.12, "macd": 0.22, "macd_signal": -0.08, "kd_k": 0.10, "kd_d": -0.06, "atr": -0.06,
+    "adx": 0.10, "vwap": 0.10, "ema5": 0.10, "ema20": 0.10, "bband_pos": 0.06, "volume": 0.04,
+}
+
+
+def extract_features(tick: dict) -> list:
+    """
+    單筆 tick → 特徵（順序同 FEATURE_ORDER），全部轉成以 0 為中心的相對值：
+    - 振盪指標 (x - 50) / 50；ADX (x - 25) / 25
+    - MACD、ATR、布林寬度以收盤價的萬分比表示；VWAP / EMA 為收盤價相對其偏離的萬分比
+    - bband_pos 若 tick 沒有則由布林上下軌推得，減 0.5 置中；成交量取 log1p
+    """
+    close = tick.get("close") or tick.get("price") or 1.0
+    bps = 10000.0 / close
+    upper, lower = tick.get("bband_upper", 0.0), tick.get("bband_lower", 0.0)
+    bband_pos = tick.get("bband_pos")
+    if bband_pos is None:
+        bband_pos = (close - lower) / (upper - lower) if upper > lower else 0.5
+    vwap, ema5, ema20 = tick.get("vwap", 0.0), tick.get("ema5", 0.0), tick.get("ema20", 0.0)
+    return [
+        (tick.get("rsi", 50.0) - 50.0) / 50.0,
+        tick.get("macd", 0.0) * bps,
+        tick.get("macd_signal", 0.0) * bps,
+        tick.get("macd_hist", 0.0) * bps,
+        (tick.get("kd_k", 50.0) - 50.0) / 50.0,
+        (tick.get("kd_d", 50.0) - 50.0) / 50.0,
+        tick.get("atr", 0.0) * bps,
+        (tick.get("adx", 25.0) - 25.0) / 25.0,
+        (close - vwap) * bps if vwap else 0.0,
+        (close - ema5) * bps if ema5 else 0.0,
+        (close - ema20) * bps if ema20 else 0.0,
+        bband_pos - 0.5,
+        (upper - lower) * bps if upper > lower else 0.0,
+        math.log1p(max(tick.get("volume", 0.0), 0.0)),
+        (tick.get("rsi_5m", 50.0) - 50.0) / 50.0,
+        (tick.get("rsi_15m", 50.0) - 50.0) / 50.0,
+    ]
+
+
+def extract_record_features(tick: TickRecord) -> list:
+    """extract_features 的 TickRecord 版本：欄位由 TickEngine 每筆寫滿，直接讀屬性"""
+    close = tick.close or tick.price or 1.0
+    bps = 10000.0 / close
+    upper, lower = tick.bband_upper, tick.bband_lower
+    bband_pos = tick.bband_pos
+    if bband_pos is None:
+        bband_pos = (close - lower) / (upper - lower) if upper > lower else 0.5
+    vwap, ema5, ema20 = tick.vwap, tick.ema5, tick.ema20
+    return [
+        (tick.rsi - 50.0) / 50.0,
+        tick.macd * bps,
+        tick.macd_signal * bps,
+        tick.macd_hist * bps,
+        (tick.kd_k - 50.0) / 50.0,
+        (tick.kd_d - 50.0) / 50.0,
+        tick.atr * bps,
+        (tick.adx - 25.0) / 25.0,
+        (close - vwap) * bps if vwap else 0.0,
+        (close - ema5) * bps if ema5 else 0.0,
+        (close - ema20) * bps if ema20 else 0.0,
+        bband_pos - 0.5,
+        (upper - lower) * bps if upper > lower else 0.0,
+        math.log1p(max(tick.volume, 0.0)),
+        (tick.rsi_5m - 50.0) / 50.0,
+        (tick.rsi_15m - 50.0) / 50.0,
+    ]
+
+
+def extract_feature_matrix(columns: dict) -> np.ndarray:
+    """extract_features 的欄位式版本：{欄位名: 陣列} → (n, len(FEATURE_ORDER)) 矩陣"""
+    col = lambda name, default: np.asarray(columns[name], dtype=np.float64) if name in columns else default
+    close = col("close", None)
+    if close is None:
+        close = col("price", None)
+    close = np.where(close == 0, 1.0, close)
+    n = len(close)
+    bps = 10000.0 / close
+    upper, lower = col("bband_upper", np.zeros(n)), col("bband_lower", np.zeros(n))
+    band = upper > lower
+    if "bband_pos" in columns:
+        bband_pos = col("bband_pos", None)
+    else:
+        bband_pos = np.where(band, (close - lower) / np.where(band, upper - lower, 1.0), 0.5)
+    relative = lambda ref: np.where(ref != 0, (close - ref) * bps, 0.0)
+
+    out = np.empty((n, len(FEATURE_ORDER)), dtype=np.float64)
+    out[:, 0] = (col("rsi", 50.0) - 50.0) / 50.0
+    out[:, 1] = col("macd", 0.0) * bps
+    out[:, 2] = col("macd_signal", 0.0) * bps
+    out[:, 3] = col("macd_hist", 0.0) * bps
+    out[:, 4] = (col("kd_k", 50.0) - 50.0) / 50.0
+    out[:, 5] = (col("kd_d", 50.0) - 50.0) / 50.0
+    out[:, 6] = col("atr", 0.0) * bps
+    out[:, 7] = (col("adx", 25.0) - 25.0) / 25.0
+    out[:, 8] = relative(col("vwap", np.zeros(n)))
+    out[:, 9] = relative(col("ema5", np.zeros(n)))
+    out[:, 10] = relative(col("ema20", np.zeros(n)))
+    out[:, 11] = bband_pos - 0.5
+    out[:, 12] = np.where(band, (upper - lower) * bps, 0.0)
+    out[:, 13] = np.log1p(np.maximum(col("volume", 0.0), 0.0))
+    out[:, 14] = (col("rsi_5m", 50.0) - 50.0) / 50.0
+    out[:, 15] = (col("rsi_15m", 50.0) - 50.0) / 50.0
+    return out
+
+
+class DecisionEngine_v2:
+    """
+    v4 回歸型決策引擎：
+    - ParamsStore 權重依 FEATURE_ORDER 編譯成 NumPy 向量，每筆 tick 只做一次內積 + logistic
+    - bias_prob 為上漲機率；entry_score_v2 = 2 * bias_prob - 1（正偏多、負偏空）
+    - exit_score_v2 為持倉方向的反向分數（多單 = -entry_score_v2，空單 = entry_score_v2），未持倉為 0
+    - entry_score（與規則型共用的整數欄位）= round(entry_score_v2 * ENTRY_SCORE_SCALE)，範圍 -10 ~ 10
+    - 編譯結果 (version, weights, intercept) 存成單一 tuple，換版時整個替換，tick 迴圈不需加鎖
+    - start_watcher() 以背景執行緒監看 ParamsStore 檔案，版本更新即重新編譯
+    """
+
+    BIAS_CODES = {"bullish": 1, "bearish": -1, "neutral": 0}
+    ENTRY_SCORE_SCALE = 10
+
+    def __init__(self, params_store: ParamsStore | None = None, cfg: dict | None = None):
+        self.params_store = params_store if params_store is not None else ParamsStore()
+        self.cfg = {
+            "entry_threshold": 0.0,
+            "exit_threshold": 0.0,
+            "bias_prob_threshold": 0.55,
+        }
+        if cfg:
+            self.cfg.update(cfg)
+        self._compiled = None
+        self._watcher = None
+        self._watcher_stop = threading.Event()
+        self.compile()
+
+    @property
+    def version(self) -> str:
+        return self._compiled[0]
+
+    def compile(self):
+        """讀取 ParamsStore 權重並編譯成向量（沒有權重時使用 DEFAULT_WEIGHTS）"""
+        weights = self.params_store.get_weights()
+        version = self.params_store.get_version()
+        if not weights:
+            weights, version = DEFAULT_WEIGHTS, f"{version}+default"
+        unknown = set(weights) - set(FEATURE_ORDER) - {"intercept"}
+        if unknown:
+            log.warning("⚠️ 忽略未知的權重 key：%s", sorted(unknown))
+        vector = np.array([weights.get(name, 0.0) for name in FEATURE_ORDER], dtype=np.float64)
+        self._compiled = (version, vector, float(weights.get("intercept", 0.0)))
+        return self._compiled
+
+    def refresh(self) -> bool:
+        """ParamsStore 有新版本時重新編譯；失敗則保留舊權重"""
+        try:
+            if not self.params_store.refresh():
+                return False
+            old = self._compiled[0]
+            self.compile()
+        except Exception as e:
+            log.warning("⚠️ 權重重新載入失敗，沿用 %s：%s", self._compiled[0], e)
+            return False
+        if self._compiled[0] != old:
+            log.info("✅ 權重已更新：%s → %s", old, self._compiled[0])
+        return True
+
+    def start_watcher(self, interval: float = 2.0):
+        """背景執行緒每 interval 秒檢查一次 ParamsStore"""
+        if self._watcher is not None:
+            return
+        self._watcher_stop.clear()
+
+        def _watch():
+            while not self._watcher_stop.wait(interval):
+                self.refresh()
+
+        self._watcher = threading.Thread(target=_watch, name="params-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._watcher_stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _bias(self, prob: float) -> str:
+        threshold = self.cfg["bias_prob_threshold"]
+        if prob >= threshold:
+            return "bullish"
+        if prob <= 1.0 - threshold:
+            return "bearish"
+        return "neutral"
+
+    def _score(self, features: list, direction: str | None) -> tuple:
+        version, weights, intercept = self._compiled  # 一次取出，換版不影響這筆計算
+        z = float(np.dot(features, weights)) + intercept
+        prob = 1.0 / (1.0 + math.exp(-z)) if z >= 0 else math.exp(z) / (1.0 + math.exp(z))
+        entry_score = 2.0 * prob - 1.0
+        if direction == "long":
+            exit_score = -entry_score
+        elif direction == "short":
+            exit_score = entry_score
+        else:
+            exit_score = 0.0
+        return self._bias(prob), prob, entry_score, exit_score, version
+
+    def evaluate_tick(self, tick: TickRecord | dict, direction: str | None = None) -> dict:
+        """單筆評估：回傳 bias、bias_prob、entry_score、entry_score_v2、exit_score_v2、params_version、mode"""
+        features = extract_record_features(tick) if isinstance(tick, TickRecord) else extract_features(tick)
+        bias, prob, entry_score, exit_score, version = self._score(features, direction)
+        return {
+            "bias": bias,
+            "bias_prob": prob,
+            "entry_score": round(entry_score * self.ENTRY_SCORE_SCALE),
+            "entry_score_v2": entry_score,
+            "exit_score_v2": exit_score,
+            "params_version": version,
+            "mode": "regression_based",
+        }
+
+    def evaluate_into(self, tick: TickRecord, direction: str | None = None):
+        """evaluate_tick 的 TickEngine 版本：結果直接寫回 TickRecord，不另建 dict"""
+        tick.bias, tick.bias_prob, tick.entry_score_v2, tick.exit_score_v2, tick.params_version = self._score(
+            extract_record_features(tick), direction)
+        tick.entry_score = round(tick.entry_score_v2 * self.ENTRY_SCORE_SCALE)
+        tick.mode = "regression_based"
+
+    def evaluate_ticks(self, matrix, volume=None) -> dict:
+        """
+        整批評估（回測用）：
+        - matrix 為 FeatureMatrix（欄位 FEATURE_COLUMNS）或 {欄位名: 陣列}；volume 可另外傳入
+        - 回傳 bias_prob、entry_score_v2 陣列與 bias 代碼（1 偏多、-1 偏空、0 中性）
+        """
+        if isinstance(matrix, np.ndarray):
+            from FeatureMatrix import FEATURE_COLUMNS
+            columns = {name: matrix[:, i] for i, name in enumerate(FEATURE_COLUMNS)}
+        else:
+            columns = dict(matrix)
+        if volume is not None:
+            columns["volume"] = volume
+        version, weights, intercept = self._compiled
+        z = extract_feature_matrix(columns) @ weights + intercept
+        prob = 0.5 * (1.0 + np.tanh(0.5 * z))  # 數值穩定的 logistic
+        threshold = self.cfg["bias_prob_threshold"]
+        bias = np.where(prob >= threshold, 1, np.where(prob <= 1.0 - threshold, -1, 0)).astype(np.int8)
+        return {
+            "bias": bias,
+            "bias_prob": prob,
+            "entry_score_v2": 2.0 * prob - 1.0,
+            "params_version": version,
+        }
+
+    def should_enter(self, tick: TickRecord) -> bool:
+        if not tick.is_ready:
+            return False
+        if tick.bias == "neutral":
+            return False
+        return abs(tick.get("entry_score_v2", 0.0)) > self.cfg["entry_threshold"]
+
+    def should_exit(self, tick: TickRecord) -> bool:
+        return tick.get("exit_score_v2", 0.0) > self.cfg["exit_threshold"]
+
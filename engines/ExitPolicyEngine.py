@@ -0,0 +1,231 @@
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+# 出場規則（同一 tick 多條規則同時觸發時，依此順序取前者）；都沒觸發則以路徑最後一筆出場（"end"）
+EXIT_RULES = ("hard_stop", "atr_stop", "take_profit", "trailing_lock", "momentum", "time")
+END_RULE = len(EXIT_RULES)
+
+# 單一出場政策的參數；None 表示停用該規則（預設值同 StrategyState）
+DEFAULT_POLICY = {
+    "hard_stop": 40.0,         # 浮虧達 hard_stop 點出場
+    "atr_stop": None,          # 浮虧達 atr × atr_stop 出場（atr 取當下 tick）
+    "take_profit": None,       # 浮盈達 take_profit 點出場
+    "trail_trigger": None,     # 最大浮盈達 trail_trigger 後啟動移動鎖利
+    "trail_giveback": None,    # 啟動後自最大浮盈回吐 trail_giveback 點出場
+    "momentum_exit": None,     # 逆向 momentum：多單 momentum <= 值、空單 momentum >= -值（值通常為負）
+    "max_ticks": 90,           # 持倉 tick 數上限
+    "max_seconds": 180,        # 持倉秒數上限
+}
+
+
+def _first_hit(mask: np.ndarray) -> np.ndarray:
+    """每列第一個 True 的位置；整列皆 False 時回傳欄數（代表未觸發）"""
+    hit = mask.argmax(axis=1)
+    hit[~mask[np.arange(len(mask)), hit]] = mask.shape[1]
+    return hit
+
+
+@dataclass
+class PolicyResult:
+    policies: List[Dict[str, Any]]
+    trade_ids: List[Any]
+    pnl: np.ndarray             # (政策數, 交易數) 淨損益
+    exit_index: np.ndarray      # (政策數, 交易數) 出場 tick 位置（路徑第 0 筆為進場後第一筆）
+    exit_rule: np.ndarray       # (政策數, 交易數) EXIT_RULES 代碼，END_RULE 表示路徑結束
+    fee_per_trade: float = 0.0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def summary(self) -> pd.DataFrame:
+        """每個政策一列：勝率、平均 / 總淨損益、各規則出場次數"""
+        n = self.pnl.shape[1]
+        rows = []
+        for i, policy in enumerate(self.policies):
+            pnl = self.pnl[i]
+            counts = np.bincount(self.exit_rule[i], minlength=END_RULE + 1)
+            rows.append({
+                **policy,
+                "trades": n,
+                "win_rate": round(float((pnl > 0).mean() * 100), 2) if n else 0.0,
+                "avg_pnl": round(float(pnl.mean()), 3) if n else 0.0,
+                "total_pnl": round(float(pnl.sum()), 2),
+                "avg_hold_ticks": round(float(self.exit_index[i].mean() + 1), 1) if n else 0.0,
+                **{f"exit_{rule}": int(c) for rule, c in zip(EXIT_RULES + ("end",), counts)},
+            })
+        return pd.DataFrame(rows)
+
+    def best(self, metric: str = "avg_pnl") -> Dict[str, Any]:
+        table = self.summary()
+        return table.loc[table[metric].idxmax()].to_dict()
+
+
+class ExitPolicyEngine:
+    """
+    向量化出場政策評估：
+    - 每筆交易進場後的 tick 路徑補齊成 (交易數, 最長路徑) 的 2-D 陣列（不足處以 NaN 補）
+    - 路徑中缺價的 tick 沿用前一筆價格（第一筆即缺價則用進場價），不會讓 NaN 污染損益
+    - 浮盈路徑 profit = (price - entry_price) × 方向，累積最大 / 最小值只算一次
+    - 單調條件（硬停損、停利、時間）以「累積值仍未達門檻的 tick 數」直接得到第一次觸發位置，非單調條件（ATR 停損、移動鎖利、momentum）用 argmax 找第一個 True
+    - 每條規則的觸發位置依參數值快取，整組政策格點只是在這些向量間取最小值，輸出政策 × 交易的損益矩陣
+    """
+
+    def __init__(self, price: np.ndarray, entry_price: np.ndarray, direction, lengths: np.ndarray | None = None,
+                 elapsed: np.ndarray | None = None, momentum: np.ndarray | None = None, atr: np.ndarray | None = None,
+                 trade_ids: List[Any] | None = None, fee_per_trade: float = 2.1):
+        price = np.asarray(price, dtype=np.float64)
+        n, width = price.shape
+        if lengths is None:
+            # 路徑長度到最後一筆有價格的 tick（中間的缺價不截斷路徑）
+            has_price = ~np.isnan(price)
+            lengths = np.where(has_price.any(axis=1), width - has_price[:, ::-1].argmax(axis=1), 0)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        if (self.lengths <= 0).any():
+            raise ValueError("每筆交易至少需要一筆進場後的 tick")
+        self.entry_price = np.asarray(entry_price, dtype=np.float64)
+        self.sign = np.where(np.asarray(direction) == "short", -1.0, 1.0)
+        self.valid = np.arange(width)[None, :] < self.lengths[:, None]
+        self.price = self._fill_missing(price)
+        self.elapsed = None if elapsed is None else np.asarray(elapsed, dtype=np.float64)
+        self.momentum = None if momentum is None else np.asarray(momentum, dtype=np.float64)
+        self.atr = None if atr is None else np.asarray(atr, dtype=np.float64)
+        self.trade_ids = list(trade_ids) if trade_ids is not None else list(range(n))
+        self.fee = fee_per_trade
+
+        self.profit = (self.price - self.entry_price[:, None]) * self.sign[:, None]
+        # 補齊處：累積最小值用 +inf、累積最大值用 -inf，不會觸發任何門檻
+        self.run_min = np.minimum.accumulate(np.where(self.valid, self.profit, np.inf), axis=1)
+        self.run_max = np.maximum.accumulate(np.where(self.valid, self.profit, -np.inf), axis=1)
+        self._hits: Dict[tuple, np.ndarray] = {}
+
+    def _fill_missing(self, price: np.ndarray) -> np.ndarray:
+        """路徑內缺價（NaN）沿用前一筆價格，開頭即缺價則視為進場價；避免 NaN 經累積最大 / 最小值擴散到整條路徑"""
+        missing = self.valid & np.isnan(price)
+        if not missing.any():
+            return price
+        width = price.shape[1]
+        last_seen = np.where(missing, 0, np.arange(width)[None, :])
+        np.maximum.accumulate(last_seen, axis=1, out=last_seen)
+        filled = np.take_along_axis(price, last_seen, axis=1)
+        filled = np.where(np.isnan(filled), self.entry_price[:, None], filled)
+        return np.where(self.valid, filled, np.nan)
+
+    @classmethod
+    def from_paths(cls, paths: List[pd.DataFrame], entry_price, direction, max_ticks: int | None = None, **kwargs) -> "ExitPolicyEngine":
+        """由每筆交易的 tick DataFrame（price 必要；timestamp、momentum、atr 有則使用）組成補齊的 2-D 陣列"""
+        lengths = np.array([len(p) if max_ticks is None else min(len(p), max_ticks) for p in paths], dtype=np.int64)
+        width = int(lengths.max()) if len(lengths) else 0
+        rows = np.repeat(np.arange(len(paths)), lengths)
+        cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        frame = pd.concat([p.iloc[:k] for p, k in zip(paths, lengths)], ignore_index=True) if len(paths) else pd.DataFrame()
+
+        def pad(values: np.ndarray) -> np.ndarray:
+            out = np.full((len(paths), width), np.nan)
+            out[rows, cols] = values
+            return out
+
+        columns = {"price": pad(pd.to_numeric(frame["price"], errors="coerce").to_numpy(dtype=float))}
+        for name in ("momentum", "atr"):
+            if name in frame.columns:
+                columns[name] = pad(pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=float))
+        if "timestamp" in frame.columns:
+            times = pd.to_datetime(frame["timestamp"], format="mixed", errors="coerce").to_numpy(dtype="datetime64[ns]")
+            start = np.repeat(times[np.cumsum(lengths) - lengths], lengths)
+            columns["elapsed"] = pad((times - start) / np.timedelta64(1, "s"))
+        return cls(columns.pop("price"), entry_price, direction, lengths=lengths, **columns, **kwargs)
+
+    @classmethod
+    def from_simulator(cls, simulator, max_ticks: int | None = None, **kwargs) -> "ExitPolicyEngine":
+        """沿用 ExitStrategySimulator 的 trade_id 索引：有進場列且有 tick 的交易都納入（持倉秒數以第一筆 tick 起算）"""
+        simulator._build_trade_index()
+        trades = simulator.trade_df[simulator.trade_df["trade_id"].notna()]
+        entries = trades[trades["action"] == "ENTER"].drop_duplicates("trade_id").set_index("trade_id")
+        trade_ids = [tid for tid in simulator.tick_ranges if tid in entries.index]
+        entries = entries.loc[trade_ids]
+        paths = [simulator.ticks_for(tid) for tid in trade_ids]
+        return cls.from_paths(paths, pd.to_numeric(entries["price"], errors="coerce").to_numpy(dtype=float),
+                              entries["direction"].to_numpy(), max_ticks=max_ticks, trade_ids=trade_ids, **kwargs)
+
+    # ---------- 各規則第一次觸發位置（依參數值快取） ----------
+
+    def _rule_hit(self, rule: str, *values) -> np.ndarray:
+        key = (rule, *values)
+        if key in self._hits:
+            return self._hits[key]
+        width = self.price.shape[1]
+        if rule == "hard_stop":
+            hit = (self.run_min > -values[0]).sum(axis=1)
+        elif rule == "take_profit":
+            hit = (self.run_max < values[0]).sum(axis=1)
+        elif rule == "atr_stop":
+            if self.atr is None:
+                raise ValueError("atr_stop 需要 tick 路徑中的 atr 欄位")
+            hit = _first_hit(self.valid & (self.atr > 0) & (self.profit <= -self.atr * values[0]))
+        elif rule == "trailing_lock":
+            trigger, giveback = values
+            hit = _first_hit(self.valid & (self.run_max >= trigger) & (self.profit <= self.run_max - giveback))
+        elif rule == "momentum":
+            if self.momentum is None:
+                raise ValueError("momentum_exit 需要 tick 路徑中的 momentum 欄位")
+            hit = _first_hit(self.valid & (self.momentum * self.sign[:, None] <= values[0]))
+        elif rule == "time":
+            max_ticks, max_seconds = values
+            hit = np.full(len(self.price), width, dtype=np.int64)
+            if max_ticks is not None:
+                hit = np.minimum(hit, max(int(max_ticks), 1) - 1)
+            if max_seconds is not None:
+                if self.elapsed is None:
+                    raise ValueError("max_seconds 需要 tick 路徑中的 timestamp 欄位")
+                hit = np.minimum(hit, (np.where(self.valid, self.elapsed, np.inf) < max_seconds).sum(axis=1))
+        else:
+            raise ValueError(f"未知的出場規則：{rule}")
+        self._hits[key] = hit.astype(np.int64)
+        return self._hits[key]
+
+    def _policy_hits(self, policy: Dict[str, Any]) -> List[np.ndarray | None]:
+        p = {**DEFAULT_POLICY, **policy}
+        return [
+            None if p["hard_stop"] is None else self._rule_hit("hard_stop", p["hard_stop"]),
+            None if p["atr_stop"] is None else self._rule_hit("atr_stop", p["atr_stop"]),
+            None if p["take_profit"] is None else self._rule_hit("take_profit", p["take_profit"]),
+            None if p["trail_trigger"] is None or p["trail_giveback"] is None
+            else self._rule_hit("trailing_lock", p["trail_trigger"], p["trail_giveback"]),
+            None if p["momentum_exit"] is None else self._rule_hit("momentum", p["momentum_exit"]),
+            None if p["max_ticks"] is None and p["max_seconds"] is None
+            else self._rule_hit("time", p["max_ticks"], p["max_seconds"]),
+        ]
+
+    def evaluate(self, policy_grid: Dict[str, Any] | List[Dict[str, Any]]) -> PolicyResult:
+        """
+        policy_grid：{"hard_stop": [20, 40], "take_profit": [None, 30], ...} 展開成所有組合，或直接傳政策 dict 清單
+        未指定的參數沿用 DEFAULT_POLICY
+        """
+        if isinstance(policy_grid, dict):
+            unknown = set(policy_grid) - set(DEFAULT_POLICY)
+            if unknown:
+                raise ValueError(f"未知的出場參數：{sorted(unknown)}")
+            keys = list(policy_grid)
+            values = [v if isinstance(v, (list, tuple)) else [v] for v in policy_grid.values()]
+            policies = [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+        else:
+            policies = [dict(p) for p in policy_grid]
+
+        n = len(self.price)
+        last = self.lengths - 1
+        rows = np.arange(n)
+        pnl = np.empty((len(policies), n))
+        exit_index = np.empty((len(policies), n), dtype=np.int64)
+        exit_rule = np.empty((len(policies), n), dtype=np.int8)
+        for i, policy in enumerate(policies):
+            hits = self._policy_hits(policy)
+            stacked = np.vstack([last + 1 if h is None else h for h in hits] + [last])
+            stacked[:-1] = np.where(stacked[:-1] > last, np.iinfo(np.int64).max, stacked[:-1])
+            rule = stacked.argmin(axis=0)
+            index = stacked[rule, rows]
+            exit_rule[i] = rule
+            exit_index[i] = index
+            pnl[i] = self.profit[rows, index] - self.fee
+        return PolicyResult(policies, self.trade_ids, pnl, exit_index, exit_rule, self.fee)
+
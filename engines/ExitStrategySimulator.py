@@ -1,9 +1,15 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from TickRecorder import load_ticks
+
+EXIT_ACTIONS = ("LOCK_PROFIT", "STOPLOSS", "EXIT", "TAKEPROFIT", "TIME_EXIT")
+
 class ExitStrategySimulator:
     def __init__(self, tick_file="tick_record.csv", trade_file="trade_log.csv"):
-        self.tick_df = pd.read_csv(tick_file)
+        # ✅ 支援 .csv / .arrows / .parquet；Arrow 與 Parquet 以 memory map 載入
+        self.tick_df = load_ticks(tick_file, backend="pandas")
         self.trade_df = pd.read_csv(trade_file)
 
         if "trade_id" not in self.trade_df.columns:
@@ -21,63 +27,104 @@ class ExitStrategySimulator:
 
             self.trade_df["trade_id"] = self.trade_df.apply(format_trade_id, axis=1)
 
+        # 索引延後到第一次使用時建立（fix_tick_timestamp_by_index 會讓索引失效）
+        self._trade_index = None
+        self._time_index = None
+        self.tick_order = None
+        self.tick_ranges = {}
+
     def fix_tick_timestamp_by_index(self, base_date="2025-11-13", start_time="09:34:59", interval_sec=0.2):
         base = pd.to_datetime(f"{base_date} {start_time}")
         self.tick_df["timestamp"] = self.tick_df["tick_index"].apply(
             lambda i: base + pd.to_timedelta(i * interval_sec, unit="s")
         )
+        self._trade_index = None
+        self._time_index = None
+
+    def _build_trade_index(self) -> pd.DataFrame:
+        """
+        建立 trade_id 索引（只建一次，之後每組門檻都直接查表）：
+        - tick 依 trade_id 穩定排序，tick_ranges 記錄每個 trade_id 在 tick_order 中的 [start, stop) 範圍
+        - 每筆交易最弱的 tick（momentum 最小的第一筆）以 reduceat 一次算出
+        - 進場列 / 出場列各取該 trade_id 的第一筆，不再於迴圈內篩選整張 trade_df
+        """
+        if self._trade_index is not None:
+            return self._trade_index
+
+        codes, trade_ids = pd.factorize(self.tick_df["trade_id"], sort=True)
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        starts = np.searchsorted(codes[order], np.arange(len(trade_ids)))
+        stops = np.append(starts[1:], len(order)).astype(np.int64)
+        self.tick_order = order
+        self.tick_ranges = {tid: (int(a), int(b)) for tid, a, b in zip(trade_ids, starts, stops)}
+
+        ticks = self.tick_df.iloc[order]
+        momentum = pd.to_numeric(ticks["momentum"], errors="coerce").to_numpy(dtype=float)
+        price = pd.to_numeric(ticks["price"], errors="coerce").to_numpy(dtype=float)
+        direction_score = pd.to_numeric(ticks["direction_score"], errors="coerce").to_numpy(dtype=float)
+        # 與逐筆 astype(float) / astype(int) 相同的失敗條件：非空值無法轉數字，或 direction_score 為空
+        bad = (ticks["momentum"].notna().to_numpy() & np.isnan(momentum)) | \
+              (ticks["price"].notna().to_numpy() & np.isnan(price)) | np.isnan(direction_score)
+        tick_time = pd.to_datetime(ticks["timestamp"], format="mixed", errors="coerce").to_numpy()
+
+        n = len(trade_ids)
+        min_pos = np.zeros(n, dtype=np.int64)
+        has_min = np.zeros(n, dtype=bool)
+        bad_group = np.zeros(n, dtype=bool)
+        if len(order):
+            bad_group = np.logical_or.reduceat(bad, starts)
+            mins = np.fmin.reduceat(momentum, starts)
+            has_min = ~np.isnan(mins)
+            hits = np.flatnonzero(momentum == np.repeat(mins, stops - starts))
+            if len(hits):
+                min_pos = hits[np.minimum(np.searchsorted(hits, starts), len(hits) - 1)]
+
+        trades = self.trade_df[self.trade_df["trade_id"].notna()]
+        entries = trades.drop_duplicates("trade_id").set_index("trade_id").reindex(trade_ids)
+        exits = trades[trades["action"].isin(EXIT_ACTIONS)].drop_duplicates("trade_id").set_index("trade_id").reindex(trade_ids)
+
+        index = pd.DataFrame({
+            "trade_id": trade_ids,
+            "entry_price": entries["price"].to_numpy(),
+            "direction": entries["direction"].to_numpy(),
+            "exit_price": exits["price"].to_numpy(),
+            "exit_time": pd.to_datetime(exits["timestamp"], format="mixed", errors="coerce").to_numpy(),
+            "min_momentum": momentum[min_pos],
+            "min_price": price[min_pos],
+            "min_direction_score": np.trunc(direction_score[min_pos]),
+            "min_time": tick_time[min_pos],
+        })
+        paired = entries["action"].notna().to_numpy() & exits["action"].notna().to_numpy()
+        for tid in index["trade_id"][paired & bad_group]:
+            print(f"⚠️ 欄位轉換失敗：{tid}")
+        # 最弱 tick 在原出場時間之後（含）不列入；NaT 比較為 False，與逐筆版本相同
+        late = (index["min_time"] >= index["exit_time"]).to_numpy()
+        self._trade_index = index[paired & ~bad_group & has_min & ~late].reset_index(drop=True)
+        return self._trade_index
+
+    def ticks_for(self, trade_id) -> pd.DataFrame:
+        """以 trade_id 索引直接切出該筆交易的 tick（不掃描整張 tick_df）"""
+        self._build_trade_index()
+        start, stop = self.tick_ranges.get(trade_id, (0, 0))
+        return self.tick_df.iloc[self.tick_order[start:stop]]
 
     def simulate_exit_by_min_momentum(self, momentum_threshold=-3, direction_score_filter=None):
         matched_ids = set(self.trade_df["trade_id"]) & set(self.tick_df["trade_id"])
         print(f"✅ 可比對的 trade_id 筆數：{len(matched_ids)}")
 
-        simulated_results = []
-        triggered_ids = []
-
-        for trade_id, group in self.tick_df.groupby("trade_id"):
-            entry_row = self.trade_df[self.trade_df["trade_id"] == trade_id]
-            if entry_row.empty:
-                continue
-            entry_price = entry_row.iloc[0]["price"]
-            direction = entry_row.iloc[0]["direction"]
-
-            exit_row = self.trade_df[
-                (self.trade_df["trade_id"] == trade_id) &
-                (self.trade_df["action"].isin(["LOCK_PROFIT", "STOPLOSS", "EXIT", "TAKEPROFIT", "TIME_EXIT"]))
-            ]
-            if exit_row.empty:
-                continue
-            original_exit_price = exit_row.iloc[0]["price"]
-            exit_time = pd.to_datetime(exit_row.iloc[0]["timestamp"])
-
-            group = group.copy()
-            try:
-                group["momentum"] = group["momentum"].astype(float)
-                group["direction_score"] = group["direction_score"].astype(int)
-                group["price"] = group["price"].astype(float)
-            except Exception as e:
-                print(f"⚠️ 欄位轉換失敗：{trade_id}｜錯誤：{e}")
-                continue
-
-            min_tick = group.loc[group["momentum"].idxmin()]
-            tick_time = pd.to_datetime(min_tick["timestamp"])
-            if tick_time >= exit_time:
-                continue
-
-            if min_tick["momentum"] <= momentum_threshold:
-                if direction_score_filter is None or min_tick["direction_score"] == direction_score_filter:
-                    simulated_exit_price = min_tick["price"]
-                    triggered_ids.append(trade_id)
-                else:
-                    simulated_exit_price = original_exit_price
-            else:
-                simulated_exit_price = original_exit_price
-
-            simulated_pl = simulated_exit_price - entry_price if direction == "long" else entry_price - simulated_exit_price
-            simulated_results.append(simulated_pl)
-
-        win_rate = sum(1 for r in simulated_results if r > 0) / len(simulated_results) * 100 if simulated_results else 0
-        avg_pl = sum(simulated_results) / len(simulated_results) if simulated_results else 0
+        index = self._build_trade_index()
+        triggered = (index["min_momentum"] <= momentum_threshold).to_numpy()
+        if direction_score_filter is not None:
+            triggered = triggered & (index["min_direction_score"] == direction_score_filter).to_numpy()
+        exit_price = np.where(triggered, index["min_price"], index["exit_price"]).astype(float)
+        entry_price = index["entry_price"].to_numpy(dtype=float)
+        simulated_results = np.where(index["direction"] == "long", exit_price - entry_price, entry_price - exit_price)
+        triggered_ids = index["trade_id"][triggered].tolist()
+
+        count = len(simulated_results)
+        win_rate = float((simulated_results > 0).sum()) / count * 100 if count else 0
+        avg_pl = float(simulated_results.mean()) if count else 0
 
         return {
             "mode": "min_momentum",
@@ -98,26 +145,55 @@ class ExitStrategySimulator:
                 results.append(result)
         return results
 
-    def scan_trade_log_by_momentum(self, momentum_threshold=-2):
+    def scan_exit_policies(self, policy_grid, max_ticks=None, top_n=10, fee_per_trade=2.1):
+        """多規則出場政策一次評估（ExitPolicyEngine）：回傳 PolicyResult，並列出平均損益最高的 top_n 組"""
+        from ExitPolicyEngine import ExitPolicyEngine
+
+        print("\n📊 多規則出場政策掃描：")
+        engine = ExitPolicyEngine.from_simulator(self, max_ticks=max_ticks, fee_per_trade=fee_per_trade)
+        result = engine.evaluate(policy_grid)
+        table = result.summary().sort_values("avg_pnl", ascending=False)
+        print(f"✅ {len(result.policies)} 組政策 × {len(result.trade_ids)} 筆交易")
+        print(table.head(top_n).to_string(index=False))
+        return result
+
+    def _build_time_index(self):
+        """tick 依時間排序（只建一次），供 searchsorted 取時間窗"""
+        if self._time_index is None:
+            times = pd.to_datetime(self.tick_df["timestamp"], format="mixed", errors="coerce").to_numpy(dtype="datetime64[ns]")
+            valid = np.flatnonzero(~np.isnat(times))
+            order = valid[np.argsort(times[valid], kind="stable")]
+            self._time_index = (times[order].astype(np.int64), order)
+        return self._time_index
+
+    def scan_trade_log_by_momentum(self, momentum_threshold=-2, window_seconds=3):
+        """
+        每筆交易列前後 window_seconds 秒內是否有符合方向的弱 momentum tick：
+        - tick 時間排序後以 searchsorted 取每筆交易的 [lo, hi) 視窗
+        - 命中數用前綴和相減，整體為 O((trades + ticks) log ticks)
+        """
         print("\n📊 掃描 trade_log.csv 是否命中最弱 momentum 條件：")
-        triggered = []
-        for _, row in self.trade_df.iterrows():
-            tid = row["trade_id"]
-            ts = pd.to_datetime(row["timestamp"])
-            direction = "long" if "long" in tid else "short"
-            nearby = self.tick_df[
-                (self.tick_df["timestamp"] >= ts - pd.Timedelta(seconds=3)) &
-                (self.tick_df["timestamp"] <= ts + pd.Timedelta(seconds=3))
-            ]
-            match = nearby[
-                (nearby["momentum"] <= momentum_threshold) &
-                ((nearby["direction_score"] == -1) if direction == "short" else (nearby["direction_score"] == 1))
-            ]
-            if not match.empty:
-                triggered.append(tid)
+        times, order = self._build_time_index()
+        momentum = pd.to_numeric(self.tick_df["momentum"], errors="coerce").to_numpy(dtype=float)[order]
+        direction_score = pd.to_numeric(self.tick_df["direction_score"], errors="coerce").to_numpy(dtype=float)[order]
+        weak = momentum <= momentum_threshold
+        long_hits = np.concatenate([[0], np.cumsum(weak & (direction_score == 1))])
+        short_hits = np.concatenate([[0], np.cumsum(weak & (direction_score == -1))])
+
+        trade_ids = self.trade_df["trade_id"]
+        trade_time = pd.to_datetime(self.trade_df["timestamp"], format="mixed", errors="coerce").to_numpy(dtype="datetime64[ns]")
+        window = np.int64(window_seconds * 1_000_000_000)
+        ts = trade_time.astype(np.int64)
+        lo = np.searchsorted(times, ts - window, side="left")
+        hi = np.searchsorted(times, ts + window, side="right")
+        is_long = trade_ids.astype(str).str.contains("long", regex=False).to_numpy() & trade_ids.notna().to_numpy()
+        hits = np.where(is_long, long_hits[hi] - long_hits[lo], short_hits[hi] - short_hits[lo])
+        triggered = trade_ids[(hits > 0) & ~np.isnat(trade_time)].tolist()
+
         print(f"✅ 命中筆數：{len(triggered)}")
         for i, tid in enumerate(triggered[:10]):
             print(f"  {i+1}. {tid}")
+        return triggered
 
     def show_momentum_distribution(self):
         print("\n📊 momentum 分布統計：")
@@ -0,0 +1,365 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Clock import to_datetime
+from IncrementalIndicatorEngine import IncrementalIndicatorEngine
+from MultiTimeframeEngine import DAY_SESSION, NIGHT_SESSION, MultiTimeframeEngine
+
+# 指標計算方式改變時遞增，讓 FeatureCache 的舊快取失效
+FEATURE_VERSION = 1
+
+# TickEngine 每筆 tick 寫入的指標欄位（compute_all_indicators + MultiTimeframeEngine）
+INDICATOR_COLUMNS = [
+    "rsi", "macd", "macd_signal", "macd_hist", "kd_k", "kd_d",
+    "bband_upper", "bband_middle", "bband_lower", "bband_signal",
+    "atr", "ema5", "ema20", "adx", "vwap", "close",
+]
+MTF_COLUMNS = [
+    "rsi_1m", "ema_1m", "is_ready_1m",
+    "rsi_5m", "ema_5m", "is_ready_5m",
+    "rsi_15m", "ema_15m", "is_ready_15m",
+]
+FEATURE_COLUMNS = INDICATOR_COLUMNS + MTF_COLUMNS
+READY_COLUMNS = ["is_ready_1m", "is_ready_5m", "is_ready_15m"]
+BBAND_SIGNALS = ("Neutral", "BreakUp", "BreakDown")
+_BBAND_CODES = {name: i for i, name in enumerate(BBAND_SIGNALS)}
+_BBAND_INDEX = FEATURE_COLUMNS.index("bband_signal")
+_READY_INDEX = [FEATURE_COLUMNS.index(name) for name in READY_COLUMNS]
+
+
+def feature_config(indicator_mode: str = "compat") -> dict:
+    """影響指標矩陣內容的所有設定（FeatureCache 以此計算設定雜湊）"""
+    mtf = MultiTimeframeEngine()
+    return {
+        "version": FEATURE_VERSION,
+        "indicator_mode": indicator_mode,
+        "columns": FEATURE_COLUMNS,
+        "timeframes": list(mtf.timeframes),
+        "rsi_period": mtf.rsi_period,
+        "ema_periods": {str(k): v for k, v in mtf.ema_periods.items()},
+        "ready_bars": mtf.ready_bars,
+    }
+
+
+def build_feature_matrix(timestamps, prices, volumes, indicator_mode: str = "compat", vectorized: bool = True) -> np.ndarray:
+    """
+    依 TickEngine 相同的方式計算指標，回傳 (n, len(FEATURE_COLUMNS)) 的 float64 矩陣
+    - 指標只與 tick 資料有關，與決策 / 風控參數無關，同一份資料只需計算一次
+    - bband_signal 以 BBAND_SIGNALS 的索引、is_ready_* 以 0/1 儲存
+    - compat 模式整段以 NumPy 向量化計算，運算順序與逐筆引擎相同，結果逐位元一致
+    - wilder 模式（或 vectorized=False）逐筆呼叫 IncrementalIndicatorEngine / MultiTimeframeEngine
+    """
+    if vectorized and indicator_mode == "compat":
+        return _build_vectorized(timestamps, prices, volumes)
+    n = len(prices)
+    matrix = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float64)
+    indicator_engine = IncrementalIndicatorEngine(mode=indicator_mode)
+    mtf_engine = MultiTimeframeEngine()
+    prices = np.asarray(prices, dtype=np.float64).tolist()
+    volumes = np.asarray(volumes, dtype=np.float64).tolist()
+    for i in range(n):
+        price = prices[i]
+        volume = volumes[i]
+        row = indicator_engine.update(price, price, price, volume)
+        row["bband_signal"] = _BBAND_CODES[row["bband_signal"]]
+        row.update(mtf_engine.update(timestamps[i], price, volume))
+        matrix[i] = [row[name] for name in FEATURE_COLUMNS]
+    return matrix
+
+
+# ====== 向量化版本（compat） ======
+
+_DAY_US = 86_400_000_000
+_MINUTE_US = 60_000_000
+_NO_SESSION = np.iinfo(np.int64).min
+
+
+def _build_vectorized(timestamps, prices, volumes) -> np.ndarray:
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    if not len(prices):
+        return np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float64)
+    columns = _indicator_columns(prices, volumes)
+    columns.update(_timeframe_columns(_timestamps_us(timestamps), prices))
+    matrix = np.empty((len(prices), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for i, name in enumerate(FEATURE_COLUMNS):
+        matrix[:, i] = columns[name]
+    return matrix
+
+
+def _round(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """與 Python round(x, ndigits) 逐位元相同：以 rint 計算，落在進位邊界附近的少數值改用 round() 重算"""
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    out = np.rint(scaled) / scale
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= np.maximum(1e-6, np.abs(scaled) * 1e-12)
+    for i in np.flatnonzero(near_half):
+        out[i] = round(float(values[i]), ndigits)
+    return out
+
+
+def _rolling_totals(values: np.ndarray, period: int, resync_every: int = 4096) -> np.ndarray:
+    """_RollingSum 每次 add 後的 total：依相同順序「先減最舊、再加新值」累加，每 resync_every 次以 sum() 重算"""
+    n = len(values)
+    totals = np.empty(n, dtype=np.float64)
+    # -0.0 與任何數相加結果不變，用來補齊視窗未滿時沒有「減最舊」的位置
+    removed = np.full(n, -0.0)
+    removed[period:] = -values[:n - period]
+    total = 0.0
+    for a in range(0, n, resync_every):
+        b = min(a + resync_every, n)
+        ops = np.empty(2 * (b - a) + 1, dtype=np.float64)
+        ops[0] = total
+        ops[1::2] = removed[a:b]
+        ops[2::2] = values[a:b]
+        totals[a:b] = np.cumsum(ops)[2::2]
+        if b - a == resync_every:
+            totals[b - 1] = sum(values[max(b - period, 0):b].tolist())
+        total = totals[b - 1]
+    return totals
+
+
+def _ema_series(values: np.ndarray, alpha: float) -> np.ndarray:
+    """串流 EMA（第一筆為種子）每一步的值"""
+    beta = 1 - alpha
+    out = []
+    ema = None
+    for x in values.tolist():
+        ema = x if ema is None else alpha * x + beta * ema
+        out.append(ema)
+    return np.array(out, dtype=np.float64)
+
+
+def _indicator_columns(close: np.ndarray, volume: np.ndarray) -> dict:
+    """IncrementalIndicatorEngine(mode="compat").update(price, price, price, volume) 逐筆輸出的各欄"""
+    engine = IncrementalIndicatorEngine
+    n = len(close)
+    count = np.arange(1, n + 1)
+    columns = {"close": close}
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for period in engine.EMA_PERIODS:
+            ema = _ema_series(close, 2 / (period + 1))
+            columns[f"ema{period}"] = np.where(count < period, close, _round(ema, 2))
+
+        pv_sum = np.cumsum(close * volume)
+        volume_sum = np.cumsum(volume)
+        columns["vwap"] = np.where(volume_sum > 0, _round(pv_sum / volume_sum, 2), 0.0)
+
+        # Bollinger：與引擎相同，以第一筆價格平移後做滑動加總
+        columns.update(_bollinger_columns(close, count))
+
+        # 前後兩筆的漲跌（high = low = close）
+        delta = close[1:] - close[:-1]
+        down_move = close[:-1] - close[1:]
+        gains = _rolling_totals(np.where(delta > 0, delta, 0.0), engine.RSI_PERIOD)
+        losses = _rolling_totals(np.where(delta < 0, -delta, 0.0), engine.RSI_PERIOD)
+        tr = _rolling_totals(np.abs(delta), engine.ATR_PERIOD)
+        plus_dm = _rolling_totals(np.where((delta > down_move) & (delta > 0), delta, 0.0), engine.ADX_PERIOD)
+        minus_dm = _rolling_totals(np.where((down_move > delta) & (down_move > 0), down_move, 0.0), engine.ADX_PERIOD)
+
+        avg_gain = gains / engine.RSI_PERIOD
+        avg_loss = losses / engine.RSI_PERIOD
+        rsi = np.where(avg_loss == 0, 100.0, _round(100 - (100 / (1 + avg_gain / avg_loss)), 1))
+        columns["rsi"] = _after(rsi, engine.RSI_PERIOD, 50.0, n)
+        columns["atr"] = _after(_round(tr / engine.ATR_PERIOD, 2), engine.ATR_PERIOD, 0.0, n)
+
+        plus_di = 100 * plus_dm / tr
+        minus_di = 100 * minus_dm / tr
+        di_sum = plus_di + minus_di
+        dx = np.where(tr == 0, 0.0, np.where(di_sum != 0, np.abs(plus_di - minus_di) / di_sum * 100, 0.0))
+        columns["adx"] = _after(_round(dx, 2), engine.ADX_PERIOD, 0.0, n)
+
+    columns.update(_kd_columns(close, engine.KD_PERIOD))
+    columns.update(_macd_columns(close, engine.MACD_WINDOW))
+    return columns
+
+
+def _after(values: np.ndarray, period: int, default: float, n: int) -> np.ndarray:
+    """由第 2 筆起累加的滑動視窗：第 period + 1 筆（視窗填滿）之前輸出 default"""
+    out = np.full(n, default, dtype=np.float64)
+    out[period:] = values[period - 1:]
+    return out
+
+
+def _bollinger_columns(close: np.ndarray, count: np.ndarray) -> dict:
+    engine = IncrementalIndicatorEngine
+    period = engine.BBAND_PERIOD
+    full = count >= period
+    anchor = close[0]
+    shifted = close - anchor
+    mean_shifted = _rolling_totals(shifted, period) / period
+    var = np.maximum(_rolling_totals(shifted * shifted, period) / period - mean_shifted * mean_shifted, 0.0)
+    std = np.sqrt(var)
+    ma = anchor + mean_shifted
+    upper = ma + engine.BBAND_STD * std
+    lower = ma - engine.BBAND_STD * std
+    signal = np.where(close > upper, _BBAND_CODES["BreakUp"], np.where(close < lower, _BBAND_CODES["BreakDown"], 0))
+    return {
+        "bband_upper": np.where(full, _round(upper, 2), 0.0),
+        "bband_middle": np.where(full, _round(ma, 2), 0.0),
+        "bband_lower": np.where(full, _round(lower, 2), 0.0),
+        "bband_signal": np.where(full, signal, 0).astype(np.float64),
+    }
+
+
+def _kd_columns(close: np.ndarray, period: int) -> dict:
+    n = len(close)
+    kd_k = np.full(n, 50.0)
+    kd_d = np.full(n, 50.0)
+    if n >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(close, period)
+        low_min = windows.min(axis=1)
+        high_max = windows.max(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsv = np.where(high_max != low_min, (close[period - 1:] - low_min) / (high_max - low_min) * 100, 50)
+        k = (2/3) * 50 + (1/3) * rsv
+        d = (2/3) * 50 + (1/3) * k
+        kd_k[period - 1:] = _round(k, 1)
+        kd_d[period - 1:] = _round(d, 1)
+    return {"kd_k": kd_k, "kd_d": kd_d}
+
+
+def _macd_columns(close: np.ndarray, window: int, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9) -> dict:
+    """_compute_macd(最近 window 筆)：各列的 EMA 由視窗起點逐步算起，整批列一起推進"""
+    n = len(close)
+    columns = {name: np.zeros(n) for name in ("macd", "macd_signal", "macd_hist")}
+    if n < window:
+        return columns
+    rows = np.arange(window - 1, n)
+
+    def ema(period):
+        alpha = 2 / (period + 1)
+        value = close[rows - (period - 1)]
+        for lag in range(period - 2, -1, -1):
+            value = alpha * close[rows - lag] + (1 - alpha) * value
+        return value
+
+    fast_ema = ema(fast_period)
+    slow_ema = ema(slow_period)
+    macd = fast_ema - slow_ema
+    alpha = 2 / (signal_period + 1)
+    signal = macd
+    for _ in range(signal_period):
+        signal = alpha * (fast_ema - slow_ema) + (1 - alpha) * signal
+    columns["macd"][window - 1:] = _round(macd, 2)
+    columns["macd_signal"][window - 1:] = _round(signal, 2)
+    columns["macd_hist"][window - 1:] = _round(macd - signal, 2)
+    return columns
+
+
+def _timestamps_us(timestamps) -> np.ndarray:
+    """timestamp 轉成 int64 微秒（本地時間；datetime64 陣列直接轉換，字串逐筆經 to_datetime）"""
+    stamps = np.asarray(timestamps)
+    if stamps.dtype.kind != "M":
+        values = stamps.tolist()
+        if not all(isinstance(ts, datetime) for ts in values):
+            values = [to_datetime(ts) for ts in values]
+        index = pd.DatetimeIndex(values)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        stamps = index.values
+    return stamps.astype("datetime64[us]").astype(np.int64)
+
+
+def _clock_us(t) -> int:
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond
+
+
+def _session_bucket_start(ts: np.ndarray, span: int) -> np.ndarray:
+    """BarBuilder._bucket 的 K 棒起點（微秒）；非交易時段為 _NO_SESSION"""
+    day = ts - ts % _DAY_US
+    clock = ts - day
+    day_open, day_close = _clock_us(DAY_SESSION[0]), _clock_us(DAY_SESSION[1])
+    night_open, night_close = _clock_us(NIGHT_SESSION[0]), _clock_us(NIGHT_SESSION[1])
+
+    in_day = (clock >= day_open) & (clock <= day_close)
+    night_first = ~in_day & (clock >= night_open)
+    night_second = ~in_day & ~night_first & (clock <= night_close)
+    open_time = np.select([in_day, night_first, night_second],
+                          [day + day_open, day + night_open, day - _DAY_US + night_open], 0)
+    close_time = np.select([in_day, night_first, night_second],
+                           [day + day_close, day + _DAY_US + night_close, day + night_close], 0)
+    start = open_time + (ts - open_time) // span * span
+    start = np.where(start >= close_time, close_time - span, start)
+    return np.where(in_day | night_first | night_second, start, _NO_SESSION)
+
+
+def _assign_bars(ts: np.ndarray, bucket: np.ndarray, span: int) -> np.ndarray:
+    """
+    依 BarBuilder.update 的切換規則，回傳每筆 tick 所屬 K 棒的序號（0 起算，等於當下已收 K 棒數）
+    - 連續同一區間（或同為盤外）的 tick，只要目前 K 棒起點就是該區間（或已有 K 棒可併入），整段都屬於目前 K 棒
+    - 其餘情況（第一筆、區間切換、併入起點不同的 K 棒）才逐筆套用 update 的判斷
+    """
+    n = len(ts)
+    bar_ids = np.empty(n, dtype=np.int64)
+    run_starts = [0, *(np.flatnonzero(bucket[1:] != bucket[:-1]) + 1).tolist(), n]
+    stamps = ts.tolist()
+    buckets = bucket.tolist()
+    bar = -1
+    start = end = 0
+    for a, b in zip(run_starts[:-1], run_starts[1:]):
+        run_bucket = buckets[a]
+        for i in range(a, b):
+            if bar >= 0 and (run_bucket == start or run_bucket == _NO_SESSION):
+                bar_ids[i:b] = bar
+                break
+            t = stamps[i]
+            if bar < 0 or not (start <= t < end):
+                key = run_bucket
+                if key == _NO_SESSION:
+                    key = t - t % _MINUTE_US  # 第一筆即在盤外：自成一根 off K 棒
+                if bar < 0 or key != start:
+                    bar += 1
+                    start, end = key, key + span
+            bar_ids[i] = bar
+    return bar_ids
+
+
+def _timeframe_columns(ts: np.ndarray, price: np.ndarray) -> dict:
+    """MultiTimeframeEngine.update 逐筆輸出的 rsi_xm / ema_xm / is_ready_xm"""
+    mtf = MultiTimeframeEngine()
+    period = mtf.rsi_period
+    columns = {}
+    for m in mtf.timeframes:
+        span = m * _MINUTE_US
+        closed = _assign_bars(ts, _session_bucket_start(ts, span), span)
+        bar_close = price[np.flatnonzero(np.diff(closed))]  # 各根已收 K 棒的收盤價（依收盤順序）
+
+        # RSI：已收 K 棒之間的漲跌以滑動加總維護，再加上未收 K 棒的漲跌
+        rsi = np.full(len(price), 50.0)
+        ready = closed >= period
+        if ready.any():
+            bar_delta = bar_close[1:] - bar_close[:-1]
+            gains = _rolling_totals(np.where(bar_delta > 0, bar_delta, 0.0), period - 1)
+            losses = _rolling_totals(np.where(bar_delta < 0, -bar_delta, 0.0), period - 1)
+            k = closed[ready]
+            delta = price[ready] - bar_close[k - 1]
+            avg_gain = (gains[k - 2] + np.where(delta > 0, delta, 0.0)) / period
+            avg_loss = (losses[k - 2] + np.where(delta < 0, -delta, 0.0)) / period
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rsi[ready] = np.where(avg_loss == 0, 100.0, _round(100 - (100 / (1 + avg_gain / avg_loss)), 1))
+
+        # EMA：已收 K 棒的串流 EMA，再以目前價格推進一步
+        ema = price.copy()
+        ema_period = mtf.ema_periods[m]
+        ema_ready = (closed >= 1) & (closed + 1 >= ema_period)
+        if ema_ready.any():
+            alpha = 2 / (ema_period + 1)
+            ema_closed = _ema_series(bar_close, alpha)
+            ema[ema_ready] = _round(alpha * price[ema_ready] + (1 - alpha) * ema_closed[closed[ema_ready] - 1], 2)
+
+        columns[f"rsi_{m}m"] = rsi
+        columns[f"ema_{m}m"] = ema
+        columns[f"is_ready_{m}m"] = (closed >= mtf.ready_bars).astype(np.float64)
+    return columns
+
+
+def decode_feature_row(values: list) -> dict:
+    """將矩陣的一列轉回 TickEngine 使用的指標 dict"""
+    values[_BBAND_INDEX] = BBAND_SIGNALS[int(values[_BBAND_INDEX])]
+    for i in _READY_INDEX:
+        values[i] = values[i] != 0.0
+    return dict(zip(FEATURE_COLUMNS, values))
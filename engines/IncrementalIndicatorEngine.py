@@ -0,0 +1,277 @@
+import math
+from collections import deque
+
+from IndicatorEngine import _compute_macd
+
+
+class _RollingSum:
+    """固定長度滑動加總：O(1) 進出，定期重算以避免浮點累積誤差"""
+
+    def __init__(self, period: int, resync_every: int = 4096):
+        self.period = period
+        self.values = deque(maxlen=period)
+        self.total = 0.0
+        self._resync_every = resync_every
+        self._updates = 0
+
+    def add(self, value: float):
+        if len(self.values) == self.period:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+        self._updates += 1
+        if self._updates >= self._resync_every:
+            self.total = sum(self.values)
+            self._updates = 0
+
+    def is_full(self) -> bool:
+        return len(self.values) == self.period
+
+    def clear(self):
+        self.values.clear()
+        self.total = 0.0
+        self._updates = 0
+
+
+class _WilderAverage:
+    """Wilder 平滑：前 period 筆取簡單平均作種子，之後 avg = (avg * (n - 1) + x) / n"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value = None
+        self._seed_sum = 0.0
+        self._seed_count = 0
+
+    def add(self, x: float):
+        if self.value is None:
+            self._seed_sum += x
+            self._seed_count += 1
+            if self._seed_count == self.period:
+                self.value = self._seed_sum / self.period
+            return
+        self.value = (self.value * (self.period - 1) + x) / self.period
+
+    def is_ready(self) -> bool:
+        return self.value is not None
+
+
+class IncrementalIndicatorEngine:
+    """
+    增量指標引擎：
+    - 每筆 tick 以 O(1) 更新狀態，輸出欄位與 IndicatorEngine.compute_all_indicators 相同
+    - EMA / VWAP 以串流方式累積，不再從 prices[0] 重算整段歷史
+    - mode="compat"（預設）：RSI/ATR/ADX 用滑動視窗加總、KD 固定以 50 為前值，數值與 compute_all_indicators 一致
+    - mode="wilder"：RSI/ATR/ADX 改用 Wilder 平滑，KD 延續上一筆 prev_k/prev_d
+    """
+
+    RSI_PERIOD = 14
+    KD_PERIOD = 9
+    BBAND_PERIOD = 20
+    BBAND_STD = 2.0
+    ATR_PERIOD = 14
+    ADX_PERIOD = 14
+    MACD_WINDOW = 26 + 9  # _compute_macd 只用到最後 35 筆
+    EMA_PERIODS = (5, 20)
+
+    def __init__(self, mode: str = "compat"):
+        if mode not in ("compat", "wilder"):
+            raise ValueError(f"未知的指標模式：{mode}")
+        self.mode = mode
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.prev_close = None
+        self.prev_high = None
+        self.prev_low = None
+
+        self.closes = deque(maxlen=self.MACD_WINDOW)
+        self.highs = deque(maxlen=self.KD_PERIOD)
+        self.lows = deque(maxlen=self.KD_PERIOD)
+
+        # EMA：與 _compute_ema 相同，以第一筆價格為種子
+        self.ema = {p: None for p in self.EMA_PERIODS}
+        self._ema_alpha = {p: 2 / (p + 1) for p in self.EMA_PERIODS}
+
+        # VWAP：整個 session 的累計量價
+        self.pv_sum = 0.0
+        self.volume_sum = 0.0
+
+        # Bollinger：以第一筆價格為基準平移後累加，降低平方和的相消誤差
+        self._bb_anchor = None
+        self.bb_sum = _RollingSum(self.BBAND_PERIOD)
+        self.bb_sq_sum = _RollingSum(self.BBAND_PERIOD)
+
+        # compat：滑動視窗加總
+        self.gains = _RollingSum(self.RSI_PERIOD)
+        self.losses = _RollingSum(self.RSI_PERIOD)
+        self.tr_sum = _RollingSum(self.ATR_PERIOD)
+        self.plus_dm_sum = _RollingSum(self.ADX_PERIOD)
+        self.minus_dm_sum = _RollingSum(self.ADX_PERIOD)
+        self.adx_tr_sum = _RollingSum(self.ADX_PERIOD)
+
+        # wilder：平滑狀態
+        self.avg_gain = _WilderAverage(self.RSI_PERIOD)
+        self.avg_loss = _WilderAverage(self.RSI_PERIOD)
+        self.atr_avg = _WilderAverage(self.ATR_PERIOD)
+        self.plus_dm_avg = _WilderAverage(self.ADX_PERIOD)
+        self.minus_dm_avg = _WilderAverage(self.ADX_PERIOD)
+        self.adx_tr_avg = _WilderAverage(self.ADX_PERIOD)
+        self.adx_avg = _WilderAverage(self.ADX_PERIOD)
+        self.prev_k = 50.0
+        self.prev_d = 50.0
+
+    def update(self, close: float, high: float = None, low: float = None, volume: float = 0.0) -> dict:
+        """推進一筆 tick，回傳最新指標（欄位同 compute_all_indicators）"""
+        high = close if high is None else high
+        low = close if low is None else low
+        self.count += 1
+
+        self.closes.append(close)
+        self.highs.append(high)
+        self.lows.append(low)
+
+        for period, value in self.ema.items():
+            alpha = self._ema_alpha[period]
+            self.ema[period] = close if value is None else alpha * close + (1 - alpha) * value
+
+        self.pv_sum += close * volume
+        self.volume_sum += volume
+
+        if self._bb_anchor is None:
+            self._bb_anchor = close
+        shifted = close - self._bb_anchor
+        self.bb_sum.add(shifted)
+        self.bb_sq_sum.add(shifted * shifted)
+
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            gain = delta if delta > 0 else 0.0
+            loss = -delta if delta < 0 else 0.0
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+            up_move = high - self.prev_high
+            down_move = self.prev_low - low
+            plus_dm = up_move if up_move > down_move and up_move > 0 else 0
+            minus_dm = down_move if down_move > up_move and down_move > 0 else 0
+
+            if self.mode == "compat":
+                self.gains.add(gain)
+                self.losses.add(loss)
+                self.tr_sum.add(tr)
+                self.plus_dm_sum.add(plus_dm)
+                self.minus_dm_sum.add(minus_dm)
+                self.adx_tr_sum.add(tr)
+            else:
+                self.avg_gain.add(gain)
+                self.avg_loss.add(loss)
+                self.atr_avg.add(tr)
+                self.plus_dm_avg.add(plus_dm)
+                self.minus_dm_avg.add(minus_dm)
+                self.adx_tr_avg.add(tr)
+                if self.adx_tr_avg.is_ready():
+                    self.adx_avg.add(self._dx(self.plus_dm_avg.value, self.minus_dm_avg.value, self.adx_tr_avg.value))
+
+        self.prev_close = close
+        self.prev_high = high
+        self.prev_low = low
+
+        indicators = {}
+        indicators["rsi"] = self._rsi()
+        indicators.update(_compute_macd(list(self.closes)))
+        indicators.update(self._kd())
+        indicators.update(self._bollinger(close))
+        indicators["atr"] = self._atr()
+        indicators["ema5"] = self._ema(5, close)
+        indicators["ema20"] = self._ema(20, close)
+        indicators["adx"] = self._adx()
+        indicators["vwap"] = round(self.pv_sum / self.volume_sum, 2) if self.volume_sum > 0 else 0.0
+        indicators["close"] = close
+        return indicators
+
+    # ====== 各指標輸出 ======
+    def _rsi(self) -> float:
+        if self.mode == "compat":
+            if not self.gains.is_full():
+                return 50.0
+            avg_gain = self.gains.total / self.RSI_PERIOD
+            avg_loss = self.losses.total / self.RSI_PERIOD
+        else:
+            if not self.avg_gain.is_ready():
+                return 50.0
+            avg_gain = self.avg_gain.value
+            avg_loss = self.avg_loss.value
+        if avg_loss == 0:
+            return 100.0
+        rs = avg_gain / avg_loss
+        return round(100 - (100 / (1 + rs)), 1)
+
+    def _kd(self) -> dict:
+        if self.count < self.KD_PERIOD:
+            return {"kd_k": 50.0, "kd_d": 50.0}
+        low_min = min(self.lows)
+        high_max = max(self.highs)
+        rsv = (self.closes[-1] - low_min) / (high_max - low_min) * 100 if high_max != low_min else 50
+        prev_k, prev_d = (self.prev_k, self.prev_d) if self.mode == "wilder" else (50, 50)
+        k = (2/3) * prev_k + (1/3) * rsv
+        d = (2/3) * prev_d + (1/3) * k
+        if self.mode == "wilder":
+            self.prev_k, self.prev_d = k, d
+        return {"kd_k": round(k, 1), "kd_d": round(d, 1)}
+
+    def _bollinger(self, close: float) -> dict:
+        if not self.bb_sum.is_full():
+            return {
+                "bband_upper": 0.0,
+                "bband_middle": 0.0,
+                "bband_lower": 0.0,
+                "bband_signal": "Neutral"
+            }
+        n = self.BBAND_PERIOD
+        mean_shifted = self.bb_sum.total / n
+        var = max(self.bb_sq_sum.total / n - mean_shifted * mean_shifted, 0.0)
+        std = math.sqrt(var)
+        ma = self._bb_anchor + mean_shifted
+        upper = ma + self.BBAND_STD * std
+        lower = ma - self.BBAND_STD * std
+        signal = "Neutral"
+        if close > upper:
+            signal = "BreakUp"
+        elif close < lower:
+            signal = "BreakDown"
+        return {
+            "bband_upper": round(upper, 2),
+            "bband_middle": round(ma, 2),
+            "bband_lower": round(lower, 2),
+            "bband_signal": signal
+        }
+
+    def _atr(self) -> float:
+        if self.mode == "compat":
+            if not self.tr_sum.is_full():
+                return 0.0
+            return round(self.tr_sum.total / self.ATR_PERIOD, 2)
+        if not self.atr_avg.is_ready():
+            return 0.0
+        return round(self.atr_avg.value, 2)
+
+    def _ema(self, period: int, close: float) -> float:
+        if self.count < period:
+            return close
+        return round(self.ema[period], 2)
+
+    @staticmethod
+    def _dx(plus_dm: float, minus_dm: float, tr: float) -> float:
+        if tr == 0:
+            return 0.0
+        plus_di = 100 * plus_dm / tr
+        minus_di = 100 * minus_dm / tr
+        return abs(plus_di - minus_di) / (plus_di + minus_di) * 100 if (plus_di + minus_di) != 0 else 0
+
+    def _adx(self) -> float:
+        if self.mode == "compat":
+            if not self.adx_tr_sum.is_full():
+                return 0.0
+            return round(self._dx(self.plus_dm_sum.total, self.minus_dm_sum.total, self.adx_tr_sum.total), 2)
+        if not self.adx_avg.is_ready():
+            return 0.0
+        return round(self.adx_avg.value, 2)
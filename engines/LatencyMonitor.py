@@ -0,0 +1,180 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+
+class LatencyHistogram:
+    """
+    HDR 風格的串流延遲直方圖（單位 ns）：
+    - 對數線性分桶：每個 2 的冪次區間再切 2^sub_bits 格，相對誤差約 1 / 2^sub_bits（預設 5 → 約 3%）
+    - record() 只做位元運算與一次 list 加一，不保留原始樣本，記憶體固定
+    - 超過 max_ns 的值記在最後一格；max / min / 平均以原始值精確累計
+    """
+
+    __slots__ = ("sub_bits", "_sub", "counts", "count", "total", "min", "max")
+
+    def __init__(self, sub_bits: int = 5, max_ns: int = 60_000_000_000):
+        self.sub_bits = sub_bits
+        self._sub = 1 << sub_bits
+        self.counts = [0] * (self._index(max_ns) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        sub = self._sub
+        if value < sub:
+            return value
+        shift = value.bit_length() - self.sub_bits - 1
+        return (shift << self.sub_bits) + (value >> shift)
+
+    def _bucket_value(self, index: int) -> int:
+        """分桶代表值（區間中點）"""
+        sub = self._sub
+        if index < 2 * sub:
+            return index
+        shift = (index - sub) >> self.sub_bits
+        low = (((index - sub) & (sub - 1)) + sub) << shift
+        return low + (1 << shift) // 2
+
+    def record(self, value: int):
+        if value < self._sub:
+            if value < 0:
+                value = 0
+            index = value
+        else:
+            shift = value.bit_length() - self.sub_bits - 1
+            index = (shift << self.sub_bits) + (value >> shift)
+        counts = self.counts
+        if index < len(counts):
+            counts[index] += 1
+        else:
+            counts[-1] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def percentile(self, q: float) -> int:
+        """q 為 0~100；回傳分桶代表值（不超過實際最大值）"""
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * q // 100))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram"):
+        if other.sub_bits != self.sub_bits or len(other.counts) != len(self.counts):
+            raise ValueError("直方圖分桶設定不同，無法合併")
+        for index, n in enumerate(other.counts):
+            if n:
+                self.counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def summary(self) -> dict:
+        """count 與 mean / p50 / p99 / max（µs）"""
+        us = lambda ns: round(ns / 1000, 2)
+        return {
+            "count": self.count,
+            "mean_us": us(self.total / self.count) if self.count else 0.0,
+            "p50_us": us(self.percentile(50)),
+            "p99_us": us(self.percentile(99)),
+            "max_us": us(self.max),
+        }
+
+
+class LatencyMonitor:
+    """
+    tick 流水線延遲監控：
+    - 各階段一個 LatencyHistogram，TickEngine.enable_latency() 後由計時版 on_tick 以 perf_counter_ns 寫入
+    - feed_lag：交易所 tick 時間 → 本機收到（tick callback）的延遲；queue_wait：收到 → strategy worker 開始處理
+    - snapshot() / report() / export() 可隨時呼叫（例如 shutdown hook、監控端點）
+    - 不啟用時 TickEngine 走原本的 on_tick，沒有任何計時成本
+    """
+
+    STAGES = (
+        "feed_lag", "queue_wait", "indicators", "mtf", "state", "bias", "score",
+        "recorder", "decision", "logger", "total",
+    )
+
+    def __init__(self, sub_bits: int = 5, max_ns: int = 60_000_000_000):
+        self.histograms = {stage: LatencyHistogram(sub_bits, max_ns) for stage in self.STAGES}
+        self.started_at = datetime.now()
+
+    def record(self, stage: str, ns: int):
+        self.histograms[stage].record(ns)
+
+    def record_feed_lag(self, exchange_time: datetime, received: datetime | None = None):
+        """exchange_time 與本機時間需同一時區（shioaji tick.datetime 為台北時間的 naive datetime）"""
+        if received is None:
+            received = datetime.now()
+        lag = received - exchange_time
+        self.histograms["feed_lag"].record((lag.days * 86_400 + lag.seconds) * 1_000_000_000 + lag.microseconds * 1000)
+
+    def snapshot(self) -> dict:
+        """{階段: {count, mean_us, p50_us, p99_us, max_us}}（只列有資料的階段）"""
+        return {stage: h.summary() for stage, h in self.histograms.items() if h.count}
+
+    def report(self) -> str:
+        rows = self.snapshot()
+        if not rows:
+            return "（尚無延遲資料）"
+        lines = [f"{'stage':<12}{'count':>10}{'mean_us':>12}{'p50_us':>12}{'p99_us':>12}{'max_us':>12}"]
+        for stage, s in rows.items():
+            lines.append(f"{stage:<12}{s['count']:>10}{s['mean_us']:>12.2f}{s['p50_us']:>12.2f}{s['p99_us']:>12.2f}{s['max_us']:>12.2f}")
+        return "\n".join(lines)
+
+    def export(self, path: str | Path) -> Path:
+        """寫出 JSON（started_at、exported_at 與各階段統計）"""
+        path = Path(path)
+        payload = {
+            "started_at": self.started_at.isoformat(),
+            "exported_at": datetime.now().isoformat(),
+            "stages": self.snapshot(),
+        }
+        path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+    def reset(self):
+        for h in self.histograms.values():
+            h.reset()
+        self.started_at = datetime.now()
+
+
+if __name__ == "__main__":
+    # 基準測試：分桶百分位與精確百分位的相對誤差、record() 成本（行為驗證見 tests/test_latency_monitor.py）
+    import random
+    import timeit
+
+    random.seed(7)
+    samples = [int(random.lognormvariate(10, 1.2)) for _ in range(200_000)]
+    h = LatencyHistogram()
+    for v in samples:
+        h.record(v)
+    ordered = sorted(samples)
+    for q in (50, 90, 99, 99.9):
+        exact = ordered[max(0, int(-(-len(ordered) * q // 100)) - 1)]
+        approx = h.percentile(q)
+        err = abs(approx - exact) / exact
+        print(f"✅ p{q}: 精確 {exact} ns｜直方圖 {approx} ns｜誤差 {err * 100:.2f}%")
+    per = min(timeit.repeat("record(12_345)", globals={"record": h.record}, number=200_000, repeat=5)) / 200_000 * 1e9
+    print(f"✅ record() 每次 {per:.0f} ns｜分桶數 {len(h.counts)}")
@@ -1,43 +1,199 @@
+from datetime import datetime, time, timedelta
+
+from Clock import to_datetime
+from RingBuffer import RingBuffer
+from IncrementalIndicatorEngine import _RollingSum
+
+# 台灣期交所交易時段：日盤 08:45–13:45、夜盤 15:00–翌日 05:00
+DAY_SESSION = (time(8, 45), time(13, 45))
+NIGHT_SESSION = (time(15, 0), time(5, 0))
+
+
+def session_of(ts: datetime):
+    """回傳 (session 名稱, 開盤時間, 收盤時間)；非交易時段回傳 None"""
+    t = ts.time()
+    day = ts.date()
+    if DAY_SESSION[0] <= t <= DAY_SESSION[1]:
+        return ("day", datetime.combine(day, DAY_SESSION[0]), datetime.combine(day, DAY_SESSION[1]))
+    if t >= NIGHT_SESSION[0]:
+        return ("night", datetime.combine(day, NIGHT_SESSION[0]), datetime.combine(day + timedelta(days=1), NIGHT_SESSION[1]))
+    if t <= NIGHT_SESSION[1]:
+        prev = day - timedelta(days=1)
+        return ("night", datetime.combine(prev, NIGHT_SESSION[0]), datetime.combine(day, NIGHT_SESSION[1]))
+    return None
+
+
+class Bar:
+    __slots__ = ("timeframe", "session", "start", "open", "high", "low", "close", "volume", "ticks")
+
+    def __init__(self, timeframe: str, session: str, start: datetime, price: float, volume: float, high: float = None, low: float = None):
+        self.timeframe = timeframe
+        self.session = session
+        self.start = start
+        self.open = price
+        self.high = price if high is None else high
+        self.low = price if low is None else low
+        self.close = price
+        self.volume = volume
+        self.ticks = 1
+
+    def update(self, price: float, volume: float, high: float = None, low: float = None):
+        high = price if high is None else high
+        low = price if low is None else low
+        if high > self.high:
+            self.high = high
+        if low < self.low:
+            self.low = low
+        self.close = price
+        self.volume += volume
+        self.ticks += 1
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"Bar({self.timeframe} {self.start:%Y-%m-%d %H:%M} O={self.open} H={self.high} L={self.low} C={self.close} V={self.volume})"
+
+
+class BarBuilder:
+    """
+    串流 K 棒產生器：
+    - 依 tick 時間戳對齊到所屬交易時段的 N 分鐘區間（日盤自 08:45、夜盤自 15:00 起算）
+    - 收盤那一筆（例如 13:45:00）併入該時段最後一根
+    - 非交易時段的 tick（盤後零星成交）併入目前未收的 K 棒
+    - 區間切換時回傳已收盤的 Bar，否則回傳 None
+    """
+
+    def __init__(self, minutes: int):
+        self.minutes = minutes
+        self.timeframe = f"{minutes}m"
+        self.span = timedelta(minutes=minutes)
+        self.current: Bar | None = None
+        self._bucket_end: datetime | None = None
+
+    def _bucket(self, ts: datetime):
+        session = session_of(ts)
+        if session is None:
+            return None
+        name, open_time, close_time = session
+        start = open_time + ((ts - open_time) // self.span) * self.span
+        if start >= close_time:
+            start = close_time - self.span
+        return name, start
+
+    def update(self, ts: datetime, price: float, volume: float = 0.0, high: float = None, low: float = None):
+        bar = self.current
+        # 同一區間：只更新 OHLCV，不做時段判斷
+        if bar is not None and bar.start <= ts < self._bucket_end:
+            bar.update(price, volume, high, low)
+            return None
+
+        bucket = self._bucket(ts)
+        if bucket is None:
+            if bar is not None:
+                bar.update(price, volume, high, low)
+                return None
+            bucket = ("off", ts.replace(second=0, microsecond=0))
+        name, start = bucket
+        if bar is not None and bar.start == start:
+            bar.update(price, volume, high, low)
+            return None
+
+        closed = bar
+        self.current = Bar(self.timeframe, name, start, price, volume, high, low)
+        self._bucket_end = start + self.span
+        return closed
+
+
 class MultiTimeframeEngine:
-    def __init__(self):
-        self.kline_5m = []
-        self.kline_15m = []
+    """
+    多週期引擎：
+    - 以 tick 時間戳建立 1m/5m/15m K 棒，每筆 tick 增量更新
+    - rsi_xm / ema_xm 以「已收 K 棒 + 目前未收 K 棒收盤價」計算，已收部分以滑動加總與串流 EMA 維護
+    - is_ready_xm：已收 K 棒數 >= ready_bars
+    - subscribe(callback) 可在 K 棒收盤時收到 Bar，不需回掃歷史
+    """
 
-    def update_kline(self, tick: dict):
-        # ✅ 每分鐘收盤更新一次（可用時間戳判斷）
-        self.kline_5m.append(tick["close"])
-        self.kline_15m.append(tick["close"])
+    def __init__(self, timeframes=(1, 5, 15), capacity: int = 120, rsi_period: int = 14, ema_periods: dict = None, ready_bars: int = 20):
+        self.timeframes = tuple(timeframes)
+        self.rsi_period = rsi_period
+        self.ready_bars = ready_bars
+        self.ema_periods = {1: 20, 5: 5, 15: 15}
+        if ema_periods:
+            self.ema_periods.update(ema_periods)
+
+        self.builders = {m: BarBuilder(m) for m in self.timeframes}
+        self.closes = {m: RingBuffer(capacity) for m in self.timeframes}
+        self.closed_count = {m: 0 for m in self.timeframes}
+        # 已收 K 棒之間的漲跌（最近 rsi_period - 1 筆），加上未收 K 棒的漲跌即為 RSI 視窗
+        self._gains = {m: _RollingSum(rsi_period - 1) for m in self.timeframes}
+        self._losses = {m: _RollingSum(rsi_period - 1) for m in self.timeframes}
+        self._ema_closed = {m: None for m in self.timeframes}
+        self._subscribers = []
+        self.indicators = {}
+
+    def subscribe(self, callback, timeframe: str | None = None):
+        """註冊 K 棒收盤回呼；timeframe 例如 "5m"，None 表示全部週期"""
+        self._subscribers.append((timeframe, callback))
+
+    def _on_bar_closed(self, minutes: int, bar: Bar):
+        closes = self.closes[minutes]
+        if closes:
+            delta = bar.close - closes.last()
+            self._gains[minutes].add(delta if delta > 0 else 0.0)
+            self._losses[minutes].add(-delta if delta < 0 else 0.0)
+        closes.append(bar.close)
+        self.closed_count[minutes] += 1
 
-        if len(self.kline_5m) > 50:
-            self.kline_5m.pop(0)
-        if len(self.kline_15m) > 50:
-            self.kline_15m.pop(0)
+        prev = self._ema_closed[minutes]
+        alpha = 2 / (self.ema_periods[minutes] + 1)
+        self._ema_closed[minutes] = bar.close if prev is None else alpha * bar.close + (1 - alpha) * prev
+
+        for timeframe, callback in self._subscribers:
+            if timeframe is None or timeframe == bar.timeframe:
+                callback(bar)
+
+    def _rsi(self, minutes: int, price: float) -> float:
+        closes = self.closes[minutes]
+        if len(closes) < self.rsi_period or not self._gains[minutes].is_full():
+            return 50.0
+        delta = price - closes.last()
+        avg_gain = (self._gains[minutes].total + (delta if delta > 0 else 0.0)) / self.rsi_period
+        avg_loss = (self._losses[minutes].total + (-delta if delta < 0 else 0.0)) / self.rsi_period
+        if avg_loss == 0:
+            return 100.0
+        rs = avg_gain / avg_loss
+        return round(100 - (100 / (1 + rs)), 1)
+
+    def _ema(self, minutes: int, price: float) -> float:
+        prev = self._ema_closed[minutes]
+        if prev is None or self.closed_count[minutes] + 1 < self.ema_periods[minutes]:
+            return price
+        alpha = 2 / (self.ema_periods[minutes] + 1)
+        return round(alpha * price + (1 - alpha) * prev, 2)
+
+    def update(self, timestamp, price: float, volume: float = 0.0, high: float = None, low: float = None) -> dict:
+        """推進一筆 tick，回傳各週期 rsi/ema 與 is_ready 旗標"""
+        ts = to_datetime(timestamp)
+        indicators = self.indicators
+        for m in self.timeframes:
+            closed = self.builders[m].update(ts, price, volume, high, low)
+            if closed is not None:
+                self._on_bar_closed(m, closed)
+            indicators[f"rsi_{m}m"] = self._rsi(m, price)
+            indicators[f"ema_{m}m"] = self._ema(m, price)
+            indicators[f"is_ready_{m}m"] = self.closed_count[m] >= self.ready_bars
+        return indicators
+
+    def warmup(self, kbars):
+        """以歷史 1 分 K（dict：datetime/ts、open、high、low、close、volume）預先填入 K 棒"""
+        for bar in kbars:
+            ts = bar.get("datetime") or bar.get("ts") or bar.get("timestamp")
+            self.update(ts, float(bar["close"]), float(bar.get("volume", 0) or 0), bar.get("high"), bar.get("low"))
+
+    # ====== 舊介面相容 ======
+    def update_kline(self, tick: dict):
+        self.update(tick.get("timestamp", datetime.now()), tick["close"], tick.get("volume", 0))
 
     def compute_indicators(self):
-        # ✅ 計算多週期指標（可用 talib 或自定）
-        return {
-            "rsi_5m": self._rsi(self.kline_5m),
-            "rsi_15m": self._rsi(self.kline_15m),
-            "ema_5m": self._ema(self.kline_5m),
-            "ema_15m": self._ema(self.kline_15m),
-        }
-
-    def _rsi(self, prices):
-        # ✅ 自定 RSI 計算（簡化版）
-        if len(prices) < 14:
-            return 50
-        gains = [max(prices[i+1] - prices[i], 0) for i in range(len(prices)-1)]
-        losses = [max(prices[i] - prices[i+1], 0) for i in range(len(prices)-1)]
-        avg_gain = sum(gains[-14:]) / 14
-        avg_loss = sum(losses[-14:]) / 14
-        rs = avg_gain / avg_loss if avg_loss != 0 else 1
-        return 100 - (100 / (1 + rs))
-
-    def _ema(self, prices, period=20):
-        if len(prices) < period:
-            return prices[-1]
-        ema = prices[0]
-        k = 2 / (period + 1)
-        for price in prices[1:]:
-            ema = price * k + ema * (1 - k)
-        return ema
+        return dict(self.indicators)
@@ -1,6 +1,7 @@
 # strategy_v4/models/ParamsStore.py
 
 import json
+import os
 from pathlib import Path
 from typing import Dict, Any
 
@@ -10,13 +11,22 @@ class ParamsStore:
         self.path = Path(json_path)
         self._data: Dict[str, Any] = {}
         self._loaded = False
+        self._mtime = None
+
+    def _stat_mtime(self):
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
 
     def load(self) -> None:
         if self.path.exists():
+            self._mtime = self._stat_mtime()
             with self.path.open("r", encoding="utf-8") as f:
                 self._data = json.load(f)
             self._loaded = True
         else:
+            self._mtime = None
             self._data = {"version": "unversioned", "weights": {}}
             self._loaded = True
 
@@ -31,8 +41,20 @@ class ParamsStore:
         w = self._data.get("weights", {})
         return {k: float(v) for k, v in w.items()}
 
+    def refresh(self) -> bool:
+        """檔案修改時間改變時重新載入，回傳是否有更新（給 DecisionEngine_v2 的監看執行緒用）"""
+        mtime = self._stat_mtime()
+        if self._loaded and mtime == self._mtime:
+            return False
+        self.load()
+        return True
+
     def update(self, version: str, weights: Dict[str, float]) -> None:
         self._data = {"version": version, "weights": weights}
-        with self.path.open("w", encoding="utf-8") as f:
+        # 先寫暫存檔再取代，讀取端不會讀到寫一半的 JSON
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
             json.dump(self._data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        self._mtime = self._stat_mtime()
         self._loaded = True
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    固定容量環形緩衝區（NumPy 預先配置）：
+    - append 為 O(1)，超過容量自動覆蓋最舊資料，記憶體不隨時間成長
+    - 每筆資料同時寫入 i 與 i + capacity 兩個位置，任何「最近 n 筆」都是連續區段
+    - window(n) / 切片回傳零複製的 ndarray view，可直接交給指標函式
+    - 整數索引回傳 Python float，行為與原本的 list 相同
+    """
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        if capacity <= 0:
+            raise ValueError("capacity 必須大於 0")
+        self.capacity = capacity
+        self._buf = np.zeros(capacity * 2, dtype=dtype)
+        self._head = 0      # 下一筆寫入位置（0 ~ capacity-1）
+        self._size = 0
+
+    def append(self, value):
+        head = self._head
+        self._buf[head] = value
+        self._buf[head + self.capacity] = value
+        self._head = head + 1 if head + 1 < self.capacity else 0
+        if self._size < self.capacity:
+            self._size += 1
+
+    def extend(self, values):
+        for v in values:
+            self.append(v)
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+    def window(self, n: int = None) -> np.ndarray:
+        """最近 n 筆（舊 → 新）的零複製 view；n 省略時回傳全部"""
+        size = self._size
+        if n is None or n > size:
+            n = size
+        end = self._head + self.capacity if size == self.capacity else self._head
+        return self._buf[end - n:end]
+
+    def last(self, default=None):
+        if not self._size:
+            return default
+        return float(self._buf[self._head - 1 + self.capacity])
+
+    def is_full(self) -> bool:
+        return self._size == self.capacity
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.window()[index]
+        size = self._size
+        if -size <= index < 0:
+            # 最常見的 prices[-1] / prices[-2]：直接由寫入位置往回取
+            return float(self._buf[self._head + self.capacity + index])
+        if index < 0 or index >= size:
+            raise IndexError("RingBuffer index out of range")
+        start = self._head + self.capacity - size if size == self.capacity else self._head - size
+        return float(self._buf[start + index])
+
+    def __iter__(self):
+        return iter(self.window().tolist())
+
+    def tolist(self) -> list:
+        return self.window().tolist()
+
+    def __repr__(self):
+        return f"RingBuffer(capacity={self.capacity}, size={self._size})"
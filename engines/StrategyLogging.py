@@ -0,0 +1,279 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# 所有策略模組的 logger 都掛在 "strategy" 之下（strategy.tick、strategy.state、strategy.logger...）
+ROOT_LOGGER = "strategy"
+
+# 預設的訊息 key 頻率限制（setup_logging(rate_limits=...) 可覆寫）
+DEFAULT_RATE_LIMITS = {
+    "TICK": {"interval_ms": 1000},
+    "ENTRY_BLOCKED_LOSS_STREAK": {"interval_ms": 5000},
+    "ENTRY_BLOCKED_COOLDOWN": {"interval_ms": 5000},
+    "ENTRY_BLOCKED_IN_POSITION": {"interval_ms": 5000},
+}
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_key(key: str, prechecked: bool = False) -> dict:
+    """
+    logger.info(..., extra=log_key("TICK"))：頻率限制與 JSON 輸出用的訊息 key（回傳值可重複使用）
+    - prechecked=True：呼叫端已用 should_log() 判斷過頻率，handler 不再重複計數
+    """
+    return {"key": key, "prechecked": prechecked}
+
+
+def should_log(logger: logging.Logger, key: str, level: int = logging.INFO) -> bool:
+    """
+    熱路徑用：在建立 LogRecord 之前先判斷等級與頻率限制，被擋下的訊息完全不產生紀錄
+    - 回傳 True 時請以 extra=log_key(key, prechecked=True) 輸出
+    """
+    if is_silent() or not logger.isEnabledFor(level):
+        return False
+    rate_filter = _rate_filter
+    return rate_filter is None or rate_filter.allow(key)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """每次輸出時取當下的 sys.stdout（contextlib.redirect_stdout 仍然有效）"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    依訊息 key（extra={"key": ...}）限制頻率：
+    - interval_ms：同一 key 在間隔內只放行第一筆
+    - sample：每 N 筆放行 1 筆
+    - 被擋下的筆數記在下一筆放行紀錄的 suppressed 屬性（文字輸出附「略過 N 筆」）
+    - 沒有 key 或 key 未設定規則的紀錄一律放行
+    """
+
+    def __init__(self, limits: dict | None = None, clock=time.monotonic):
+        super().__init__()
+        self.limits = {}
+        for key, rule in (limits or {}).items():
+            interval_ms = rule.get("interval_ms")
+            sample = rule.get("sample")
+            self.limits[key] = (interval_ms / 1000 if interval_ms else None, sample if sample and sample > 1 else None)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._next_allowed = {}
+        self._seen = {}
+        self._suppressed = {}
+
+    def allow(self, key: str) -> bool:
+        """計數並判斷這個 key 目前是否放行（should_log() 與 filter() 共用，可由多個執行緒同時呼叫）"""
+        rule = self.limits.get(key)
+        if rule is None:
+            return True
+        interval, sample = rule
+        with self._lock:
+            if sample:
+                seen = self._seen.get(key, 0)
+                self._seen[key] = seen + 1
+                if seen % sample:
+                    self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                    return False
+            if interval:
+                now = self.clock()
+                if now < self._next_allowed.get(key, 0.0):
+                    self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                    return False
+                self._next_allowed[key] = now + interval
+            return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = record.__dict__.get("key")
+        if key is None:
+            return True
+        if not record.__dict__.get("prechecked") and not self.allow(key):
+            return False
+        with self._lock:
+            record.suppressed = self._suppressed.pop(key, 0)
+        return True
+
+
+class SilentFilter(logging.Filter):
+    """丟棄在 silent() 區塊內產生的紀錄：handler 過濾在呼叫端執行緒執行，只影響進入 silent() 的那個執行緒"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not is_silent()
+
+
+class TextFormatter(logging.Formatter):
+    """維持原本 print 的樣式（只輸出訊息本身）；有被頻率限制略過的筆數時附註"""
+
+    def __init__(self):
+        super().__init__("%(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = record.__dict__.get("suppressed")
+        return f"{text}（略過 {suppressed} 筆）" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆一行 JSON：ts、level、logger、key、msg、args、suppressed"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "key": record.__dict__.get("key"),
+            "msg": record.getMessage(),
+        }
+        if record.args:
+            payload["args"] = record.args if isinstance(record.args, tuple) else [record.args]
+        suppressed = record.__dict__.get("suppressed")
+        if suppressed:
+            payload["suppressed"] = suppressed
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    只把 LogRecord 放進佇列就返回：
+    - 標準 QueueHandler.prepare() 會在呼叫端執行緒先格式化訊息，這裡改成保留 msg / args，由 listener 執行緒格式化
+    - 因此 args 必須是不會再被修改的值（數字、字串），不要傳可變物件
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_silent_state = threading.local()
+_silent_filter = SilentFilter()
+
+_default_handler = _StdoutHandler()
+_default_handler.setFormatter(TextFormatter())
+_default_handler.addFilter(_silent_filter)
+_root = logging.getLogger(ROOT_LOGGER)
+_root.addHandler(_default_handler)
+_root.setLevel(logging.INFO)
+_root.propagate = False
+
+_listener = None
+_rate_filter = None
+
+
+def setup_logging(level: str | int = "INFO", rate_limits: dict | None = None, fmt: str = "text",
+                  filename: str | None = None, console: bool = True) -> QueueListener:
+    """
+    將 "strategy" logger 改為佇列式輸出：
+    - 呼叫端（tick 執行緒）只做頻率過濾 + 入列；格式化與 I/O 在背景 QueueListener 執行緒
+    - rate_limits：{key: {"interval_ms": ..., "sample": ...}}，未指定時用 DEFAULT_RATE_LIMITS
+    - fmt："text"（同原本 print 樣式）或 "json"；filename 另寫一份到檔案
+    - 重複呼叫會先停掉上一個 listener
+    """
+    global _listener, _rate_filter
+    shutdown_logging()
+    formatter = JsonFormatter() if fmt == "json" else TextFormatter()
+    handlers = []
+    if console:
+        handlers.append(_StdoutHandler())
+    if filename:
+        handlers.append(logging.FileHandler(filename, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    _rate_filter = RateLimitFilter(DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits)
+    queue_handler.addFilter(_silent_filter)  # 先丟掉 silent 執行緒的紀錄，不佔頻率限制的額度
+    queue_handler.addFilter(_rate_filter)
+    for handler in list(_root.handlers):
+        _root.removeHandler(handler)
+    _root.addHandler(queue_handler)
+    _root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """停止背景 listener（寫完佇列中的紀錄），恢復同步輸出到 stdout"""
+    global _listener, _rate_filter
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _rate_filter = None
+    for handler in list(_root.handlers):
+        _root.removeHandler(handler)
+    _root.addHandler(_default_handler)
+
+
+def is_silent() -> bool:
+    return getattr(_silent_state, "depth", 0) > 0
+
+
+def set_silent(enabled: bool):
+    """
+    回測用：關閉目前執行緒的策略 log（可巢狀，True / False 須成對呼叫）
+    - 只影響呼叫的執行緒：同一行程內的實盤 tick worker 照常輸出
+    - should_log() 直接回 False，熱路徑不建立 LogRecord；其餘紀錄由 SilentFilter 丟棄
+    """
+    depth = getattr(_silent_state, "depth", 0)
+    if enabled:
+        _silent_state.depth = depth + 1
+    elif depth:
+        _silent_state.depth = depth - 1
+
+
+@contextmanager
+def silent():
+    set_silent(True)
+    try:
+        yield
+    finally:
+        set_silent(False)
+
+
+if __name__ == "__main__":
+    # 比較：每筆 print 一行 [TICK] vs 佇列式 logging + 每秒一筆頻率限制（輸出導向 /dev/null 只比 tick 執行緒成本）
+    # 取樣與略過筆數的行為驗證見 tests/test_strategy_logging.py
+    import os
+    import timeit
+    from contextlib import redirect_stdout
+
+    log = get_logger("bench")
+    tick_key = log_key("TICK", prechecked=True)
+    values = (22000.0, 61.234, 1.2345, 0.9876, 55.5, 44.4, 3.21, 27.1, 21990.5, 21995.1, 21993.2)
+    fmt = "[TICK] Price=%.0f｜RSI=%.1f｜MACD=%.2f｜Signal=%.2f｜KD=(%.1f/%.1f)｜ATR=%.2f｜ADX=%.1f｜VWAP=%.1f｜EMA=(%.1f/%.1f)"
+
+    def print_tick():
+        print(fmt % values)
+
+    def log_tick():
+        if should_log(log, "TICK"):
+            log.info(fmt, *values, extra=tick_key)
+
+    n = 20_000
+    with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+        t_print = min(timeit.repeat(print_tick, number=n, repeat=3)) / n * 1e6
+        setup_logging(rate_limits={"TICK": {"interval_ms": 1000}})
+        t_log = min(timeit.repeat(log_tick, number=n, repeat=3)) / n * 1e6
+        shutdown_logging()
+        with silent():
+            t_silent = min(timeit.repeat(log_tick, number=n, repeat=3)) / n * 1e6
+    print(f"✅ 每筆 [TICK]：print {t_print:.2f} µs｜佇列 + 頻率限制 {t_log:.2f} µs｜silent {t_silent:.3f} µs")
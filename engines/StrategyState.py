@@ -1,7 +1,20 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
+import numpy as np
+
+from Clock import LIVE_CLOCK
+from RingBuffer import RingBuffer
+from StrategyLogging import get_logger, log_key
+
+log = get_logger("state")
+BLOCKED_LOSS_STREAK = log_key("ENTRY_BLOCKED_LOSS_STREAK")
+BLOCKED_COOLDOWN = log_key("ENTRY_BLOCKED_COOLDOWN")
+BLOCKED_IN_POSITION = log_key("ENTRY_BLOCKED_IN_POSITION")
 
 class StrategyState:
-    def __init__(self):
+    def __init__(self, clock=None):
+        # ✅ 時鐘注入：實盤用 LiveClock，回測用 SimulatedClock 以 tick 時間計算冷卻與持倉時間
+        self.clock = clock if clock is not None else LIVE_CLOCK
+        self.recent_prices = RingBuffer(30)
         self.reset()
         self.last_rsi = 50
         self.last_macd = 0
@@ -19,6 +32,9 @@ class StrategyState:
         self.consecutive_losses = 0
         self.disable_until = None
 
+        # ✅ 平倉通知（例如 RunningPerformance.on_trade_closed）
+        self.trade_listeners = []
+
     def reset(self):
         self.in_position = False
         self.direction = None
@@ -27,23 +43,23 @@ class StrategyState:
         self.last_entry_time = None
         self.max_profit = 0.0
         self.max_loss = 0.0
-        self.recent_prices = []
+        self.recent_prices.clear()
         self.current_position_size = 0
         self.tick_since_entry = 0
 
     def can_enter(self) -> bool:
-        now = datetime.now()
+        now = self.clock.now()
         if self.disable_until and now < self.disable_until:
-            print("⚠️ 連敗冷卻中，暫停進場")
+            log.warning("⚠️ 連敗冷卻中，暫停進場", extra=BLOCKED_LOSS_STREAK)
             return False
         if self.last_entry_time and (now - self.last_entry_time).total_seconds() < self.cooldown_seconds:
-            print("⚠️ 進場冷卻中，跳過進場")
+            log.warning("⚠️ 進場冷卻中，跳過進場", extra=BLOCKED_COOLDOWN)
             return False
         return True
 
     def enter(self, direction: str, price: float):
         if self.in_position:
-            print("⚠️ 已持倉，忽略重複進場")
+            log.warning("⚠️ 已持倉，忽略重複進場", extra=BLOCKED_IN_POSITION)
             return
         if not self.can_enter():
             return
@@ -51,10 +67,10 @@ class StrategyState:
         self.in_position = True
         self.direction = direction
         self.entry_price = price
-        self.entry_time = datetime.now()
+        self.entry_time = self.clock.now()
         self.last_entry_time = self.entry_time
         self.current_position_size = 1
-        print(f"[ENTER] {direction} @ {price}｜時間={self.entry_time.strftime('%H:%M:%S')}")
+        log.info("[ENTER] %s @ %s｜時間=%s", direction, price, self.entry_time.strftime("%H:%M:%S"))
 
     def update_profit_loss(self, current_price: float):
         if not self.in_position or self.entry_price is None:
@@ -63,8 +79,6 @@ class StrategyState:
         self.max_profit = max(self.max_profit, profit)
         self.max_loss = min(self.max_loss, profit)
         self.recent_prices.append(current_price)
-        if len(self.recent_prices) > 30:
-            self.recent_prices.pop(0)
         self.tick_since_entry += 1
 
     def get_unrealized_profit(self, current_price: float) -> float:
@@ -73,15 +87,14 @@ class StrategyState:
         return current_price - self.entry_price if self.direction == "long" else self.entry_price - current_price
 
     def get_recent_high(self) -> float:
-        return max(self.recent_prices) if self.recent_prices else 0.0
+        return float(self.recent_prices.window().max()) if self.recent_prices else 0.0
 
     def get_dynamic_stoploss(self, atr: float = None, multiplier: float = 2.0) -> float:
         if atr and atr > 0:
             return -atr * multiplier
         if len(self.recent_prices) < 5:
             return -20.0
-        diffs = [abs(self.recent_prices[i] - self.recent_prices[i - 1]) for i in range(1, len(self.recent_prices))]
-        avg_move = sum(diffs) / len(diffs)
+        avg_move = float(np.abs(np.diff(self.recent_prices.window())).mean())
         return -avg_move * multiplier
 
     def should_stoploss(self, current_price: float, atr: float = None) -> bool:
@@ -90,7 +103,7 @@ class StrategyState:
         # ✅ 硬停損
         unreal = self.get_unrealized_profit(current_price)
         if unreal <= -self.hard_stoploss:
-            print(f"[HARD STOP] 浮虧 {unreal:.1f} ≥ {self.hard_stoploss}")
+            log.info("[HARD STOP] 浮虧 %.1f ≥ %s", unreal, self.hard_stoploss)
             return True
         # 動態停損
         if self.tick_since_entry < 3:
@@ -108,7 +121,7 @@ class StrategyState:
     def should_hold(self) -> bool:
         if not self.in_position:
             return False
-        time_held = (datetime.now() - self.entry_time).total_seconds()
+        time_held = (self.clock.now() - self.entry_time).total_seconds()
         if time_held >= self.hard_time_seconds:
             return False
         return time_held < self.hard_time_seconds and (self.max_profit > 15 or self.tick_since_entry < self.max_ticks_hold)
@@ -120,14 +133,14 @@ class StrategyState:
     def just_entered(self, seconds: int = 3) -> bool:
         if not self.in_position or self.last_entry_time is None:
             return False
-        return (datetime.now() - self.last_entry_time).total_seconds() < seconds
+        return (self.clock.now() - self.last_entry_time).total_seconds() < seconds
 
     def mark_trade_result(self, realized_profit: float):
         if realized_profit <= 0:
             self.consecutive_losses += 1
             if self.consecutive_losses >= 6:
-                self.disable_until = datetime.now() + timedelta(minutes=30)
-                print("⛔ 連敗達標，暫停交易 30 分鐘")
+                self.disable_until = self.clock.now() + timedelta(minutes=30)
+                log.warning("⛔ 連敗達標，暫停交易 30 分鐘")
         else:
             self.consecutive_losses = 0
 
@@ -143,13 +156,40 @@ class StrategyState:
             "tick_since_entry": self.tick_since_entry
         }
 
+    def snapshot_into(self, tick, current_price: float):
+        """把目前持倉狀態寫入 TickRecord（recent_high、max_profit、max_loss、tick_since_entry、unrealized_profit）"""
+        tick.recent_high = self.get_recent_high()
+        tick.max_profit = self.max_profit
+        tick.max_loss = self.max_loss
+        tick.tick_since_entry = self.tick_since_entry
+        tick.unrealized_profit = self.get_unrealized_profit(current_price) if self.in_position else 0.0
+
+    def add_trade_listener(self, callback):
+        """註冊平倉 callback，參數為 dict：direction、entry_price、exit_price、pnl、entry_time、exit_time"""
+        self.trade_listeners.append(callback)
+
     def exit(self, current_price: float = None):
         if not self.in_position:
-            print("⚠️ 無持倉可出場")
+            log.warning("⚠️ 無持倉可出場")
             return
         realized = 0.0
         if current_price is not None and self.entry_price is not None:
             realized = current_price - self.entry_price if self.direction == "long" else self.entry_price - current_price
-        print(f"[EXIT] {self.direction}｜入場 {self.entry_price}｜出場 {current_price if current_price else '—'}｜浮盈：{self.max_profit:.1f}｜浮虧：{self.max_loss:.1f}｜實盈：{realized:.1f}")
+        log.info("[EXIT] %s｜入場 %s｜出場 %s｜浮盈：%.1f｜浮虧：%.1f｜實盈：%.1f", self.direction, self.entry_price,
+                 current_price if current_price else "—", self.max_profit, self.max_loss, realized)
         self.mark_trade_result(realized)
+        if self.trade_listeners:
+            trade = {
+                "direction": self.direction,
+                "entry_price": self.entry_price,
+                "exit_price": current_price,
+                "pnl": realized,
+                "entry_time": self.entry_time,
+                "exit_time": self.clock.now(),
+            }
+            for callback in self.trade_listeners:
+                try:
+                    callback(trade)
+                except Exception as e:
+                    log.warning("⚠️ 平倉通知失敗：%s", e)
         self.reset()
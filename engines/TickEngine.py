@@ -1,53 +1,64 @@
+from time import perf_counter_ns
+
 from StrategyState import StrategyState
 from DecisionEngine import DecisionEngine
+from DecisionEngine_v2 import DecisionEngine_v2
 from TickPatternTracker import TickPatternTracker
 from TradeLogger import TradeLogger
 from TickRecorder import TickRecorder
-from IndicatorEngine import compute_all_indicators
-from datetime import datetime
+from IncrementalIndicatorEngine import IncrementalIndicatorEngine
+from MultiTimeframeEngine import MultiTimeframeEngine
+from RingBuffer import RingBuffer
+from FeatureMatrix import FEATURE_COLUMNS, decode_feature_row
+from TickRecord import TickRecord
+from StrategyLogging import get_logger, log_key, should_log
+
+log = get_logger("tick")
+TICK_LOG = log_key("TICK", prechecked=True)
+TICK_FORMAT = ("[TICK] %s｜Price=%.0f｜RSI=%.1f｜MACD=%.2f｜Signal=%.2f｜KD=(%.1f/%.1f)｜BBand=%s｜ATR=%.2f｜ADX=%.1f"
+               "｜VWAP=%.1f｜EMA=(%.1f/%.1f)｜RSI(5m/15m)=%.1f/%.1f｜Bias=%s｜Score=%s")
 
 class TickEngine:
-    def __init__(self, state: StrategyState, market_bias: str, indicators: dict, trade_logger=None, tick_recorder=None):
+    def __init__(self, state: StrategyState, market_bias: str, indicators: dict, trade_logger=None, tick_recorder=None, indicator_mode: str = "compat", history_size: int = 2000, clock=None, verbose: bool = True, mode: str = "rule_based", params_store=None):
+        if mode not in ("rule_based", "regression_based"):
+            raise ValueError(f"未知的決策模式：{mode}")
         self.state = state
+        # ✅ 預設沿用 StrategyState 的時鐘；回測時每筆 tick 以其 timestamp 推進 SimulatedClock
+        self.clock = clock if clock is not None else state.clock
         self.market_bias = market_bias
         self.indicators = indicators
         self.tick_tracker = TickPatternTracker()
         self.decision_engine = DecisionEngine(market_bias, indicators)
         self.decision_engine.tick_tracker = self.tick_tracker
-        self.logger = trade_logger if trade_logger else TradeLogger()
+        # ✅ v4 回歸型：mode="regression_based" 時以 DecisionEngine_v2（ParamsStore 權重）決定進出場
+        self.mode = mode
+        self.decision_v2 = DecisionEngine_v2(params_store) if mode == "regression_based" else None
+        self.decision_cfg = self.decision_v2.cfg if self.decision_v2 else self.decision_engine.cfg
+        self.logger = trade_logger if trade_logger else TradeLogger(clock=self.clock)
         self.tick_recorder = tick_recorder
+        self.verbose = verbose  # False：不輸出每筆 [TICK]（回測用）；輸出頻率由 StrategyLogging 的 "TICK" 限制
+        # ✅ 增量指標：每筆 tick O(1) 更新，不再重算整段歷史
+        self.indicator_engine = IncrementalIndicatorEngine(mode=indicator_mode)
+
+        # ✅ 固定容量環形緩衝：多日運行記憶體不成長，取視窗不複製
+        self.tick_count = 0
+        self.close_prices = RingBuffer(history_size)
+        # ✅ 依 tick 時間戳建立 1m/5m/15m K 棒（區分日盤／夜盤）
+        self.mtf_engine = MultiTimeframeEngine()
+        # ✅ 回測可掛上預先計算的指標矩陣（FeatureMatrix），第 i 筆 tick 直接讀第 i 列
+        self.feature_rows = None
+        # 即時累計績效（RunningPerformance，由 main 掛上並註冊到 StrategyState）
+        self.performance = None
+        # 各階段延遲（LatencyMonitor，enable_latency() 掛上；None 表示不計時）
+        self.latency = None
 
-        self.close_prices = []
-        self.high_prices = []
-        self.low_prices = []
-        self.volumes = []
-        self.close_5m = []
-        self.close_15m = []
-
-    def compute_rsi(self, prices, period=14):
-        if len(prices) < period + 1:
-            return 50.0
-        gains = [max(prices[i+1] - prices[i], 0) for i in range(len(prices)-1)]
-        losses = [max(prices[i] - prices[i+1], 0) for i in range(len(prices)-1)]
-        avg_gain = sum(gains[-period:]) / period
-        avg_loss = sum(losses[-period:]) / period
-        if avg_loss == 0:
-            return 100.0
-        rs = avg_gain / avg_loss
-        return round(100 - (100 / (1 + rs)), 1)
-
-    def compute_ema(self, prices, period=20):
-        if not prices:
-            return 0.0
-        if len(prices) < period:
-            return prices[-1]
-        ema_val = prices[0]
-        k = 2 / (period + 1)
-        for price in prices[1:]:
-            ema_val = price * k + ema_val * (1 - k)
-        return round(ema_val, 2)
-
-    def _choose_direction(self, tick: dict) -> str:
+    def attach_features(self, matrix):
+        """掛上 build_feature_matrix() 的結果；之後 on_tick 不再自行計算指標"""
+        if len(matrix) and len(matrix[0]) != len(FEATURE_COLUMNS):
+            raise ValueError(f"指標矩陣欄數不符：{len(matrix[0])}")
+        self.feature_rows = matrix
+
+    def _choose_direction(self, tick: TickRecord) -> str:
         # 用 direction_score 與 bias 一致性選方向
         dir_score = tick.get("direction_score", 0)
         bias = tick.get("bias", "neutral")
@@ -58,67 +69,160 @@ class TickEngine:
         # 若不一致，以 momentum 決定
         return "long" if tick.get("momentum", 0) > 0 else "short"
 
-    def on_tick(self, tick: dict):
-        price = float(tick.get("price", 0))
-        volume = float(tick.get("volume", 0))
-        timestamp = tick.get("timestamp", datetime.now())
+    def on_tick(self, tick: TickRecord | dict) -> TickRecord:
+        """處理一筆 tick；dict 會先轉成 TickRecord（不修改呼叫端的 dict），回傳填好指標與決策的紀錄"""
+        tick, price, volume, timestamp = self._begin_tick(tick)
+        self._update_indicators(tick, price, volume)
+        self._update_timeframes(tick, timestamp, price, volume)
+        self._update_state(tick, price)
+        bias = self._detect_bias(tick)
+        entry_score = self._score_entry(tick)
+        if self.verbose and should_log(log, "TICK"):
+            self._log_tick(tick, timestamp, price, bias, entry_score)
+        if self.tick_recorder:
+            self.tick_recorder.record_tick(tick)
+        self._handle_position(tick, price)
+        return tick
+
+    def _on_tick_timed(self, tick: TickRecord | dict) -> TickRecord:
+        """on_tick 的計時版（enable_latency() 後取代 on_tick）：各階段以 perf_counter_ns 記入 LatencyMonitor"""
+        now, record = perf_counter_ns, self.latency.record
+        start = now()
+        tick, price, volume, timestamp = self._begin_tick(tick)
+        if tick.received_ns is not None:
+            record("queue_wait", start - tick.received_ns)
+        t0 = now()
+        self._update_indicators(tick, price, volume)
+        t1 = now()
+        record("indicators", t1 - t0)
+        self._update_timeframes(tick, timestamp, price, volume)
+        t0 = now()
+        record("mtf", t0 - t1)
+        self._update_state(tick, price)
+        t1 = now()
+        record("state", t1 - t0)
+        bias = self._detect_bias(tick)
+        t0 = now()
+        record("bias", t0 - t1)
+        entry_score = self._score_entry(tick)
+        t1 = now()
+        record("score", t1 - t0)
+        if self.verbose and should_log(log, "TICK"):
+            self._log_tick(tick, timestamp, price, bias, entry_score)
+        if self.tick_recorder:
+            t0 = now()
+            self.tick_recorder.record_tick(tick)
+            record("recorder", now() - t0)
+        t0 = now()
+        self._handle_position(tick, price)
+        end = now()
+        record("decision", end - t0)
+        record("total", end - start)
+        return tick
+
+    def enable_latency(self, monitor):
+        """
+        啟用各階段延遲量測：
+        - 以 _on_tick_timed 取代 on_tick；TickIngestor 等持有 handler 的元件需在啟用後才取 engine.on_tick
+        - TradeLogger.log 包一層計時（logger 階段，時間同時計入 decision）
+        """
+        self.latency = monitor
+        self.on_tick = self._on_tick_timed
+        log = self.logger.log
+
+        def timed_log(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return log(*args, **kwargs)
+            finally:
+                monitor.record("logger", perf_counter_ns() - start)
+
+        self.logger.log = timed_log
 
+    def disable_latency(self):
+        """回到不計時的 on_tick（monitor 保留，資料仍可匯出）"""
+        self.__dict__.pop("on_tick", None)
+        self.logger.__dict__.pop("log", None)
+
+    # ---------- on_tick 各階段 ----------
+
+    def _begin_tick(self, tick: TickRecord | dict) -> tuple:
+        if not isinstance(tick, TickRecord):
+            tick = TickRecord.from_dict(tick)
+        price = float(tick.price)
+        volume = float(tick.volume)
+        timestamp = tick.timestamp
+        if timestamp is None:
+            timestamp = self.clock.now()
+        else:
+            self.clock.advance_to(timestamp)
+
+        self.tick_count += 1
         self.close_prices.append(price)
-        self.high_prices.append(price)
-        self.low_prices.append(price)
-        self.volumes.append(volume)
-
-        if len(self.close_prices) % 5 == 0:
-            self.close_5m.append(price)
-            if len(self.close_5m) > 120:
-                self.close_5m.pop(0)
-        if len(self.close_prices) % 15 == 0:
-            self.close_15m.append(price)
-            if len(self.close_15m) > 120:
-                self.close_15m.pop(0)
-
-        indicators = compute_all_indicators(self.close_prices, self.high_prices, self.low_prices, self.volumes)
-        tick.update(indicators)
+        return tick, price, volume, timestamp
+
+    def _update_indicators(self, tick: TickRecord, price: float, volume: float):
+        if self.feature_rows is not None:
+            # 預先計算的指標列同時含多週期欄位
+            indicators = decode_feature_row(self.feature_rows[self.tick_count - 1].tolist())
+            tick.set_timeframes(indicators)
+        else:
+            indicators = self.indicator_engine.update(price, price, price, volume)
+        tick.set_indicators(indicators)
         self.indicators.update(indicators)
 
-        tick["rsi_5m"] = self.compute_rsi(self.close_5m)
-        tick["rsi_15m"] = self.compute_rsi(self.close_15m)
-        tick["ema_5m"] = self.compute_ema(self.close_5m, 5)
-        tick["ema_15m"] = self.compute_ema(self.close_15m, 15)
+    def _update_timeframes(self, tick: TickRecord, timestamp, price: float, volume: float):
+        if self.feature_rows is None:
+            tick.set_timeframes(self.mtf_engine.update(timestamp, price, volume))
 
-        tick["is_ready_5m"] = len(self.close_5m) >= 20
-        tick["is_ready_15m"] = len(self.close_15m) >= 20
-        tick["is_ready"] = len(self.close_prices) >= 30
+    def _update_state(self, tick: TickRecord, price: float):
+        tick.is_ready = self.tick_count >= 30
 
         self.tick_tracker.update(price)
         self.state.update_profit_loss(price)
 
-        self.state.last_rsi = tick.get("rsi", 50)
-        self.state.last_macd = tick.get("macd", 0)
-        self.state.last_kd_k = tick.get("kd_k", 50)
-        self.state.last_kd_d = tick.get("kd_d", 50)
+        self.state.last_rsi = tick.rsi
+        self.state.last_macd = tick.macd
+        self.state.last_kd_k = tick.kd_k
+        self.state.last_kd_d = tick.kd_d
+
+        self.state.snapshot_into(tick, price)
 
-        tick["recent_high"] = self.state.get_recent_high()
-        tick["max_profit"] = self.state.max_profit
-        tick["max_loss"] = self.state.max_loss
-        tick["tick_since_entry"] = self.state.tick_since_entry
-        tick["unrealized_profit"] = self.state.get_unrealized_profit(price) if self.state.in_position else 0.0
+    def _detect_bias(self, tick: TickRecord) -> str:
+        if self.decision_v2 is not None:
+            # 回歸模式一次算出 bias 與 v2 分數
+            self.decision_v2.evaluate_into(tick, self.state.direction if self.state.in_position else None)
+        else:
+            tick.bias = self.decision_engine.detect_market_bias(tick)
+        return tick.bias
 
-        bias = self.decision_engine.detect_market_bias(tick)
-        tick["bias"] = bias
+    def _score_entry(self, tick: TickRecord):
+        if self.decision_v2 is not None:
+            return round(tick.entry_score_v2, 3)
         entry_score = self.decision_engine.score_entry(tick)
-        tick["entry_score"] = entry_score
+        tick.entry_score = entry_score
+        return entry_score
 
-        print(f"[TICK] {timestamp}｜Price={price:.0f}｜RSI={tick['rsi']:.1f}｜MACD={tick['macd']:.2f}｜Signal={tick['macd_signal']:.2f}｜KD=({tick['kd_k']:.1f}/{tick['kd_d']:.1f})｜BBand={tick['bband_signal']}｜ATR={tick['atr']:.2f}｜ADX={tick['adx']:.1f}｜VWAP={tick['vwap']:.1f}｜EMA=({tick['ema5']:.1f}/{tick['ema20']:.1f})｜RSI(5m/15m)={tick['rsi_5m']:.1f}/{tick['rsi_15m']:.1f}｜Bias={bias}｜Score={entry_score}")
-
-        if self.tick_recorder:
-            self.tick_recorder.record_tick(tick)
+    def _log_tick(self, tick: TickRecord, timestamp, price: float, bias: str, entry_score):
+        # 只傳數值，格式化在 logging 背景執行緒進行
+        log.info(TICK_FORMAT, timestamp, price, tick.rsi, tick.macd, tick.macd_signal, tick.kd_k, tick.kd_d,
+                 tick.bband_signal, tick.atr, tick.adx, tick.vwap, tick.ema5, tick.ema20, tick.rsi_5m, tick.rsi_15m,
+                 bias, entry_score, extra=TICK_LOG)
 
+    def _handle_position(self, tick: TickRecord, price: float):
+        """進場判斷；持倉中依序檢查出場條件"""
         # 進場
         if not self.state.in_position:
-            if self.decision_engine.should_enter(tick):
-                print("[ENTER_TRIGGER] 進場條件成立，準備進場")
-                direction = self._choose_direction(tick)
+            if self.decision_v2 is not None:
+                enter = self.decision_v2.should_enter(tick)
+            else:
+                enter = self.decision_engine.should_enter(tick)
+            if enter:
+                log.info("[ENTER_TRIGGER] 進場條件成立，準備進場")
+                if self.decision_v2 is not None:
+                    direction = "long" if tick.bias == "bullish" else "short"
+                else:
+                    direction = self._choose_direction(tick)
                 self.state.enter(direction, price)
                 self.logger.log("ENTER", self.state.get_status(), price, tick)
             return
@@ -127,42 +231,37 @@ class TickEngine:
         if self.state.just_entered(seconds=3):
             return
         # 出場判斷（順序：硬停損／動態停損／鎖利／時間／不續抱）
-        if self.state.should_stoploss(price, tick.get("atr", 0)):
-            print(f"[STOPLOSS] Triggered @ {price}")
+        if self.state.should_stoploss(price, tick.atr):
+            log.info("[STOPLOSS] Triggered @ %s", price)
             self.logger.log("STOPLOSS", self.state.get_status(), price, tick)
             self.state.exit(price)
-            if self.tick_recorder:
-                self.tick_recorder.force_flush()
 
-        elif self.state.should_takeprofit(price, tick.get("atr", 0)):
-            print(f"[TAKEPROFIT] Triggered @ {price}")
+        elif self.state.should_takeprofit(price, tick.atr):
+            log.info("[TAKEPROFIT] Triggered @ %s", price)
             self.logger.log("TAKEPROFIT", self.state.get_status(), price, tick)
             self.state.exit(price)
-            if self.tick_recorder:
-                self.tick_recorder.force_flush()
 
         elif hasattr(self.state, "should_lock_profit") and self.state.should_lock_profit(tick, price):
-            print(f"[LOCK] 指標轉弱或價格回落，獲利鎖定 @ {price}")
+            log.info("[LOCK] 指標轉弱或價格回落，獲利鎖定 @ %s", price)
             self.logger.log("LOCK_PROFIT", self.state.get_status(), price, tick)
             self.state.exit(price)
-            if self.tick_recorder:
-                self.tick_recorder.force_flush()
 
         elif self.state.should_exit_by_tick():
-            print(f"[TIME_EXIT] 超過最大持倉 tick，自動出場 @ {price}")
+            log.info("[TIME_EXIT] 超過最大持倉 tick，自動出場 @ %s", price)
             self.logger.log("TIME_EXIT", self.state.get_status(), price, tick)
             self.state.exit(price)
-            if self.tick_recorder:
-                self.tick_recorder.force_flush()
+
+        elif self.decision_v2 is not None and self.decision_v2.should_exit(tick):
+            log.info("[EXIT_V2] 回歸分數反轉（%.3f），出場 @ %s", tick.exit_score_v2, price)
+            self.logger.log("EXIT", self.state.get_status(), price, tick)
+            self.state.exit(price)
 
         elif not self.state.should_hold():
-            print(f"[EXIT] 不續抱，準備出場 @ {price}")
+            log.info("[EXIT] 不續抱，準備出場 @ %s", price)
             self.logger.log("EXIT", self.state.get_status(), price, tick)
             self.state.exit(price)
-            if self.tick_recorder:
-                self.tick_recorder.force_flush()
 
         elif hasattr(self.state, "should_add") and self.state.should_add(price, tick):
-            print("[ADD] 加碼條件成立")
+            log.info("[ADD] 加碼條件成立")
             self.state.current_position_size += 1
             self.logger.log("ADD", self.state.get_status(), price, tick)
@@ -0,0 +1,133 @@
+import threading
+from collections import deque
+
+from StrategyLogging import get_logger
+
+log = get_logger("ingest")
+
+
+class TickIngestor:
+    """
+    Tick 接收佇列：
+    - put() 在 shioaji 回呼執行緒上只做「放進佇列」就返回，不跑策略
+    - 單一 strategy worker 執行緒依序取出 tick 交給 handler（通常是 TickEngine.on_tick）
+    - 佇列滿時的處理策略：
+      - "block"：回呼執行緒等待空位（不丟資料，但會拖慢行情）
+      - "drop_oldest"：丟掉最舊的 tick
+      - "coalesce"：與佇列尾端的 tick 合併，只留最新價格，成交量累加
+    - stats() 提供佇列深度、丟棄與合併筆數
+    - on_start 會在 worker 執行緒啟動時呼叫（例如綁定 CPU）
+    """
+
+    POLICIES = ("block", "drop_oldest", "coalesce")
+
+    def __init__(self, handler, maxsize: int = 10000, policy: str = "drop_oldest", name: str = "strategy-worker", on_start=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的佇列策略：{policy}（可用：{', '.join(self.POLICIES)}）")
+        if maxsize <= 0:
+            raise ValueError("maxsize 必須大於 0")
+        self.handler = handler
+        self.maxsize = maxsize
+        self.policy = policy
+        self.name = name
+        self.on_start = on_start
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._running = False
+        self._thread = None
+
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    # ====== 生產端（回呼執行緒） ======
+    def put(self, tick: dict) -> bool:
+        """放入一筆 tick；回傳 False 表示被丟棄或已停止接收"""
+        with self._lock:
+            if not self._running:
+                return False
+            self.received += 1
+            queue = self._queue
+            if len(queue) >= self.maxsize:
+                if self.policy == "block":
+                    while len(queue) >= self.maxsize and self._running:
+                        self._not_full.wait()
+                    if not self._running:
+                        return False
+                elif self.policy == "drop_oldest":
+                    queue.popleft()
+                    self.dropped += 1
+                else:
+                    last = queue[-1]
+                    tick["volume"] = (last.get("volume") or 0) + (tick.get("volume") or 0)
+                    queue[-1] = tick
+                    self.coalesced += 1
+                    return True
+            queue.append(tick)
+            depth = len(queue)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self._not_empty.notify()
+        return True
+
+    # ====== 消費端（strategy worker） ======
+    def _run(self):
+        if self.on_start:
+            self.on_start()
+        queue = self._queue
+        while True:
+            with self._lock:
+                while not queue and self._running:
+                    self._not_empty.wait()
+                if not queue:
+                    return
+                tick = queue.popleft()
+                self._not_full.notify()
+            try:
+                self.handler(tick)
+            except Exception:
+                self.errors += 1
+                log.exception("[INGEST] 處理 tick 失敗：")
+            self.processed += 1
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, drain: bool = True, timeout: float | None = None):
+        """停止接收；drain=True 時先處理完佇列中剩餘的 tick"""
+        with self._lock:
+            self._running = False
+            if not drain:
+                self.dropped += len(self._queue)
+                self._queue.clear()
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "policy": self.policy,
+        }
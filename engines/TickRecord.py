@@ -0,0 +1,278 @@
+from dataclasses import dataclass, fields
+from datetime import datetime
+from operator import attrgetter
+
+
+@dataclass(slots=True, eq=False)
+class TickRecord:
+    """
+    每筆 tick 的固定欄位紀錄（取代逐筆 dict）：
+    - __slots__ 欄位、型別與預設值固定，建立時一次配置完成（不像 dict 隨寫入逐步擴張）
+    - 熱路徑（TickEngine、DecisionEngine、TickRecorder）直接以屬性讀寫，不再逐鍵雜湊；預設值與原本各處 tick.get 的預設相同
+    - 選填欄位預設 None（例如 v2 分數只在 regression_based 有值），get() / [] / in / to_dict() 視 None 為「沒有這個 key」
+    - 保留 dict 介面（get、[]、update、keys、to_dict），舊呼叫端不需修改；未知欄位放在 extras
+    """
+
+    # 原始報價
+    timestamp: datetime | None = None
+    price: float = 0.0
+    volume: float = 0.0
+    bid: float | None = None
+    ask: float | None = None
+    received_ns: int | None = None  # 本機收到時間（perf_counter_ns，啟用延遲量測時由 tick callback 寫入）
+    # 指標（FeatureMatrix.INDICATOR_COLUMNS）
+    rsi: float = 50.0
+    macd: float = 0.0
+    macd_signal: float = 0.0
+    macd_hist: float = 0.0
+    kd_k: float = 50.0
+    kd_d: float = 50.0
+    bband_upper: float = 0.0
+    bband_middle: float = 0.0
+    bband_lower: float = 0.0
+    bband_signal: str = ""
+    atr: float = 0.0
+    ema5: float = 0.0
+    ema20: float = 0.0
+    adx: float = 0.0
+    vwap: float = 0.0
+    close: float = 0.0
+    # 多週期（FeatureMatrix.MTF_COLUMNS）
+    rsi_1m: float = 50.0
+    ema_1m: float = 0.0
+    is_ready_1m: bool = False
+    rsi_5m: float = 50.0
+    ema_5m: float = 0.0
+    is_ready_5m: bool = False
+    rsi_15m: float = 50.0
+    ema_15m: float = 0.0
+    is_ready_15m: bool = False
+    # 持倉狀態快照（StrategyState.snapshot_into）
+    is_ready: bool = False
+    recent_high: float = 0.0
+    max_profit: float = 0.0
+    max_loss: float = 0.0
+    tick_since_entry: int = 0
+    unrealized_profit: float = 0.0
+    # 決策結果（選填）
+    bias: str | None = None
+    entry_score: int | None = None
+    momentum: float | None = None
+    direction_score: int | None = None
+    reversal: bool | None = None
+    bias_prob: float | None = None
+    entry_score_v2: float | None = None
+    exit_score_v2: float | None = None
+    params_version: str | None = None
+    mode: str | None = None
+    # TickRecorder 保留欄位（選填）
+    bband_pos: float | None = None
+    bband_width: float | None = None
+    vol_roc: float | None = None
+    # 其他未列在 schema 的欄位
+    extras: dict | None = None
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "TickRecord":
+        try:
+            return cls(**values)
+        except TypeError:
+            record = cls()  # 含 schema 以外的欄位：逐一寫入（未知欄位進 extras）
+            for key, value in values.items():
+                record[key] = value
+            return record
+
+    # ---------- 熱路徑批次寫入 ----------
+
+    def set_indicators(self, values: dict):
+        """寫入 IncrementalIndicatorEngine.update() / decode_feature_row() 的指標欄位"""
+        self.rsi = values["rsi"]
+        self.macd = values["macd"]
+        self.macd_signal = values["macd_signal"]
+        self.macd_hist = values["macd_hist"]
+        self.kd_k = values["kd_k"]
+        self.kd_d = values["kd_d"]
+        self.bband_upper = values["bband_upper"]
+        self.bband_middle = values["bband_middle"]
+        self.bband_lower = values["bband_lower"]
+        self.bband_signal = values["bband_signal"]
+        self.atr = values["atr"]
+        self.ema5 = values["ema5"]
+        self.ema20 = values["ema20"]
+        self.adx = values["adx"]
+        self.vwap = values["vwap"]
+        self.close = values["close"]
+
+    def set_timeframes(self, values: dict):
+        """寫入 MultiTimeframeEngine.update() / decode_feature_row() 的多週期欄位"""
+        self.rsi_1m = values["rsi_1m"]
+        self.ema_1m = values["ema_1m"]
+        self.is_ready_1m = values["is_ready_1m"]
+        self.rsi_5m = values["rsi_5m"]
+        self.ema_5m = values["ema_5m"]
+        self.is_ready_5m = values["is_ready_5m"]
+        self.rsi_15m = values["rsi_15m"]
+        self.ema_15m = values["ema_15m"]
+        self.is_ready_15m = values["is_ready_15m"]
+
+    def row(self, names: tuple, missing=None) -> list:
+        """依欄位順序一次取出整列；missing 不是 None 時把 None 換成 missing（例如 ""）"""
+        getter = _ROW_GETTERS.get(names)
+        if getter is None:
+            getter = _ROW_GETTERS[names] = attrgetter(*names)
+        if missing is None:
+            return list(getter(self))
+        return [missing if value is None else value for value in getter(self)]
+
+    # ---------- dict 相容介面 ----------
+
+    def get(self, key: str, default=None):
+        if key in FIELD_DEFAULTS:
+            value = getattr(self, key)
+            return default if value is None else value
+        extras = self.extras
+        return extras.get(key, default) if extras else default
+
+    def __getitem__(self, key: str):
+        """None 欄位視為不存在，與 dict 缺 key 相同拋 KeyError（例如沒有報價的 tick["bid"]）；要預設值請用 get()"""
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        if key in FIELD_DEFAULTS:
+            setattr(self, key, value)
+        elif self.extras is None:
+            self.extras = {key: value}
+        else:
+            self.extras[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def update(self, values: dict | None = None, **kwargs):
+        for source in (values or {}, kwargs):
+            for key, value in source.items():
+                self[key] = value
+
+    def keys(self) -> list:
+        return list(self.to_dict())
+
+    def items(self):
+        return self.to_dict().items()
+
+    def to_dict(self) -> dict:
+        values = {name: value for name in FIELD_NAMES if (value := getattr(self, name)) is not None}
+        if self.extras:
+            values.update(self.extras)
+        return values
+
+
+FIELD_DEFAULTS = {f.name: f.default for f in fields(TickRecord) if f.name != "extras"}
+FIELD_NAMES = tuple(FIELD_DEFAULTS)
+_ROW_GETTERS = {}
+
+
+def as_tick_record(tick) -> TickRecord:
+    """dict → TickRecord（已是 TickRecord 則原樣回傳）"""
+    return tick if isinstance(tick, TickRecord) else TickRecord.from_dict(tick)
+
+
+if __name__ == "__main__":
+    # 基準測試（行為驗證見 tests/test_tick_record.py）：
+    # - TickEngine 每筆 tick 對紀錄的操作（建立、寫入指標 / 多週期 / 狀態、決策讀取、TickRecorder 取列），dict 與 TickRecord 比較
+    # - 完整 TickEngine.on_tick（含 TickRecorder 寫檔）每筆耗時
+    import random
+    import sys
+    import tempfile
+    import timeit
+    from datetime import timedelta
+    from pathlib import Path
+    from time import perf_counter
+    from Clock import SimulatedClock
+    from StrategyState import StrategyState
+    from TickEngine import TickEngine
+    from TradeLogger import TradeLogger
+    from IncrementalIndicatorEngine import IncrementalIndicatorEngine
+    from MultiTimeframeEngine import MultiTimeframeEngine
+    from TickRecorder import TICK_FIELDS_TUPLE, TickRecorder
+
+    random.seed(1)
+    indicator_engine, mtf = IncrementalIndicatorEngine(), MultiTimeframeEngine()
+    price, ts = 22000.0, datetime(2025, 11, 13, 9, 0, 0)
+    for i in range(500):
+        price += random.choice([-4, -1, 0, 1, 4])
+        indicators = indicator_engine.update(price, price, price, 5.0)
+        timeframes = mtf.update(ts.replace(minute=i // 60 % 60, second=i % 60), price, 5.0)
+    raw = {"price": price, "volume": 5.0, "timestamp": ts}
+
+    def dict_flow():
+        tick = dict(raw)
+        tick.update(indicators)
+        tick.update(timeframes)
+        tick["is_ready"] = True
+        tick["recent_high"] = price
+        tick["max_profit"] = 0.0
+        tick["max_loss"] = 0.0
+        tick["tick_since_entry"] = 0
+        tick["unrealized_profit"] = 0.0
+        # DecisionEngine：detect_market_bias / entry_strength_score / should_enter 的讀取
+        (tick.get("adx", 0), tick.get("ema5", 0), tick.get("ema20", 0), tick.get("macd", 0), tick.get("macd_signal", 0),
+         tick.get("macd_hist", 0), tick.get("rsi", 50))
+        (tick.get("macd", 0), tick.get("macd_signal", 0), tick.get("macd_hist", 0), tick.get("rsi", 50), tick.get("ema5", 0),
+         tick.get("ema20", 0), tick.get("vwap", 0), tick.get("close", 0), tick.get("adx", 0), tick.get("atr", 0),
+         tick.get("volume", 0), tick.get("is_ready_5m"), tick.get("is_ready_15m"), tick.get("rsi_5m", 50),
+         tick.get("ema_15m", 0), tick.get("ema_5m", 0))
+        tick["bias"] = "neutral"
+        tick["momentum"] = 1.0
+        tick["direction_score"] = 1
+        tick["entry_score"] = 2
+        (tick.get("momentum", 0), tick.get("direction_score", 0), tick.get("is_ready", False), tick.get("close", 0),
+         tick.get("vwap", 0), tick.get("ema5", 0), tick.get("ema20", 0), tick.get("rsi", 50), tick.get("atr", 0))
+        return [tick.get(name, "") for name in TICK_FIELDS_TUPLE]
+
+    def record_flow():
+        tick = TickRecord(raw["timestamp"], raw["price"], raw["volume"])
+        tick.set_indicators(indicators)
+        tick.set_timeframes(timeframes)
+        tick.is_ready = True
+        tick.recent_high = price
+        tick.max_profit = 0.0
+        tick.max_loss = 0.0
+        tick.tick_since_entry = 0
+        tick.unrealized_profit = 0.0
+        (tick.adx, tick.ema5, tick.ema20, tick.macd, tick.macd_signal, tick.macd_hist, tick.rsi)
+        (tick.macd, tick.macd_signal, tick.macd_hist, tick.rsi, tick.ema5, tick.ema20, tick.vwap, tick.close, tick.adx,
+         tick.atr, tick.volume, tick.is_ready_5m, tick.is_ready_15m, tick.rsi_5m, tick.ema_15m, tick.ema_5m)
+        tick.bias = "neutral"
+        tick.momentum = 1.0
+        tick.direction_score = 1
+        tick.entry_score = 2
+        (tick.momentum, tick.direction_score, tick.is_ready, tick.close, tick.vwap, tick.ema5, tick.ema20, tick.rsi, tick.atr)
+        return tick.row(TICK_FIELDS_TUPLE)
+
+    results = {}
+    for name, flow in (("dict", dict_flow), ("TickRecord", record_flow)):
+        results[name] = min(timeit.repeat(flow, number=50_000, repeat=7)) / 50_000 * 1e6
+    d, r = results["dict"], results["TickRecord"]
+    full = dict(raw, **indicators, **timeframes)
+    print(f"✅ 每筆 tick 紀錄操作：dict {d:.2f} µs → TickRecord {r:.2f} µs（省 {d - r:.2f} µs，{(1 - r / d) * 100:.0f}%）")
+    print(f"   物件大小：dict {sys.getsizeof(full)} bytes → TickRecord {sys.getsizeof(TickRecord.from_dict(full))} bytes")
+
+    ticks = []
+    for i in range(50_000):
+        price += random.choice([-4, -1, 0, 1, 4])
+        ticks.append({"price": price, "volume": 5, "timestamp": ts + timedelta(seconds=i * 0.2)})
+    with tempfile.TemporaryDirectory() as tmp:
+        clock = SimulatedClock()
+        recorder = TickRecorder(Path(tmp) / "ticks.csv", clock=clock)
+        engine = TickEngine(StrategyState(clock=clock), "auto", {}, TradeLogger(str(Path(tmp) / "trades.csv"), tick_recorder=recorder, clock=clock),
+                            recorder, clock=clock, verbose=False)
+        on_tick = engine.on_tick
+        start = perf_counter()
+        for tick in ticks:
+            on_tick(tick)
+        elapsed = perf_counter() - start
+        recorder.close()
+    print(f"✅ TickEngine.on_tick：{elapsed / len(ticks) * 1e6:.2f} µs/tick（{len(ticks)} 筆，含 TickRecorder 寫檔）")
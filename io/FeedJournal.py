@@ -0,0 +1,214 @@
+# strategy_v4/io/FeedJournal.py
+
+import json
+import math
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+# 檔頭：magic + 版本；之後為固定長度紀錄，只會附加不會改寫
+MAGIC = b"MFJ1"
+HEADER = struct.Struct("<4sH")
+VERSION = 1
+# 每筆：收到時間（time.time_ns）、交易所時間（epoch 起的 µs，naive 當地時間）、close、volume、bid、ask（None 存 NaN）
+RECORD = struct.Struct("<qqdddd")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_us(ts: datetime) -> int:
+    delta = ts - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _optional(value: float):
+    return None if math.isnan(value) else value
+
+
+def _plain(value):
+    """numpy 純量轉回 Python 型別，datetime 轉 ISO 字串，其餘原樣（供 JSON 寫出）"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value.item() if hasattr(value, "item") else value
+
+
+# 預熱 K 棒只保留 MultiTimeframeEngine.warmup() 需要的欄位
+WARMUP_KBAR_FIELDS = ("datetime", "open", "high", "low", "close", "volume")
+
+
+def warmup_path(journal_path: str | Path) -> Path:
+    """預熱資料 sidecar：feed.mfj → feed.mfj.warmup.json"""
+    journal_path = Path(journal_path)
+    return journal_path.with_name(journal_path.name + ".warmup.json")
+
+
+def write_warmup(journal_path: str | Path, indicators: dict | None, kbars=None) -> Path:
+    """
+    記下實盤啟動時的預熱資料（KlineInitializer 的指標與歷史 1 分 K），重播時以相同狀態起跑
+    - kbars 為 dict 序列（例如 DataFrame.iter_rows(named=True)），只留 WARMUP_KBAR_FIELDS
+    """
+    path = warmup_path(journal_path)
+    payload = {
+        "indicators": {k: _plain(v) for k, v in (indicators or {}).items()},
+        "kbars": [{k: _plain(bar[k]) for k in WARMUP_KBAR_FIELDS if k in bar} for bar in (kbars or [])],
+    }
+    path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def read_warmup(journal_path: str | Path):
+    """讀回 (indicators, kbars)；沒有 sidecar（例如離線模式錄的 journal）時回傳 ({}, [])"""
+    path = warmup_path(journal_path)
+    if not path.exists():
+        return {}, []
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    kbars = payload.get("kbars", [])
+    for bar in kbars:
+        if isinstance(bar.get("datetime"), str):
+            bar["datetime"] = datetime.fromisoformat(bar["datetime"])
+    return payload.get("indicators", {}), kbars
+
+
+class FeedJournalWriter:
+    """
+    原始行情紀錄（capture）：
+    - 只記 shioaji TickFOPv1 的原始欄位（close、volume、bid_price、ask_price、datetime）與本機收到時間
+    - 固定 48 bytes 的 struct 紀錄，附加寫入；檔案已存在且檔頭相符時接續寫入
+    - capture(callback) 包住原本的 tick callback：先寫 journal 再交給 callback，策略流程不變
+    - 寫入走 Python 緩衝；flush_every 筆或 close() 時才落盤
+    """
+
+    def __init__(self, path: str | Path, flush_every: int = 256):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.count = 0
+        self._lock = threading.Lock()
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        if not new_file:
+            with self.path.open("rb") as f:
+                magic, version = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"不是 FeedJournal 檔案或版本不符：{self.path}")
+        self._file = self.path.open("ab")
+        if new_file:
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+        else:
+            # 前次寫到一半（例如當機）的殘缺紀錄截掉，後續紀錄才會對齊
+            body = self.path.stat().st_size - HEADER.size
+            if body % RECORD.size:
+                self._file.truncate(HEADER.size + body - body % RECORD.size)
+
+    def append(self, tick, received_ns: int | None = None):
+        bid = getattr(tick, "bid_price", None)
+        ask = getattr(tick, "ask_price", None)
+        data = RECORD.pack(
+            received_ns if received_ns is not None else time.time_ns(),
+            _to_us(tick.datetime),
+            float(tick.close),
+            float(tick.volume),
+            float("nan") if bid is None else float(bid),
+            float("nan") if ask is None else float(ask),
+        )
+        with self._lock:
+            if self._file.closed:  # 關閉後才到的 tick（退訂前的最後幾筆）不記
+                return
+            self._file.write(data)
+            self.count += 1
+            if self.count % self.flush_every == 0:
+                self._file.flush()
+
+    def capture(self, callback):
+        """回傳先寫 journal 再呼叫 callback(exchange, tick) 的新 callback"""
+        append = self.append
+
+        def capturing_callback(exchange, tick):
+            append(tick)
+            callback(exchange, tick)
+        return capturing_callback
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def read_journal(path: str | Path, chunk_records: int = 4096):
+    """
+    逐筆讀出 (received_ns, tick)；tick 為與 TickFOPv1 同名欄位的 SimpleNamespace
+    - volume 整數值還原為 int（與 shioaji 相同），bid / ask 的 NaN 還原為 None
+    - 結尾殘缺的紀錄忽略
+    """
+    path = Path(path)
+    with path.open("rb") as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是 FeedJournal 檔案或版本不符：{path}")
+        size = RECORD.size
+        while True:
+            chunk = f.read(size * chunk_records)
+            usable = len(chunk) - len(chunk) % size
+            for received_ns, ts_us, close, volume, bid, ask in RECORD.iter_unpack(chunk[:usable]):
+                yield received_ns, SimpleNamespace(
+                    close=close,
+                    volume=int(volume) if volume.is_integer() else volume,
+                    bid_price=_optional(bid),
+                    ask_price=_optional(ask),
+                    datetime=_EPOCH + timedelta(microseconds=ts_us),
+                )
+            if len(chunk) < size * chunk_records:
+                return
+
+
+class FeedReplayer:
+    """
+    重播 FeedJournal（介面同 BotRuntime 的 quote source：start() / stop()）：
+    - 以背景執行緒依紀錄順序呼叫與實盤相同的 tick callback(exchange, tick)
+    - speed=1 依原始收到間隔重播；speed=N 加速 N 倍；speed=None 或 0 不等待（最快）
+    - 間隔以 max_gap 秒為上限（跨盤或斷線的空檔不必真的等）
+    - 策略時間由 TickEngine 的 SimulatedClock 依 tick 時間推進，與重播速度無關，結果可重現
+    - 全部送完後呼叫 on_finished（例如通知 runtime 結束）
+    """
+
+    def __init__(self, path: str | Path, callback, speed: float | None = None, max_gap: float = 5.0,
+                 exchange: str = "TAIFEX", on_finished=None):
+        self.path = Path(path)
+        self.callback = callback
+        self.speed = speed or None
+        self.max_gap = max_gap
+        self.exchange = exchange
+        self.on_finished = on_finished
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        speed, max_gap = self.speed, self.max_gap
+        start = time.perf_counter()
+        offset = 0.0
+        last_ns = None
+        for received_ns, tick in read_journal(self.path):
+            if self._stop.is_set():
+                return
+            if speed is not None:
+                if last_ns is not None:
+                    offset += min(max(received_ns - last_ns, 0) / 1e9, max_gap) / speed
+                last_ns = received_ns
+                wait = start + offset - time.perf_counter()
+                if wait > 0 and self._stop.wait(wait):
+                    return
+            self.callback(self.exchange, tick)
+            self.sent += 1
+        if self.on_finished and not self._stop.is_set():
+            self.on_finished()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="feed-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
@@ -1,47 +1,72 @@
 # strategy_v4/io/TickRecorder.py
 
 import csv
-from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List
 
+from Clock import LIVE_CLOCK
+from TickRecord import TickRecord
+
+# tick 記錄欄位（CSV 標題列，Arrow/Parquet 後端沿用相同欄位）；須涵蓋 DecisionEngine_v2 特徵所需的欄位，
+# RegressionCalibrator 以這份記錄校正，訓練與實盤推論才會看到相同的特徵
+# momentum / direction_score / trade_id 供 ExitStrategySimulator 依交易切出 tick 路徑；
+# 最後的 trade_id 由 recorder 依 current_trade_id 補上：TickEngine 先記錄 tick 再判斷進出場，
+# 所以一筆交易的 tick 從進場後第一筆到出場那筆（含），與 ExitStrategySimulator / ExitPolicyEngine 的路徑定義相同
+TICK_FIELDS = [
+    "timestamp", "price", "volume",
+    "bias", "bias_prob",
+    "entry_score", "entry_score_v2", "exit_score_v2",
+    "mode", "params_version",
+    "rsi", "macd", "macd_signal", "macd_hist", "kd_k", "kd_d",
+    "atr", "adx", "vwap", "ema5", "ema20", "rsi_5m", "rsi_15m",
+    "bband_upper", "bband_lower", "bband_pos", "bband_width", "vol_roc",
+    "unrealized_profit", "max_profit", "max_loss", "tick_since_entry",
+    "momentum", "direction_score",
+    "trade_id"
+]
+TICK_FIELDS_TUPLE = tuple(TICK_FIELDS[:-1])  # TickRecord 上的欄位；TickRecord.row() 以 tuple 為快取 key
+
 class TickRecorder:
     """
     Tick 資料紀錄器：
     - 記錄每筆 tick 的指標與分數
     - 支援 v3/v4 模式，增加 mode、params_version、bias_prob、entry_score_v2、exit_score_v2 欄位
+    - TickRecord 以 row() 一次取整列（None 由 csv.writer 寫成空字串）；dict 仍逐欄 get
     """
 
-    def __init__(self, record_path: str | Path = "tick_data.csv", buffer_size: int = 100):
+    def __init__(self, record_path: str | Path = "tick_data.csv", buffer_size: int = 100, clock=None):
         self.path = Path(record_path)
+        self.clock = clock if clock is not None else LIVE_CLOCK
         self.buffer_size = buffer_size
         self.buffer: List[List[Any]] = []
         self._initialized = False
+        self.current_trade_id = None
 
     def _init_file(self):
         """初始化 CSV 檔案，建立標題列"""
         if not self._initialized:
             with self.path.open("w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
-                writer.writerow([
-                    "timestamp", "price", "volume",
-                    "bias", "bias_prob",
-                    "entry_score", "entry_score_v2", "exit_score_v2",
-                    "mode", "params_version",
-                    "rsi", "macd", "macd_signal", "kd_k", "kd_d",
-                    "atr", "adx", "vwap", "ema5", "ema20",
-                    "bband_pos", "bband_width", "vol_roc",
-                    "unrealized_profit", "max_profit", "max_loss", "tick_since_entry"
-                ])
+                writer.writerow(TICK_FIELDS)
             self._initialized = True
 
-    def record_tick(self, tick: Dict[str, Any]):
+    def record_tick(self, tick: TickRecord | Dict[str, Any]):
         """將 tick 資料寫入 buffer"""
         if not self._initialized:
             self._init_file()
 
+        if isinstance(tick, TickRecord):
+            row = tick.row(TICK_FIELDS_TUPLE)
+            row.append(self.current_trade_id)
+            if not row[0]:
+                row[0] = self.clock.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.buffer.append(row)
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
+            return
+
         row = [
-            tick.get("timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            tick.get("timestamp") or self.clock.now().strftime("%Y-%m-%d %H:%M:%S"),
             tick.get("price", ""),
             tick.get("volume", ""),
             tick.get("bias", ""),
@@ -54,6 +79,7 @@ class TickRecorder:
             tick.get("rsi", ""),
             tick.get("macd", ""),
             tick.get("macd_signal", ""),
+            tick.get("macd_hist", ""),
             tick.get("kd_k", ""),
             tick.get("kd_d", ""),
             tick.get("atr", ""),
@@ -61,13 +87,20 @@ class TickRecorder:
             tick.get("vwap", ""),
             tick.get("ema5", ""),
             tick.get("ema20", ""),
+            tick.get("rsi_5m", ""),
+            tick.get("rsi_15m", ""),
+            tick.get("bband_upper", ""),
+            tick.get("bband_lower", ""),
             tick.get("bband_pos", ""),
             tick.get("bband_width", ""),
             tick.get("vol_roc", ""),
             tick.get("unrealized_profit", ""),
             tick.get("max_profit", ""),
             tick.get("max_loss", ""),
-            tick.get("tick_since_entry", "")
+            tick.get("tick_since_entry", ""),
+            tick.get("momentum", ""),
+            tick.get("direction_score", ""),
+            self.current_trade_id or ""
         ]
 
         self.buffer.append(row)
@@ -84,6 +117,127 @@ class TickRecorder:
             writer.writerows(self.buffer)
         self.buffer.clear()
 
+    @property
+    def buffered(self) -> int:
+        """尚未寫出的筆數"""
+        return len(self.buffer)
+
+    def start_trade(self, trade_id: str):
+        """TradeLogger 進場時呼叫：只記下目前 trade_id，不寫檔（tick 照常由 buffer 批次寫出）"""
+        self.current_trade_id = trade_id
+
+    def end_trade(self):
+        """TradeLogger 出場時呼叫：清除 trade_id"""
+        self.current_trade_id = None
+
     def force_flush(self):
         """強制立即寫入檔案"""
         self.flush()
+
+    def close(self):
+        """結束記錄：寫出剩餘 buffer"""
+        self.flush()
+
+
+
+class MemoryTickRecorder(TickRecorder):
+    """回測用：tick 紀錄只保留在記憶體（rows），不寫檔"""
+
+    def __init__(self, clock=None, keep_rows: bool = True):
+        super().__init__(record_path="", buffer_size=0, clock=clock)
+        self.keep_rows = keep_rows
+        self.rows: List[List[Any]] = []
+        self._initialized = True
+
+    def record_tick(self, tick: TickRecord | Dict[str, Any]):
+        if self.keep_rows:
+            if isinstance(tick, TickRecord):
+                row = tick.row(TICK_FIELDS_TUPLE, "")
+            else:
+                row = [tick.get(name, "") for name in TICK_FIELDS_TUPLE]
+            row.append(self.current_trade_id or "")
+            self.rows.append(row)
+
+    def flush(self):
+        pass
+
+
+def load_ticks(path: str | Path, backend: str = "polars"):
+    """
+    讀取 tick 記錄檔：
+    - .arrows / .arrow：Arrow IPC stream，以 memory map 零複製載入
+    - .parquet：以 memory map 讀取
+    - .csv：一般 CSV 解析
+    - backend："polars" / "pandas" / "arrow"
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        if backend == "polars":
+            import polars as pl
+            return pl.read_csv(path)
+        import pandas as pd
+        df = pd.read_csv(path)
+        if backend == "arrow":
+            import pyarrow as pa
+            return pa.Table.from_pandas(df)
+        return df
+
+    import pyarrow as pa
+    if suffix in (".arrows", ".arrow"):
+        # buffer 直接指向 mmap 區段，不另外複製；檔案由 table 的參照保持開啟
+        source = pa.memory_map(str(path), "r")
+        table = pa.ipc.open_stream(source).read_all()
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, memory_map=True)
+    else:
+        raise ValueError(f"不支援的 tick 檔案格式：{path.suffix}")
+
+    if backend == "arrow":
+        return table
+    if backend == "polars":
+        import polars as pl
+        return pl.from_arrow(table)
+    return table.to_pandas()
+
+
+def iter_tick_chunks(path: str | Path, chunk_rows: int = 100_000, columns: List[str] | None = None):
+    """
+    分段讀取 tick 記錄檔（pandas DataFrame），不必整份載入記憶體：
+    - .csv：pandas chunksize
+    - .arrows / .arrow：memory map 逐批讀 record batch，累積到 chunk_rows 再輸出
+    - .parquet：ParquetFile.iter_batches
+    - columns 可只挑需要的欄位（檔案沒有的欄位忽略）
+    """
+    import pandas as pd
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        wanted = set(columns) if columns else None
+        usecols = (lambda c: c in wanted) if wanted else None
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=usecols)
+        return
+
+    import pyarrow as pa
+    if suffix in (".arrows", ".arrow"):
+        with pa.memory_map(str(path), "r") as source:
+            reader = pa.ipc.open_stream(source)
+            names = [n for n in reader.schema.names if not columns or n in columns]
+            pending, rows = [], 0
+            for batch in reader:
+                pending.append(batch.select(names))
+                rows += batch.num_rows
+                if rows >= chunk_rows:
+                    yield pa.Table.from_batches(pending).to_pandas()
+                    pending, rows = [], 0
+            if pending:
+                yield pa.Table.from_batches(pending).to_pandas()
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path, memory_map=True)
+        names = [n for n in parquet.schema_arrow.names if not columns or n in columns]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=names):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"不支援的 tick 檔案格式：{path.suffix}")
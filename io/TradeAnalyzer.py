@@ -1,184 +1,271 @@
-import csv
-from collections import defaultdict
+import glob
+from pathlib import Path
+
+import polars as pl
+
+EXIT_ACTIONS = ("STOPLOSS", "LOCK_PROFIT", "EXIT", "TIME_EXIT", "TAKEPROFIT")
+# 交易紀錄中分析會用到的欄位（舊格式缺少的欄位以預設值補上）
+LOG_COLUMNS = ("timestamp", "action", "direction", "price", "entry_score", "bias", "momentum", "reversal", "direction_score")
+RESULT_COLUMNS = [
+    "entry_price", "exit_price", "entry_time", "exit_time", "entry_score", "direction", "bias",
+    "momentum", "reversal", "direction_score", "pnl", "net_pnl", "outcome",
+]
+MOMENTUM_LABELS = ["強推升勢", "弱升", "盤整", "弱跌", "強推下殺"]
+
+MOMENTUM_BUCKET = (
+    pl.when(pl.col("momentum") > 6).then(pl.lit("強推升勢"))
+    .when(pl.col("momentum") > 3).then(pl.lit("弱升"))
+    .when(pl.col("momentum") >= -3).then(pl.lit("盤整"))
+    .when(pl.col("momentum") >= -6).then(pl.lit("弱跌"))
+    .otherwise(pl.lit("強推下殺"))
+)
+
+# 分組維度：名稱 → 運算式（對配對後的交易表計算，結果為該筆交易所屬的組別）
+DEFAULT_DIMENSIONS = {
+    "entry_score": pl.col("entry_score"),
+    "direction": pl.col("direction"),
+    "bias": pl.col("bias"),
+    "momentum": MOMENTUM_BUCKET,
+    "reversal": pl.when(pl.col("reversal")).then(pl.lit("反轉盤")).otherwise(pl.lit("非反轉")),
+    "direction_score": pl.col("direction_score"),
+}
+# 進場條件：名稱 → 布林運算式（只統計命中的交易）
+DEFAULT_CONDITIONS = {
+    "entry_score>=3": pl.col("entry_score") >= 3,
+    "momentum<-3": pl.col("momentum") < -3,
+    "direction_score==1": pl.col("direction_score") == 1,
+    "reversal=False": ~pl.col("reversal"),
+}
+
+
+def expand_paths(filename) -> list:
+    """單一路徑、glob 樣式（例如 logs/trade_log_*.csv）或路徑清單 → 排序後的檔案清單"""
+    sources = [filename] if isinstance(filename, (str, Path)) else list(filename)
+    paths = []
+    for source in sources:
+        if glob.has_magic(str(source)):
+            paths.extend(sorted(glob.glob(str(source))))
+        else:
+            paths.append(str(source))
+    return paths
+
+
+def normalize_log(frame: pl.LazyFrame) -> pl.LazyFrame:
+    """交易紀錄欄位轉型（規則同原本逐列解析：空值視為 0 / 空字串，reversal 以字串 True 判斷）"""
+    names = frame.collect_schema().names()
+    missing = [pl.lit(None).alias(c) for c in LOG_COLUMNS if c not in names]
+    if "file" not in names:
+        missing.append(pl.lit("").alias("file"))
+    return frame.with_columns(missing).select(
+        pl.col("file").cast(pl.String),
+        pl.col("timestamp").cast(pl.String).fill_null(""),
+        pl.col("action").cast(pl.String),
+        pl.col("direction").cast(pl.String).fill_null(""),
+        pl.col("price").cast(pl.Float64, strict=False),
+        pl.col("entry_score").cast(pl.Float64, strict=False).fill_null(0).cast(pl.Int64),
+        pl.col("bias").cast(pl.String).fill_null(""),
+        pl.col("momentum").cast(pl.Float64, strict=False).fill_null(0.0),
+        (pl.col("reversal").cast(pl.String).str.to_lowercase() == "true").fill_null(False).alias("reversal"),
+        pl.col("direction_score").cast(pl.Float64, strict=False).fill_null(0).cast(pl.Int64),
+    )
+
+
+def pair_trades(events: pl.LazyFrame, fee_per_trade: float = 2.1) -> pl.LazyFrame:
+    """
+    向量化配對進出場：
+    - 所有檔案的事件合併後依 timestamp 穩定排序再配對，夜盤跨日換檔的持倉（前一檔進場、下一檔出場）也能配成一筆
+    - 只看 ENTER 與出場動作，出場列的前一筆事件是 ENTER 才成一筆交易（連續 ENTER 以最後一筆為準）
+    - file 為出場列所在的檔案；價格無法解析的交易略過
+    """
+    entry = {c: pl.col(c).shift(1) for c in ("action", "timestamp", "direction", "price", "entry_score",
+                                                          "bias", "momentum", "reversal", "direction_score")}
+    sign = pl.when(pl.col("direction") == "short").then(-1.0).otherwise(1.0)
+    return (
+        events.filter(pl.col("action").is_in(("ENTER",) + EXIT_ACTIONS))
+        .sort("timestamp", maintain_order=True)
+        .with_columns(
+            entry["action"].alias("entry_action"),
+            entry["price"].alias("entry_price"),
+            entry["timestamp"].alias("entry_time"),
+            *[entry[c].alias(c) for c in ("direction", "entry_score", "bias", "momentum", "reversal", "direction_score")],
+        )
+        .filter(pl.col("action").is_in(EXIT_ACTIONS) & (pl.col("entry_action") == "ENTER"))
+        .with_columns(
+            ((pl.col("price") - pl.col("entry_price")) * sign).alias("pnl"),
+            pl.col("price").alias("exit_price"),
+            pl.col("timestamp").alias("exit_time"),
+        )
+        .filter(pl.col("pnl").is_not_null())
+        .with_columns((pl.col("pnl") - fee_per_trade).alias("net_pnl"))
+        .with_columns(pl.when(pl.col("net_pnl") > 0).then(pl.lit("win")).otherwise(pl.lit("loss")).alias("outcome"))
+        .select("file", *RESULT_COLUMNS)
+    )
+
 
 class TradeAnalyzer:
-    def __init__(self, filename="trade_log.csv", fee_per_trade=2.1):
+    """
+    交易紀錄分析（Polars 欄位式）：
+    - filename 可為單一檔案、glob 樣式或檔案清單；多個檔案以 LazyFrame 一起掃描，依時間合併後配對進出場
+    - analyze() 產生配對後的交易表（self.frame）；self.results 為相容舊介面的 dict 清單
+    - breakdown() 把所有分組維度與進場條件轉成長表，以一次 group_by 算出各組筆數、勝率、平均淨損益
+    - dimensions / conditions 可自訂 Polars 運算式（例如 {"hour": pl.col("entry_time").str.slice(11, 2)}），與預設值合併
+    """
+
+    def __init__(self, filename="trade_log.csv", fee_per_trade=2.1, dimensions=None, conditions=None):
         self.filename = filename
         self.fee = fee_per_trade
-        self.trades = []
-        self.results = []
-
-    def load_trades(self):
-        with open(self.filename, newline="") as f:
-            reader = csv.DictReader(f)
-            self.trades = list(reader)
-
-    def analyze(self):
-        self.load_trades()
-        entry = None
-        for row in self.trades:
-            action = row["action"]
-            if action == "ENTER":
-                entry = row
-            elif action in ("STOPLOSS", "LOCK_PROFIT", "EXIT", "TIME_EXIT", "TAKEPROFIT") and entry:
-                try:
-                    pnl = float(row["price"]) - float(entry["price"])
-                except ValueError:
-                    continue  # 若 price 欄位有問題，跳過
-
-                direction = entry.get("direction", "")
-                if direction == "short":
-                    pnl = -pnl
-                net_pnl = pnl - self.fee
-
-                result = {
-                    "entry_price": float(entry.get("price", 0)),
-                    "exit_price": float(row.get("price", 0)),
-                    "entry_time": entry.get("timestamp", ""),
-                    "exit_time": row.get("timestamp", ""),
-                    "entry_score": int(entry.get("entry_score", 0) or 0),
-                    "direction": direction,
-                    "bias": entry.get("bias", ""),
-                    "momentum": float(entry.get("momentum", 0) or 0),
-                    "reversal": str(entry.get("reversal", "False")) == "True",
-                    "direction_score": int(entry.get("direction_score", 0) or 0),
-                    "pnl": pnl,
-                    "net_pnl": net_pnl,
-                    "outcome": "win" if net_pnl > 0 else "loss"
-                }
-                self.results.append(result)
-                entry = None
+        self.dimensions = {**DEFAULT_DIMENSIONS, **(dimensions or {})}
+        self.conditions = {**DEFAULT_CONDITIONS, **(conditions or {})}
+        self.trades = None
+        self.frame = pl.DataFrame(schema={"file": pl.String, **{c: pl.Null for c in RESULT_COLUMNS}})
+        self._results = None
+
+    def load_trades(self) -> pl.LazyFrame:
+        """掃描所有交易紀錄檔（不一次載入；欄位一律先讀成字串，再由 normalize_log 轉型）"""
+        scans = [
+            pl.scan_csv(path, infer_schema=False).with_columns(pl.lit(path).alias("file"))
+            for path in expand_paths(self.filename)
+        ]
+        if not scans:
+            raise FileNotFoundError(f"找不到交易紀錄：{self.filename}")
+        self.trades = normalize_log(pl.concat(scans, how="diagonal"))
+        return self.trades
+
+    def analyze(self, trades=None) -> pl.DataFrame:
+        """配對進出場；trades 可直接傳入記憶體中的交易列（例如 BacktestRunner）或 Polars frame，省略時讀檔"""
+        if trades is None:
+            self.load_trades()
+        elif isinstance(trades, (pl.DataFrame, pl.LazyFrame)):
+            self.trades = normalize_log(trades.lazy())
+        else:
+            rows = list(trades)
+            columns = {c: [row.get(c) for row in rows] for c in LOG_COLUMNS}
+            self.trades = normalize_log(pl.DataFrame(columns, strict=False).lazy())
+        self.frame = pair_trades(self.trades, self.fee).collect()
+        self._results = None
+        return self.frame
+
+    @property
+    def results(self) -> list:
+        """逐筆交易 dict（欄位同舊版），第一次存取時才由 self.frame 轉換"""
+        if self._results is None:
+            self._results = self.frame.select(RESULT_COLUMNS).to_dicts() if self.frame.height else []
+        return self._results
+
+    def breakdown(self, dimensions=None, conditions=None) -> pl.DataFrame:
+        """
+        單次分組統計：
+        - 每個維度 / 條件先算成一欄字串組別（條件未命中為 null），unpivot 成 (key, value) 長表後一次 group_by
+        - 回傳欄位 kind（dimension / condition）、name、value、trades、wins、win_rate、avg_net_pnl、total_net_pnl
+        """
+        dimensions = self.dimensions if dimensions is None else dimensions
+        conditions = self.conditions if conditions is None else conditions
+        keys = {f"dimension:{name}": ("dimension", name) for name in dimensions}
+        keys.update({f"condition:{name}": ("condition", name) for name in conditions})
+        if not self.frame.height or not keys:
+            return pl.DataFrame(schema={"kind": pl.String, "name": pl.String, "value": pl.String, "trades": pl.UInt32,
+                                        "wins": pl.UInt32, "win_rate": pl.Float64, "avg_net_pnl": pl.Float64,
+                                        "total_net_pnl": pl.Float64})
+
+        columns = [expr.cast(pl.String).alias(f"dimension:{name}") for name, expr in dimensions.items()]
+        columns += [pl.when(expr).then(pl.lit(name)).alias(f"condition:{name}") for name, expr in conditions.items()]
+        order = {key: i for i, key in enumerate(keys)}
+        return (
+            self.frame.lazy()
+            .select(pl.col("net_pnl"), (pl.col("outcome") == "win").alias("win"), *columns)
+            .unpivot(index=["net_pnl", "win"], variable_name="key", value_name="value")
+            .drop_nulls("value")
+            .group_by("key", "value")
+            .agg(
+                pl.len().alias("trades"),
+                pl.col("win").sum().cast(pl.UInt32).alias("wins"),
+                pl.col("net_pnl").mean().alias("avg_net_pnl"),
+                pl.col("net_pnl").sum().alias("total_net_pnl"),
+            )
+            .with_columns(
+                (pl.col("wins") / pl.col("trades") * 100).alias("win_rate"),
+                pl.col("key").replace_strict({k: v[0] for k, v in keys.items()}).alias("kind"),
+                pl.col("key").replace_strict({k: v[1] for k, v in keys.items()}).alias("name"),
+                pl.col("key").replace_strict(order).alias("_order"),
+                pl.col("value").cast(pl.Float64, strict=False).alias("_number"),
+            )
+            .sort("_order", "_number", "value", nulls_last=True)
+            .select("kind", "name", "value", "trades", "wins", "win_rate", "avg_net_pnl", "total_net_pnl")
+            .collect()
+        )
+
+    def streaks(self) -> tuple:
+        """最大連勝、最大連敗（run-length encoding）"""
+        if not self.frame.height:
+            return 0, 0
+        runs = self.frame.select(pl.col("outcome").rle()).unnest("outcome")
+        best = runs.group_by("value").agg(pl.col("len").max())
+        lookup = dict(zip(best["value"], best["len"]))
+        return lookup.get("win", 0), lookup.get("loss", 0)
+
     def summary(self):
-        wins = [r for r in self.results if r["outcome"] == "win"]
-        losses = [r for r in self.results if r["outcome"] == "loss"]
-
-        # 連勝連敗計算
-        max_win_streak = max_loss_streak = 0
-        current_streak = 0
-        last_outcome = None
-        for r in self.results:
-            if r["outcome"] == last_outcome:
-                current_streak += 1
-            else:
-                current_streak = 1
-                last_outcome = r["outcome"]
-            if r["outcome"] == "win":
-                max_win_streak = max(max_win_streak, current_streak)
-            else:
-                max_loss_streak = max(max_loss_streak, current_streak)
-
-        print(f"📊 總交易次數：{len(self.results)}")
-        if self.results:
-            print(f"✅ 勝率（扣手續費）：{len(wins) / len(self.results) * 100:.1f}%")
-        print(f"💰 平均實際獲利：{sum(r['net_pnl'] for r in wins) / len(wins):.2f}" if wins else "💰 無獲利紀錄")
-        print(f"❌ 平均實際虧損：{sum(r['net_pnl'] for r in losses) / len(losses):.2f}" if losses else "❌ 無虧損紀錄")
+        frame = self.frame
+        total = frame.height
+        max_win_streak, max_loss_streak = self.streaks()
+        wins = frame.filter(pl.col("outcome") == "win")["net_pnl"] if total else pl.Series([])
+        losses = frame.filter(pl.col("outcome") == "loss")["net_pnl"] if total else pl.Series([])
+
+        print(f"📊 總交易次數：{total}")
+        if total:
+            print(f"✅ 勝率（扣手續費）：{len(wins) / total * 100:.1f}%")
+        print(f"💰 平均實際獲利：{wins.mean():.2f}" if len(wins) else "💰 無獲利紀錄")
+        print(f"❌ 平均實際虧損：{losses.mean():.2f}" if len(losses) else "❌ 無虧損紀錄")
         print(f"🔥 最大連勝：{max_win_streak}｜最大連敗：{max_loss_streak}")
 
-        # 分數區間分析
-        print("\n📈 各分數區間績效（扣手續費）：")
-        score_groups = defaultdict(list)
-        for r in self.results:
-            score_groups[r["entry_score"]].append(r)
-        for score in sorted(score_groups):
-            group = score_groups[score]
-            win_count = sum(1 for r in group if r["outcome"] == "win")
-            pnl_avg = sum(r["net_pnl"] for r in group) / len(group)
-            print(f"  分數 {score}：{len(group)} 筆｜勝率 {win_count / len(group) * 100:.1f}%｜平均淨損益 {pnl_avg:.2f}")
-
-        # 多空方向分析
-        print("\n📊 多空方向績效（扣手續費）：")
-        direction_groups = defaultdict(list)
-        for r in self.results:
-            direction_groups[r["direction"]].append(r)
-        for direction in ["long", "short"]:
-            group = direction_groups[direction]
-            if group:
-                win_count = sum(1 for r in group if r["outcome"] == "win")
-                pnl_avg = sum(r["net_pnl"] for r in group) / len(group)
-                print(f"  {direction.upper()}：{len(group)} 筆｜勝率 {win_count / len(group) * 100:.1f}%｜平均淨損益 {pnl_avg:.2f}")
-
-        # bias 判斷分析
-        print("\n📊 Bias 判斷績效（扣手續費）：")
-        bias_groups = defaultdict(list)
-        for r in self.results:
-            bias_groups[r["bias"]].append(r)
-        for bias in ["bullish", "bearish", "neutral"]:
-            group = bias_groups[bias]
-            if group:
-                win_count = sum(1 for r in group if r["outcome"] == "win")
-                pnl_avg = sum(r["net_pnl"] for r in group) / len(group)
-                print(f"  {bias.upper()}：{len(group)} 筆｜勝率 {win_count / len(group) * 100:.1f}%｜平均淨損益 {pnl_avg:.2f}")
-
-        # momentum 分析
-        print("\n📊 Momentum 區間績效：")
-        momentum_groups = {
-            "強推升勢": [],
-            "弱升": [],
-            "盤整": [],
-            "弱跌": [],
-            "強推下殺": []
-        }
-        for r in self.results:
-            m = r["momentum"]
-            if m > 6:
-                momentum_groups["強推升勢"].append(r)
-            elif m > 3:
-                momentum_groups["弱升"].append(r)
-            elif -3 <= m <= 3:
-                momentum_groups["盤整"].append(r)
-            elif m < -3 and m >= -6:
-                momentum_groups["弱跌"].append(r)
-            else:
-                momentum_groups["強推下殺"].append(r)
-        for label, group in momentum_groups.items():
-            if group:
-                win_count = sum(1 for r in group if r["outcome"] == "win")
-                pnl_avg = sum(r["net_pnl"] for r in group) / len(group)
-                print(f"  {label}：{len(group)} 筆｜勝率 {win_count / len(group) * 100:.1f}%｜平均淨損益 {pnl_avg:.2f}")
-
-        # reversal 分析
-        print("\n📊 Reversal 狀態績效：")
-        rev_groups = defaultdict(list)
-        for r in self.results:
-            key = "反轉盤" if r["reversal"] else "非反轉"
-            rev_groups[key].append(r)
-        for label, group in rev_groups.items():
-            win_count = sum(1 for r in group if r["outcome"] == "win")
-            pnl_avg = sum(r["net_pnl"] for r in group) / len(group)
-            print(f"  {label}：{len(group)} 筆｜勝率 {win_count / len(group) * 100:.1f}%｜平均淨損益 {pnl_avg:.2f}")
-
-        # direction_score 分析
-        print("\n📊 Direction Score 績效：")
-        ds_groups = defaultdict(list)
-        for r in self.results:
-            ds_groups[r["direction_score"]].append(r)
-        for score in sorted(ds_groups):
-            group = ds_groups[score]
-            win_count = sum(1 for r in group if r["outcome"] == "win")
-            pnl_avg = sum(r["net_pnl"] for r in group) / len(group)
-            print(f"  分數 {score}：{len(group)} 筆｜勝率 {win_count / len(group) * 100:.1f}%｜平均淨損益 {pnl_avg:.2f}")
+        stats = self.breakdown()
+        groups = {}
+        for row in stats.iter_rows(named=True):
+            groups.setdefault((row["kind"], row["name"]), []).append(row)
+
+        def show(row, label):
+            print(f"  {label}：{row['trades']} 筆｜勝率 {row['win_rate']:.1f}%｜平均淨損益 {row['avg_net_pnl']:.2f}")
+
+        # 預設維度依原本的標題與排列順序輸出（direction / bias 只列已知值）
+        layout = [
+            ("entry_score", "\n📈 各分數區間績效（扣手續費）：", None, "分數 {}"),
+            ("direction", "\n📊 多空方向績效（扣手續費）：", ["long", "short"], None),
+            ("bias", "\n📊 Bias 判斷績效（扣手續費）：", ["bullish", "bearish", "neutral"], None),
+            ("momentum", "\n📊 Momentum 區間績效：", MOMENTUM_LABELS, "{}"),
+            ("reversal", "\n📊 Reversal 狀態績效：", None, "{}"),
+            ("direction_score", "\n📊 Direction Score 績效：", None, "分數 {}"),
+        ]
+        shown = set()
+        for name, title, known, fmt in layout:
+            if name not in self.dimensions:
+                continue
+            shown.add(name)
+            print(title)
+            rows = {row["value"]: row for row in groups.get(("dimension", name), [])}
+            for value in (known if known is not None else rows):
+                if value in rows:
+                    show(rows[value], fmt.format(value) if fmt else value.upper())
+
+        for name in self.dimensions:
+            if name not in shown:
+                print(f"\n📊 {name} 績效：")
+                for row in groups.get(("dimension", name), []):
+                    show(row, row["value"])
 
         # 額外提示
-        if len(score_groups) == 1 and 0 in score_groups:
+        scores = groups.get(("dimension", "entry_score"), [])
+        if len(scores) == 1 and scores[0]["value"] == "0":
             print("\n⚠️ 所有交易分數皆為 0，請確認 TradeLogger 是否正確記錄 entry_score。")
 
         # 進場條件命中率分析
         print("\n📊 進場條件命中率分析：")
-        conditions = {
-            "entry_score>=3": lambda r: r["entry_score"] >= 3,
-            "momentum<-3": lambda r: r["momentum"] < -3,
-            "direction_score==1": lambda r: r["direction_score"] == 1,
-            "reversal=False": lambda r: not r["reversal"],
-        }
-        for label, cond in conditions.items():
-            group = [r for r in self.results if cond(r)]
-            if group:
-                win_count = sum(1 for r in group if r["outcome"] == "win")
-                pnl_avg = sum(r["net_pnl"] for r in group) / len(group)
-                print(f"  {label}：{len(group)} 筆｜勝率 {win_count / len(group) * 100:.1f}%｜平均淨損益 {pnl_avg:.2f}")
+        for name in self.conditions:
+            for row in groups.get(("condition", name), []):
+                show(row, name)
 
 # ✅ 程式入口：直接執行時會跑分析並輸出報告
 if __name__ == "__main__":
-    analyzer = TradeAnalyzer(filename="trade_log.csv", fee_per_trade=2.1)
+    import sys
+
+    analyzer = TradeAnalyzer(filename=sys.argv[1:] or "trade_log.csv", fee_per_trade=2.1)
     analyzer.analyze()
     analyzer.summary()
@@ -1,10 +1,32 @@
 import csv
-from datetime import datetime
+import os
+import queue
+import threading
+import time
+
+from Clock import LIVE_CLOCK
+from StrategyLogging import get_logger
+
+log = get_logger("logger")
+
+EXIT_ACTIONS = ("STOPLOSS", "LOCK_PROFIT", "EXIT", "TIME_EXIT", "TAKEPROFIT")
 
 class TradeLogger:
-    def __init__(self, filename="trade_log.csv", tick_recorder=None):
+    def __init__(self, filename="trade_log.csv", tick_recorder=None, async_mode=False,
+                 fsync_actions=("ENTER",) + EXIT_ACTIONS, fsync_interval_ms=1000, batch_size=64, clock=None):
         self.filename = filename
+        self.clock = clock if clock is not None else LIVE_CLOCK
         self.tick_recorder = tick_recorder  # ✅ 注入 TickRecorder 實例
+        # ✅ 非同步模式：log() 只做一次入列，由背景執行緒批次寫檔
+        self.async_mode = async_mode
+        self.fsync_actions = set(fsync_actions or ())
+        self.fsync_interval = fsync_interval_ms / 1000 if fsync_interval_ms else None
+        self.batch_size = batch_size
+        self._queue = None
+        self._writer_thread = None
+        self.write_errors = 0  # 背景寫檔失敗次數（每次失敗後保留資料列重試）
+        self.retry_interval = 1.0
+        self.close_retries = 3  # close() 時仍寫不出去的重試次數，之後放棄剩餘資料列
         self.fields = [
             "timestamp", "action", "direction", "price",
             "max_profit", "max_loss", "tick_since_entry",
@@ -13,6 +35,14 @@ class TradeLogger:
             "entry_score", "bias",
             "momentum", "reversal", "direction_score"
         ]
+        self._create_file()
+
+        if self.async_mode:
+            self._queue = queue.SimpleQueue()
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="trade-logger", daemon=True)
+            self._writer_thread.start()
+
+    def _create_file(self):
         try:
             with open(self.filename, "x", newline="") as f:
                 writer = csv.DictWriter(f, fieldnames=self.fields)
@@ -20,9 +50,9 @@ class TradeLogger:
         except FileExistsError:
             pass
 
-    def build_row(self, action: str, state: dict, price: float, tick: dict, extra_fields: dict = None) -> dict:
+    def build_row(self, action: str, state: dict, price: float, tick: dict, extra_fields: dict = None, timestamp: str = None) -> dict:
         row = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": timestamp or self.clock.now().strftime("%Y-%m-%d %H:%M:%S"),
             "action": action,
             "direction": state.get("direction", ""),
             "price": price,
@@ -52,20 +82,154 @@ class TradeLogger:
                     row[k] = v
         return row
 
+    def _writer_loop(self):
+        """背景寫檔：保持檔案開啟、批次寫入，遇到 fsync_actions 或超過 fsync 間隔時落盤"""
+        f = None
+        writer = None
+        pending = []
+        dirty = False
+        good_size = None  # 最後一次成功 flush 後的檔案大小；寫入失敗重開時截回這裡，避免殘缺或重複的資料列
+        last_sync = time.monotonic()
+        closing = False
+        close_attempts = 0
+        while True:
+            batch = []
+            if closing:
+                if not pending or close_attempts > self.close_retries:
+                    break
+                if close_attempts:
+                    time.sleep(self.retry_interval)  # 關閉時仍寫不出去：有限次數重試
+                close_attempts += 1
+            else:
+                timeout = self.retry_interval if pending else self.fsync_interval or None
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = ()
+                batch = [item] if item else []
+                if item is None:
+                    closing = True
+                    batch = []
+                while not closing and len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        closing = True
+                        break
+                    batch.append(item)
+            sync = closing
+            for action, state, price, tick, extra_fields, timestamp in batch:
+                try:
+                    pending.append(self.build_row(action, state, price, tick, extra_fields, timestamp))
+                except Exception:
+                    log.exception("[LOGGER] 略過無法建立的資料列：%s @ %s", action, price)
+                    continue
+                if action in self.fsync_actions:
+                    sync = True
+            if self.fsync_interval and time.monotonic() - last_sync >= self.fsync_interval:
+                sync = True
+
+            try:
+                if pending:
+                    if f is None:
+                        size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+                        if good_size is None:
+                            good_size = size
+                        elif size > good_size:
+                            os.truncate(self.filename, good_size)
+                        f = open(self.filename, "a", newline="")
+                        writer = csv.DictWriter(f, fieldnames=self.fields)
+                    for row in pending:
+                        try:
+                            writer.writerow(row)
+                        except ValueError as e:
+                            log.warning("[LOGGER] 略過無法寫入的資料列：%s", e)
+                    f.flush()
+                    pending.clear()
+                    good_size = f.tell()
+                    dirty = True
+                if sync and dirty and f is not None:
+                    os.fsync(f.fileno())
+                    dirty = False
+                    last_sync = time.monotonic()
+            except OSError as e:
+                # 檔案被鎖住（例如 Excel 開啟中）、磁碟已滿、I/O 錯誤：保留 pending，稍後重開檔案再試
+                self.write_errors += 1
+                if isinstance(e, PermissionError):
+                    log.warning("[LOGGER] 無法寫入 %s，可能正在被 Excel 開啟中，%d 筆暫存待寫。", self.filename, len(pending))
+                else:
+                    log.error("[LOGGER] 寫入 %s 失敗（%s），%d 筆暫存待寫。", self.filename, e, len(pending))
+                if f is not None:
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+                    f = None
+        if pending:
+            log.error("[LOGGER] 關閉時仍無法寫入 %s，遺失 %d 筆交易紀錄。", self.filename, len(pending))
+        if f is not None:
+            f.close()
+
+    @property
+    def buffered(self) -> int:
+        """非同步模式下尚未寫出的筆數（同步模式為 0）"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def close(self):
+        """關閉記錄器：非同步模式會寫完佇列中所有資料並 fsync 後才返回"""
+        if self._writer_thread is None:
+            return
+        self._queue.put(None)
+        self._writer_thread.join()
+        self._writer_thread = None
+
     def log(self, action: str, state: dict, price: float, tick: dict, extra_fields: dict = None):
+        if self._writer_thread is not None:
+            # 呼叫端不可在 log() 之後再修改 state / tick
+            timestamp = self.clock.now().strftime("%Y-%m-%d %H:%M:%S")
+            self._queue.put((action, state, price, tick, extra_fields, timestamp))
+            self._link_tick_recorder(action, timestamp, state.get("direction", ""), price)
+            return
+
         row = self.build_row(action, state, price, tick, extra_fields)
         try:
             with open(self.filename, "a", newline="") as f:
                 writer = csv.DictWriter(f, fieldnames=self.fields)
                 writer.writerow(row)
-            print(f"[LOGGER] 已記錄 {action} @ {price}")
+            log.info("[LOGGER] 已記錄 %s @ %s", action, price)
         except PermissionError:
-            print(f"[LOGGER] 無法寫入 {self.filename}，可能正在被 Excel 開啟中。")
+            log.warning("[LOGGER] 無法寫入 %s，可能正在被 Excel 開啟中。", self.filename)
+        except OSError as e:
+            self.write_errors += 1
+            log.error("[LOGGER] 寫入 %s 失敗：%s", self.filename, e)
 
         # ✅ TickRecorder 連動
-        if self.tick_recorder:
-            if action == "ENTER":
-                trade_id = f"{row['timestamp']}_{row['direction']}_{row['price']}"
-                self.tick_recorder.start_trade(trade_id)
-            elif action in ("STOPLOSS", "LOCK_PROFIT", "EXIT", "TIME_EXIT", "TAKEPROFIT"):
-                self.tick_recorder.force_flush()
+        self._link_tick_recorder(action, row["timestamp"], row["direction"], row["price"])
+
+    def _link_tick_recorder(self, action: str, timestamp: str, direction: str, price: float):
+        """只更新 TickRecorder 的 trade_id，不觸發寫檔（tick 照常由 recorder 的 buffer 批次寫出）"""
+        if not self.tick_recorder:
+            return
+        if action == "ENTER":
+            if direction:  # 冷卻中被擋下的進場沒有方向，不開新的 trade_id
+                self.tick_recorder.start_trade(f"{timestamp}_{direction}_{float(price):.1f}")
+        elif action in EXIT_ACTIONS:
+            self.tick_recorder.end_trade()
+
+
+class MemoryTradeLogger(TradeLogger):
+    """回測用：交易事件只保留在記憶體（rows），不寫檔、不輸出"""
+
+    def __init__(self, tick_recorder=None, clock=None):
+        super().__init__(filename=None, tick_recorder=tick_recorder, clock=clock)
+        self.rows = []
+
+    def _create_file(self):
+        pass
+
+    def log(self, action: str, state: dict, price: float, tick: dict, extra_fields: dict = None):
+        row = self.build_row(action, state, price, tick, extra_fields)
+        self.rows.append(row)
+        self._link_tick_recorder(action, row["timestamp"], row["direction"], row["price"])
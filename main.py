@@ -1,74 +1,336 @@
+import argparse
 import json
-from datetime import datetime
-import shioaji as sj
-from shioaji.constant import QuoteType, QuoteVersion
+from pathlib import Path
+from time import perf_counter_ns
 
 from StrategyState import StrategyState
 from TickEngine import TickEngine
-from KlineInitializer import KlineInitializer
 from TradeLogger import TradeLogger
 from TickRecorder import TickRecorder
+from TickIngestor import TickIngestor
+from BotRuntime import BotRuntime, FakeQuoteSource
+from Clock import SimulatedClock
+from FeedJournal import FeedJournalWriter, FeedReplayer, read_warmup, write_warmup
+from PerformanceReporter import RunningPerformance
+from LatencyMonitor import LatencyMonitor
+from MetricsServer import MetricsServer
+from StrategyLogging import setup_logging, shutdown_logging
 
-# ====== 讀取設定與登入 ======
-with open("config.json", "r", encoding="utf-8") as f:
-    config = json.load(f)
 
-simulation_mode = config.get("simulation", True)
-api_key = config["api_key"]
-secret_key = config["secret_key"]
+def make_tick_callback(ingestor: TickIngestor, indicators: dict, latency: LatencyMonitor | None = None,
+                       record_feed_lag: bool = True):
+    """
+    建立 shioaji tick 回調：只複製原始欄位並入列，立即返回
+    - 有 latency 時另記收到時間（received_ns）與 feed lag；重播時 tick 時間是模擬的，傳 record_feed_lag=False 略過 feed lag
+    """
+    def to_tick_dict(tick) -> dict:
+        return {
+            "price": tick.close,
+            "volume": tick.volume,
+            "bid": getattr(tick, "bid_price", None),
+            "ask": getattr(tick, "ask_price", None),
+            "timestamp": tick.datetime,
+            "rsi": indicators.get("rsi", 50),
+            "macd": indicators.get("macd", 0),
+            "macd_signal": indicators.get("macd_signal", 0),
+            "kd_k": indicators.get("kd_k", 50),
+            "kd_d": indicators.get("kd_d", 50)
+        }
 
-api = sj.Shioaji(simulation=simulation_mode)
-api.login(api_key=api_key, secret_key=secret_key)
-print(f"✅ 登入成功｜模式：{'模擬' if simulation_mode else '真實'}")
+    def tick_callback(exchange, tick):
+        ingestor.put(to_tick_dict(tick))
 
-# ====== 憑證啟用（真實模式） ======
-if not simulation_mode and "ca_path" in config:
-    api.activate_ca(
-        ca_path=config["ca_path"],
-        ca_passwd=config["ca_passwd"],
-        person_id=config["person_id"]
+    if latency is None:
+        return tick_callback
+
+    def timed_tick_callback(exchange, tick):
+        received_ns = perf_counter_ns()
+        if record_feed_lag:
+            latency.record_feed_lag(tick.datetime)
+        tick_dict = to_tick_dict(tick)
+        tick_dict["received_ns"] = received_ns
+        ingestor.put(tick_dict)
+    return timed_tick_callback
+
+
+def add_latency_report(runtime: BotRuntime, tick_engine: TickEngine, config: dict):
+    """關閉時輸出各階段延遲（p50/p99/max），有設定 export_path 時另寫 JSON"""
+    if tick_engine.latency is None:
+        return
+    export_path = config.get("latency", {}).get("export_path")
+
+    def report():
+        print(f"⏱️ 各階段延遲：\n{tick_engine.latency.report()}")
+        if export_path:
+            print(f"✅ 延遲統計已寫出：{tick_engine.latency.export(export_path)}")
+    runtime.add_shutdown_hook(report)
+
+
+def add_metrics_server(runtime: BotRuntime, tick_engine: TickEngine, config: dict):
+    """config["metrics"]["enabled"] 時啟動本機 Prometheus 端點，關閉時一併停止"""
+    metrics_cfg = config.get("metrics", {})
+    if not metrics_cfg.get("enabled"):
+        return
+    server = MetricsServer(
+        tick_engine,
+        ingestor=runtime.ingestor,
+        tick_recorder=runtime.tick_recorder,
+        trade_logger=runtime.trade_logger,
+        host=metrics_cfg.get("host", "127.0.0.1"),
+        port=metrics_cfg.get("port", 9108)
+    )
+    server.start()
+    runtime.add_shutdown_hook(server.stop)
+
+
+def add_params_watcher(runtime: BotRuntime, tick_engine: TickEngine):
+    """regression_based：校正後的新權重寫入 ParamsStore 即自動換版，不需重啟；關閉時停止監看執行緒"""
+    if tick_engine.decision_v2 is None:
+        return
+    tick_engine.decision_v2.start_watcher()
+    runtime.add_shutdown_hook(tick_engine.decision_v2.stop_watcher)
+
+
+def build_engine(config: dict, indicators: dict, bias: str = "auto", clock=None):
+    """初始化狀態、記錄模組、TickEngine 與 tick 佇列（clock 預設為實盤時鐘；重播時傳入 SimulatedClock）"""
+    state = StrategyState(clock=clock)
+    tick_format = config.get("tick_format", "csv")
+    if tick_format == "csv":
+        tick_recorder = TickRecorder(record_path=config.get("tick_record_path", "tick_record.csv"), clock=clock)
+    else:
+        from ArrowTickRecorder import ArrowTickRecorder
+        suffix = ".parquet" if tick_format == "parquet" else ".arrows"
+        tick_recorder = ArrowTickRecorder(record_path=config.get("tick_record_path", "tick_record" + suffix), fmt=tick_format, clock=clock)
+    logger_cfg = config.get("trade_logger", {})
+    trade_logger = TradeLogger(
+        filename=config.get("trade_log_path", "trade_log.csv"),
+        tick_recorder=tick_recorder,
+        async_mode=logger_cfg.get("async", False),
+        fsync_interval_ms=logger_cfg.get("fsync_interval_ms", 1000),
+        clock=clock
+    )
+    tick_engine = TickEngine(state, bias, indicators, trade_logger, tick_recorder, mode=config.get("mode", "rule_based"))
+    # ✅ 每筆平倉 O(1) 更新累計績效，不需重讀 trade_log.csv
+    tick_engine.performance = RunningPerformance(fee_per_trade=config.get("fee_per_trade", 2.1))
+    state.add_trade_listener(tick_engine.performance.on_trade_closed)
+    if config.get("latency", {}).get("enabled"):
+        # ✅ 各階段延遲量測；需在建立 TickIngestor 之前啟用（ingestor 持有 on_tick）
+        tick_engine.enable_latency(LatencyMonitor())
+
+    # ====== Tick 佇列：回調只負責入列，策略在 worker 執行緒執行 ======
+    queue_cfg = config.get("tick_queue", {})
+    ingestor = TickIngestor(
+        tick_engine.on_tick,
+        maxsize=queue_cfg.get("maxsize", 10000),
+        policy=queue_cfg.get("policy", "drop_oldest")
+    )
+    return tick_engine, tick_recorder, trade_logger, ingestor
+
+
+def with_capture(runtime: BotRuntime, callback, config: dict, indicators: dict | None = None, kbars=None):
+    """
+    設定 capture_path 時把原始 tick 寫入 FeedJournal（之後可用 --replay 重播），關閉時一併關檔
+    - 新的 journal 旁另存預熱用的指標與歷史 K 棒（write_warmup），重播時以相同狀態起跑；接續寫入時沿用原本的
+    """
+    capture_path = config.get("capture_path")
+    if not capture_path:
+        return callback
+    path = Path(capture_path)
+    if not path.exists() or path.stat().st_size == 0:
+        write_warmup(path, indicators, kbars)
+    journal = FeedJournalWriter(path)
+    runtime.add_shutdown_hook(journal.close)
+    print(f"✅ 原始行情紀錄：{capture_path}")
+    return journal.capture(callback)
+
+
+def start_logging(runtime: BotRuntime, config: dict):
+    """策略 log 改由背景執行緒輸出（含 [TICK] 頻率限制），關閉時最後停止、寫完剩餘紀錄"""
+    logging_cfg = config.get("logging", {})
+    setup_logging(
+        level=logging_cfg.get("level", "INFO"),
+        rate_limits=logging_cfg.get("rate_limits"),
+        fmt=logging_cfg.get("format", "text"),
+        filename=logging_cfg.get("file")
+    )
+    runtime.add_shutdown_hook(shutdown_logging)
+
+
+def build_live_runtime(config: dict, pin_cpu: int | None = None) -> BotRuntime:
+    import shioaji as sj
+    from shioaji.constant import QuoteType, QuoteVersion
+    from KlineInitializer import KlineInitializer
+
+    # ====== 登入 ======
+    simulation_mode = config.get("simulation", True)
+    api = sj.Shioaji(simulation=simulation_mode)
+    api.login(api_key=config["api_key"], secret_key=config["secret_key"])
+    print(f"✅ 登入成功｜模式：{'模擬' if simulation_mode else '真實'}")
+
+    # ====== 憑證啟用（真實模式） ======
+    if not simulation_mode and "ca_path" in config:
+        api.activate_ca(
+            ca_path=config["ca_path"],
+            ca_passwd=config["ca_passwd"],
+            person_id=config["person_id"]
+        )
+        print("✅ 憑證啟用成功")
+
+    # ====== 合約選擇（取最早交割月） ======
+    contracts = [c for c in api.Contracts.Futures.TMF if c.code[-2:] not in ["R1", "R2"]]
+    contract = min(contracts, key=lambda c: c.delivery_date)
+    print(f"✅ 使用合約：{contract.code}")
+
+    # ====== 初始化策略模組 ======
+    kline = KlineInitializer(api, contract)
+    kline.fetch_kline()
+    kline.compute_indicators()
+    indicators = kline.get_indicators()
+
+    kbars = list(kline.get_kbar().iter_rows(named=True))
+
+    tick_engine, tick_recorder, trade_logger, ingestor = build_engine(config, indicators)
+    # ✅ 以歷史 1 分 K 預熱多週期 K 棒，避免開盤後 15m 指標長時間未就緒
+    tick_engine.mtf_engine.warmup(kbars)
+
+    runtime = BotRuntime(ingestor, tick_recorder, trade_logger, pin_cpu=pin_cpu)
+
+    # ====== 訂閱 Tick 並註冊回調 ======
+    callback = with_capture(runtime, make_tick_callback(ingestor, indicators, tick_engine.latency), config, indicators, kbars)
+    api.on_tick_fop_v1()(callback)
+    api.quote.subscribe(contract, quote_type=QuoteType.Tick, version=QuoteVersion.v1)
+
+    runtime.add_shutdown_hook(lambda: api.quote.unsubscribe(contract, quote_type=QuoteType.Tick, version=QuoteVersion.v1))
+    runtime.add_shutdown_hook(api.logout)
+    runtime.add_shutdown_hook(lambda: print(f"📊 本次累計績效：{tick_engine.performance.metrics()}"))
+    add_latency_report(runtime, tick_engine, config)
+    add_metrics_server(runtime, tick_engine, config)
+    add_params_watcher(runtime, tick_engine)
+    return runtime
+
+
+def build_fake_runtime(config: dict, pin_cpu: int | None = None, count: int | None = None, interval: float = 0.2) -> BotRuntime:
+    """離線模式：不登入 shioaji，以 FakeQuoteSource 餵 tick"""
+    indicators = {}
+    tick_engine, tick_recorder, trade_logger, ingestor = build_engine(config, indicators)
+    runtime = BotRuntime(ingestor, tick_recorder, trade_logger, pin_cpu=pin_cpu)
+    runtime.quote_source = FakeQuoteSource(
+        with_capture(runtime, make_tick_callback(ingestor, indicators, tick_engine.latency), config),
+        interval=interval,
+        count=count,
+        on_finished=runtime.request_stop
     )
-    print("✅ 憑證啟用成功")
-
-# ====== 合約選擇（取最早交割月） ======
-contracts = [c for c in api.Contracts.Futures.TMF if c.code[-2:] not in ["R1", "R2"]]
-contract = min(contracts, key=lambda c: c.delivery_date)
-print(f"✅ 使用合約：{contract.code}")
-
-# ====== 初始化策略模組 ======
-kline = KlineInitializer(api, contract)
-kline.fetch_kline()
-kline.compute_indicators()
-indicators = kline.get_indicators()
-
-# ====== 初始化狀態與記錄模組 ======
-bias = "auto"
-state = StrategyState()
-tick_recorder = TickRecorder(filename="tick_record.csv")
-trade_logger = TradeLogger(tick_recorder=tick_recorder)
-tick_engine = TickEngine(state, bias, indicators, trade_logger, tick_recorder)
-
-# ====== 訂閱 Tick 並註冊回調 ======
-api.quote.subscribe(contract, quote_type=QuoteType.Tick, version=QuoteVersion.v1)
-
-@api.on_tick_fop_v1()
-def tick_callback(exchange, tick):
-    tick_dict = {
-        "price": tick.close,
-        "volume": tick.volume,
-        "bid": getattr(tick, "bid_price", None),
-        "ask": getattr(tick, "ask_price", None),
-        "timestamp": tick.datetime,
-        "rsi": indicators.get("rsi", 50),
-        "macd": indicators.get("macd", 0),
-        "macd_signal": indicators.get("macd_signal", 0),
-        "kd_k": indicators.get("kd_k", 50),
-        "kd_d": indicators.get("kd_d", 50)
+    runtime.add_shutdown_hook(lambda: print(f"📊 本次累計績效：{tick_engine.performance.metrics()}"))
+    add_latency_report(runtime, tick_engine, config)
+    add_metrics_server(runtime, tick_engine, config)
+    add_params_watcher(runtime, tick_engine)
+    print("✅ 離線模式｜使用假行情")
+    return runtime
+
+
+def apply_cli_overrides(config: dict, args):
+    if args.latency:
+        config.setdefault("latency", {})["enabled"] = True
+    if args.metrics_port is not None:
+        config.setdefault("metrics", {}).update(enabled=True, port=args.metrics_port)
+    if args.log_format is not None:
+        config.setdefault("logging", {})["format"] = args.log_format
+    if args.capture is not None:
+        config["capture_path"] = args.capture
+
+
+def replay_output_paths(config: dict, journal_path: str) -> dict:
+    """
+    重播的 trade log / tick record 路徑：預設放在 journal 旁並以 journal 檔名為前綴（feed.mfj → feed.replay_trades.csv），
+    不沿用實盤的 trade_log.csv / tick_record.csv；config["replay"] 可另外指定
+    """
+    replay_cfg = config.get("replay", {})
+    journal = Path(journal_path)
+    tick_format = config.get("tick_format", "csv")
+    suffix = {"csv": ".csv", "parquet": ".parquet"}.get(tick_format, ".arrows")
+    return {
+        "trade_log_path": str(replay_cfg.get("trade_log_path") or journal.with_name(f"{journal.stem}.replay_trades.csv")),
+        "tick_record_path": str(replay_cfg.get("tick_record_path") or journal.with_name(f"{journal.stem}.replay_ticks{suffix}")),
     }
-    tick_engine.on_tick(tick_dict)
 
-# ====== 主程式掛住等待 Tick ======
+
+def build_replay_runtime(config: dict, journal_path: str, speed: float | None = None, pin_cpu: int | None = None) -> BotRuntime:
+    """
+    重播模式：FeedJournal → 與實盤相同的 tick callback → TickIngestor → TickEngine
+    - 時間改用 SimulatedClock（依 tick 時間推進），交易紀錄的時間戳與冷卻判斷不受重播速度影響
+    - 佇列固定為 block，最快速重播時也不丟 tick，同一份 journal 每次產生相同的 trade log
+    - 以 capture 時記下的指標與歷史 K 棒預熱（read_warmup），起始狀態與實盤相同
+    """
+    config = dict(config, tick_queue=dict(config.get("tick_queue", {}), policy="block"), **replay_output_paths(config, journal_path))
+    # 每次重播從空檔開始（TradeLogger 為附加寫入），同一份 journal 的輸出才能逐位元比對
+    Path(config["trade_log_path"]).unlink(missing_ok=True)
+    indicators, kbars = read_warmup(journal_path)
+    tick_engine, tick_recorder, trade_logger, ingestor = build_engine(config, indicators, clock=SimulatedClock())
+    tick_engine.mtf_engine.warmup(kbars)
+    runtime = BotRuntime(ingestor, tick_recorder, trade_logger, pin_cpu=pin_cpu)
+    runtime.quote_source = FeedReplayer(
+        journal_path,
+        make_tick_callback(ingestor, indicators, tick_engine.latency, record_feed_lag=False),
+        speed=speed,
+        on_finished=runtime.request_stop
+    )
+    runtime.add_shutdown_hook(lambda: print(f"📊 重播 {runtime.quote_source.sent} 筆｜累計績效：{tick_engine.performance.metrics()}"))
+    add_latency_report(runtime, tick_engine, config)
+    add_metrics_server(runtime, tick_engine, config)
+    add_params_watcher(runtime, tick_engine)
+    print(f"✅ 重播模式｜{journal_path}｜速度：{f'{speed:g}x' if speed else '最快'}｜輸出：{config['trade_log_path']}、{config['tick_record_path']}")
+    return runtime
+
+
+def parse_speed(value: str) -> float | None:
+    """--speed：倍數（1、10、0.5...）或 max（不等待）"""
+    if value.lower() == "max":
+        return None
+    speed = float(value)
+    if speed < 0:
+        raise argparse.ArgumentTypeError("speed 不可為負數")
+    return speed or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="micro futures bot")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--fake", action="store_true", help="使用本地假行情離線執行")
+    parser.add_argument("--fake-count", type=int, default=None, help="假行情 tick 數（預設無限）")
+    parser.add_argument("--fake-interval", type=float, default=0.2, help="假行情間隔秒數")
+    parser.add_argument("--pin-cpu", type=int, default=None, help="將 strategy worker 綁定到指定 CPU 核心")
+    parser.add_argument("--latency", action="store_true", help="量測 tick 流水線各階段延遲，結束時輸出 p50/p99/max")
+    parser.add_argument("--metrics-port", type=int, default=None, help="啟動本機 Prometheus 監控端點（/metrics）於指定 port")
+    parser.add_argument("--log-format", choices=("text", "json"), default=None, help="策略 log 格式（預設 text）")
+    parser.add_argument("--capture", default=None, help="將原始 tick 記錄到 FeedJournal 檔案")
+    parser.add_argument("--replay", default=None, help="重播 FeedJournal 檔案（不登入 shioaji）")
+    parser.add_argument("--speed", type=parse_speed, default=None, help="重播速度倍數，或 max（預設 max）")
+    args = parser.parse_args()
+
+    if args.fake or args.replay:
+        try:
+            with open(args.config, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {}
+        apply_cli_overrides(config, args)
+        pin_cpu = args.pin_cpu if args.pin_cpu is not None else config.get("pin_cpu")
+        if args.replay:
+            runtime = build_replay_runtime(config, args.replay, args.speed, pin_cpu)
+        else:
+            runtime = build_fake_runtime(config, pin_cpu, args.fake_count, args.fake_interval)
+        start_logging(runtime, config)
+    else:
+        # ====== 讀取設定與登入 ======
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        apply_cli_overrides(config, args)
+        pin_cpu = args.pin_cpu if args.pin_cpu is not None else config.get("pin_cpu")
+        runtime = build_live_runtime(config, pin_cpu)
+        start_logging(runtime, config)
+
+    runtime.run()
+
+
 if __name__ == "__main__":
-    print("🚀 等待 Tick 資料中...")
-    while True:
-        pass  # 或 time.sleep(1)
+    main()
@@ -0,0 +1,201 @@
+# strategy_v4/models/RegressionCalibrator.py
+
+import csv
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from DecisionEngine_v2 import FEATURE_ORDER, extract_feature_matrix
+from ParamsStore import ParamsStore
+from TickRecorder import iter_tick_chunks
+
+# 從 tick 記錄檔讀取的欄位（其餘特徵缺少時以中性值代入）
+_TICK_COLUMNS = [
+    "timestamp", "price", "volume", "rsi", "macd", "macd_signal", "macd_hist", "kd_k", "kd_d",
+    "atr", "adx", "vwap", "ema5", "ema20", "bband_pos", "bband_width", "bband_upper", "bband_lower",
+    "rsi_5m", "rsi_15m",
+]
+# 計算 FEATURE_ORDER 全部特徵所需的欄位（bband_pos / 布林寬度由上下軌推得）；缺少時該特徵在訓練中會是常數
+_FEATURE_INPUTS = [
+    "price", "volume", "rsi", "macd", "macd_signal", "macd_hist", "kd_k", "kd_d", "atr", "adx",
+    "vwap", "ema5", "ema20", "bband_upper", "bband_lower", "rsi_5m", "rsi_15m",
+]
+_EXIT_ACTIONS = ("STOPLOSS", "LOCK_PROFIT", "EXIT", "TIME_EXIT", "TAKEPROFIT")
+
+
+def _frame_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """DataFrame → 數值欄位 dict；整欄皆空的欄位略過（由特徵預設值代入）"""
+    columns = {}
+    for name in df.columns:
+        if name == "timestamp":
+            continue
+        values = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        if not np.isnan(values).all():
+            columns[name] = values
+    return columns
+
+
+class RegressionCalibrator:
+    """
+    v4 權重校正（串流式最小平方）：
+    - 只累積充分統計量 XᵀX、Xᵀy、yᵀy、n，資料可逐段（chunk）餵入，數個月的 tick 記錄不需一次載入
+    - 特徵與 DecisionEngine_v2 相同（extract_feature_matrix，順序 FEATURE_ORDER），最後一欄為常數項
+    - tick 標籤：horizon 筆後價格漲跌方向（+1 / -1 / 0）；跨 chunk 的最後 horizon 筆暫存到下一段
+    - 交易標籤：TradeLogger 進出場配對後，以出場價相對進場價的漲跌方向為標籤（可加權）
+    - solve() 以 ridge 解正規方程；線性機率模型 E[y] ≈ tanh(z/2)，權重乘上 logit_scale（預設 2）換成 logistic 權重
+    - save_stats() / load_stats() 保存統計量，隔日只需餵入新一天的資料（可用 decay 讓舊資料權重遞減）
+    """
+
+    def __init__(self, horizon: int = 20, ridge: float = 1.0, logit_scale: float = 2.0, chunk_rows: int = 200_000):
+        self.horizon = horizon
+        self.ridge = ridge
+        self.logit_scale = logit_scale
+        self.chunk_rows = chunk_rows
+        k = len(FEATURE_ORDER) + 1
+        self.xtx = np.zeros((k, k), dtype=np.float64)
+        self.xty = np.zeros(k, dtype=np.float64)
+        self.yty = 0.0
+        self.n = 0.0
+        self.base_version = None
+        self._carry_x = None
+        self._carry_p = None
+
+    # ---------- 累積 ----------
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray | float | None = None):
+        """累積一段資料（X 為 FEATURE_ORDER 特徵，不含常數項）；含 NaN 的列略過"""
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        valid = np.isfinite(X).all(axis=1) & np.isfinite(y)
+        if not valid.all():
+            X, y = X[valid], y[valid]
+            if isinstance(sample_weight, np.ndarray):
+                sample_weight = sample_weight[valid]
+        if not len(y):
+            return 0
+        Xb = np.hstack([X, np.ones((len(X), 1))])
+        w = np.ones(len(y)) if sample_weight is None else np.broadcast_to(np.asarray(sample_weight, dtype=np.float64), y.shape)
+        Xw = Xb * w[:, None]
+        self.xtx += Xw.T @ Xb
+        self.xty += Xw.T @ y
+        self.yty += float(np.sum(w * y * y))
+        self.n += float(w.sum())
+        return len(y)
+
+    def _fit_tick_frame(self, df: pd.DataFrame) -> int:
+        columns = _frame_columns(df)
+        prices = columns["price"]
+        X = extract_feature_matrix(columns)
+        if self._carry_x is not None:
+            X = np.vstack([self._carry_x, X])
+            prices = np.concatenate([self._carry_p, prices])
+        m = len(prices) - self.horizon
+        if m <= 0:
+            self._carry_x, self._carry_p = X, prices
+            return 0
+        y = np.sign(prices[self.horizon:] - prices[:m])
+        self._carry_x, self._carry_p = X[m:], prices[m:]
+        return self.partial_fit(X[:m], y)
+
+    def fit_tick_file(self, path: str | Path) -> int:
+        """分段讀取 TickRecorder 記錄檔（CSV / Arrow / Parquet）並累積；檔案之間不跨檔配標籤"""
+        self._carry_x = self._carry_p = None
+        used = 0
+        for i, chunk in enumerate(iter_tick_chunks(path, self.chunk_rows, _TICK_COLUMNS)):
+            if i == 0:
+                missing = [c for c in _FEATURE_INPUTS if c not in chunk.columns or chunk[c].isna().all()]
+                if missing:
+                    print(f"⚠️ {Path(path).name} 缺少特徵欄位 {missing}，對應特徵將以中性值代入（與實盤推論不一致）")
+            used += self._fit_tick_frame(chunk)
+        self._carry_x = self._carry_p = None
+        print(f"✅ 已累積 tick 樣本：{Path(path).name}｜{used} 筆｜總計 {int(self.n)}")
+        return used
+
+    def fit_tick_files(self, paths: Iterable[str | Path]) -> int:
+        return sum(self.fit_tick_file(p) for p in paths)
+
+    def fit_trade_log(self, path: str | Path, weight: float = 1.0) -> int:
+        """以交易結果累積：進場列的指標為特徵，出場價相對進場價的方向為標籤"""
+        entries, exits = [], []
+        entry = None
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if row["action"] == "ENTER":
+                    entry = row
+                elif row["action"] in _EXIT_ACTIONS and entry:
+                    entries.append(entry)
+                    exits.append(row)
+                    entry = None
+        if not entries:
+            return 0
+        df = pd.DataFrame(entries)
+        df = df[[c for c in _TICK_COLUMNS if c in df.columns]]
+        moves = pd.to_numeric(pd.Series([r["price"] for r in exits]), errors="coerce").to_numpy() - \
+            pd.to_numeric(df["price"], errors="coerce").to_numpy()
+        used = self.partial_fit(extract_feature_matrix(_frame_columns(df)), np.sign(moves), weight)
+        print(f"✅ 已累積交易樣本：{Path(path).name}｜{used} 筆（權重 {weight}）")
+        return used
+
+    # ---------- 求解與發佈 ----------
+
+    def solve(self) -> Dict[str, float]:
+        """ridge 正規方程（常數項不懲罰），回傳 DecisionEngine_v2 可用的權重 dict（含 intercept）"""
+        if self.n == 0:
+            raise ValueError("尚未累積任何樣本")
+        penalty = np.full(len(self.xty), self.ridge)
+        penalty[-1] = 0.0
+        A = self.xtx + np.diag(penalty)
+        try:
+            beta = np.linalg.solve(A, self.xty)
+        except np.linalg.LinAlgError:
+            beta = np.linalg.lstsq(A, self.xty, rcond=None)[0]
+        beta = beta * self.logit_scale
+        weights = {name: round(float(b), 6) for name, b in zip(FEATURE_ORDER, beta[:-1])}
+        weights["intercept"] = round(float(beta[-1]), 6)
+        return weights
+
+    def r2(self) -> float:
+        """訓練資料上的 R²（由充分統計量直接計算）"""
+        penalty = np.full(len(self.xty), self.ridge)
+        penalty[-1] = 0.0
+        beta = np.linalg.lstsq(self.xtx + np.diag(penalty), self.xty, rcond=None)[0]
+        sse = self.yty - 2 * beta @ self.xty + beta @ self.xtx @ beta
+        mean = self.xty[-1] / self.n
+        sst = self.yty - self.n * mean * mean
+        return float(1 - sse / sst) if sst > 0 else 0.0
+
+    def publish(self, params_store: ParamsStore, version: str | None = None, stats_path: str | Path | None = None) -> Dict[str, float]:
+        """求解並寫入 ParamsStore.update；stats_path 有給時一併保存統計量供下次 warm start"""
+        version = version or f"calib-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        weights = self.solve()
+        params_store.update(version, weights)
+        if stats_path:
+            self.save_stats(stats_path, version)
+        print(f"✅ 權重已寫入 ParamsStore：{version}｜樣本 {int(self.n)}")
+        return weights
+
+    def save_stats(self, path: str | Path, version: str | None = None):
+        np.savez(
+            path, xtx=self.xtx, xty=self.xty, yty=self.yty, n=self.n,
+            feature_order=np.array(FEATURE_ORDER), horizon=self.horizon,
+            version=np.array(version or self.base_version or ""),
+        )
+
+    @classmethod
+    def load_stats(cls, path: str | Path, decay: float = 1.0, **kwargs) -> "RegressionCalibrator":
+        """從上一版的統計量接續（decay < 1 時舊資料按比例降權）"""
+        data = np.load(path)
+        if list(data["feature_order"]) != FEATURE_ORDER:
+            raise ValueError("統計量的特徵順序與目前 FEATURE_ORDER 不同，無法接續")
+        kwargs.setdefault("horizon", int(data["horizon"]))
+        calibrator = cls(**kwargs)
+        calibrator.xtx = data["xtx"] * decay
+        calibrator.xty = data["xty"] * decay
+        calibrator.yty = float(data["yty"]) * decay
+        calibrator.n = float(data["n"]) * decay
+        calibrator.base_version = str(data["version"]) or None
+        return calibrator
+
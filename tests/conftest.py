@@ -0,0 +1,29 @@
+# strategy_v4/tests/conftest.py
+
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# 模組以扁平 import 互相引用（與 main.py 執行時相同），測試時把各目錄加入 sys.path
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("", "engines", "io", "backtest", "config", "model", "pipeline"):
+    path = str(ROOT / sub)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def make_ticks():
+    """隨機漫步 tick（dict：price、volume、timestamp），同一 seed 產生相同序列"""
+    def _make(n: int, seed: int = 1, start: datetime = datetime(2025, 11, 13, 9, 0, 0)):
+        rng = random.Random(seed)
+        price, ts, ticks = 22000.0, start, []
+        for _ in range(n):
+            price += rng.choice([-8, -4, -2, -1, 0, 1, 2, 4, 8])
+            ts += timedelta(seconds=1)
+            ticks.append({"price": price, "volume": rng.randint(1, 20), "timestamp": ts})
+        return ticks
+    return _make
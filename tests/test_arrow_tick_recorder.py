@@ -0,0 +1,35 @@
+# strategy_v4/tests/test_arrow_tick_recorder.py
+
+import pandas as pd
+import pytest
+
+from ArrowTickRecorder import TICK_SCHEMA, ArrowTickRecorder
+from Clock import SimulatedClock
+from StrategyState import StrategyState
+from TickEngine import TickEngine
+from TickRecorder import TICK_FIELDS, TickRecorder, load_ticks
+from TradeLogger import TradeLogger
+
+
+def test_schema_follows_tick_fields():
+    assert TICK_SCHEMA.names == TICK_FIELDS
+
+
+@pytest.mark.parametrize("suffix", [".arrows", ".parquet"])
+def test_arrow_recording_matches_csv(tmp_path, make_ticks, suffix):
+    ticks = make_ticks(3000, seed=2)
+    frames = []
+    for recorder_cls, name in ((TickRecorder, "ticks.csv"), (ArrowTickRecorder, "ticks" + suffix)):
+        clock = SimulatedClock()
+        recorder = recorder_cls(tmp_path / name, clock=clock)
+        trade_logger = TradeLogger(str(tmp_path / f"trades_{name}.csv"), tick_recorder=recorder, clock=clock)
+        engine = TickEngine(StrategyState(clock=clock), "auto", {}, trade_logger, recorder, clock=clock, verbose=False)
+        for tick in ticks:
+            engine.on_tick(dict(tick))
+        recorder.close()
+        frames.append(load_ticks(tmp_path / name, backend="pandas"))
+    csv_frame, arrow_frame = frames
+    assert list(arrow_frame.columns) == TICK_FIELDS and len(arrow_frame) == len(ticks)
+    assert arrow_frame["trade_id"].fillna("").tolist() == csv_frame["trade_id"].fillna("").tolist()
+    for name in ("price", "rsi", "entry_score", "tick_since_entry"):
+        pd.testing.assert_series_equal(arrow_frame[name], csv_frame[name], check_dtype=False, check_names=False)
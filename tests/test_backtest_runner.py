@@ -0,0 +1,102 @@
+# strategy_v4/tests/test_backtest_runner.py
+
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from BacktestDataLoader import BacktestDataLoader
+from BacktestRunner import BacktestRunner
+from FeatureMatrix import FEATURE_COLUMNS, build_feature_matrix
+from TickRecord import TickRecord
+
+RUNNER_VARIANTS = [
+    ("auto", {}, {}),
+    ("auto", {"cooldown_seconds": 0, "hard_stoploss": 12.0, "max_ticks_hold": 30}, {"adx_consolidation": 10, "bull_score_min": 2}),
+    ("bullish", {"hard_time_seconds": 40}, {"momentum_abs_min": 1}),
+    ("bearish", {}, {"bear_score_max": 0, "adx_consolidation": 0}),
+]
+
+
+def _market(n: int, seed: int, start: datetime, gap_every: int = 0):
+    """含半點、非整數量、跨時段（盤後、夜盤、隔日）跳空的行情"""
+    rng = random.Random(seed)
+    price, ts = 22000.0, start
+    timestamps, prices, volumes = [], [], []
+    for i in range(n):
+        price += rng.choice([-15, -8, -4, -2, -1, 0, 1, 2, 4, 8, 12]) + rng.choice([0.0, 0.5])
+        if gap_every and i % gap_every == gap_every - 1:
+            ts += timedelta(minutes=rng.choice([30, 95, 600, 1300]))
+        else:
+            ts += timedelta(seconds=rng.choice([1, 2, 5]))
+        timestamps.append(ts)
+        prices.append(price)
+        volumes.append(rng.randint(1, 12) * 1.5)
+    return timestamps, prices, volumes
+
+
+@pytest.mark.parametrize("start, gap_every", [
+    (datetime(2025, 11, 13, 8, 45), 0),
+    (datetime(2025, 11, 13, 13, 20), 1500),
+    (datetime(2025, 11, 13, 5, 30), 700),   # 第一筆在盤外
+])
+def test_vectorized_matrix_matches_incremental_engines(start, gap_every):
+    # 10000 筆跨過 _RollingSum 每 4096 次的重算點
+    timestamps, prices, volumes = _market(10000, 5, start, gap_every)
+    expected = build_feature_matrix(timestamps, prices, volumes, vectorized=False)
+    actual = build_feature_matrix(timestamps, prices, volumes)
+    for j, name in enumerate(FEATURE_COLUMNS):
+        np.testing.assert_array_equal(actual[:, j], expected[:, j], err_msg=name)
+
+
+def test_vectorized_matrix_accepts_datetime64_and_strings():
+    timestamps, prices, volumes = _market(300, 6, datetime(2025, 11, 13, 13, 40), 100)
+    expected = build_feature_matrix(timestamps, prices, volumes, vectorized=False)
+    stamps64 = np.array(timestamps, dtype="datetime64[ns]")
+    strings = [ts.strftime("%Y/%m/%d %H:%M:%S") for ts in timestamps]
+    np.testing.assert_array_equal(build_feature_matrix(stamps64, prices, volumes), expected)
+    np.testing.assert_array_equal(build_feature_matrix(strings, prices, volumes), expected)
+
+
+@pytest.mark.parametrize("market_bias, state_params, decision_params", RUNNER_VARIANTS)
+def test_event_driven_run_matches_tick_engine(make_ticks, market_bias, state_params, decision_params):
+    ticks = make_ticks(8000, seed=4)
+    runs = [
+        BacktestRunner(market_bias=market_bias, state_params=state_params, decision_params=decision_params,
+                       event_driven=event_driven).run(ticks)
+        for event_driven in (False, True)
+    ]
+    assert runs[0].trade_rows
+    assert runs[1].trade_rows == runs[0].trade_rows
+    assert runs[1].metrics == runs[0].metrics
+    assert runs[1].tick_count == runs[0].tick_count == len(ticks)
+
+
+def test_event_driven_run_matches_tick_engine_on_batch():
+    timestamps, prices, volumes = _market(6000, 7, datetime(2025, 11, 13, 12, 30), 900)
+    df = pd.DataFrame({"timestamp": timestamps, "close": prices, "volume": volumes})
+    batch = BacktestDataLoader(df=df).to_batch()
+    runner_args = {"state_params": {"cooldown_seconds": 5}, "decision_params": {"adx_consolidation": 10}}
+    expected = BacktestRunner(event_driven=False, **runner_args).run(batch)
+    actual = BacktestRunner(**runner_args).run(batch)
+    assert expected.trade_rows
+    assert actual.trade_rows == expected.trade_rows
+
+
+def test_loader_tick_matches_iter_ticks():
+    timestamps, prices, volumes = _market(50, 8, datetime(2025, 11, 13, 9, 0))
+    loader = BacktestDataLoader(df=pd.DataFrame({"timestamp": timestamps, "close": prices, "volume": volumes}))
+    ticks = list(loader.iter_ticks())
+    assert [loader.tick(i) for i in (0, 17, 49)] == [ticks[0], ticks[17], ticks[49]]
+    assert loader.tick(3, ["price"]) == {"price": prices[3], "timestamp": timestamps[3]}
+
+
+@pytest.mark.parametrize("fields", [None, ["price", "volume"], ["price"]])
+def test_iter_records_match_iter_ticks(fields):
+    timestamps, prices, volumes = _market(50, 9, datetime(2025, 11, 13, 9, 0))
+    frame = pd.DataFrame({"timestamp": timestamps, "close": prices, "volume": volumes, "high": prices, "rsi": 55.0})
+    batch = BacktestDataLoader(df=frame).to_batch()
+    records = [r.to_dict() for r in batch.iter_records(fields)]
+    assert records == [TickRecord.from_dict(t).to_dict() for t in batch.iter_ticks(fields)]
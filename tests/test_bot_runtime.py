@@ -0,0 +1,56 @@
+# strategy_v4/tests/test_bot_runtime.py
+
+import threading
+import time
+
+from FeedJournal import read_journal
+from main import build_fake_runtime
+
+
+def _config(tmp_path) -> dict:
+    return {
+        "trade_log_path": str(tmp_path / "trades.csv"),
+        "tick_record_path": str(tmp_path / "ticks.csv"),
+        "capture_path": str(tmp_path / "feed.mfj"),
+    }
+
+
+def _run_in_thread(runtime) -> threading.Thread:
+    # 不在主執行緒執行：run() 不會改動 pytest 的 signal handler
+    thread = threading.Thread(target=runtime.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_fake_runtime_runs_to_completion(tmp_path):
+    n = 2000
+    runtime = build_fake_runtime(_config(tmp_path), count=n, interval=0)
+    calls = []
+    runtime.add_shutdown_hook(lambda: calls.append(("first", runtime.ingestor.processed)))
+    runtime.add_shutdown_hook(lambda: 1 / 0)  # 失敗的 hook 不影響後面的 hook
+    runtime.add_shutdown_hook(lambda: calls.append(("last", runtime.ingestor.processed)))
+
+    thread = _run_in_thread(runtime)
+    thread.join(30)
+    assert not thread.is_alive()
+    # hook 依註冊順序執行，且在佇列清空之後
+    assert calls == [("first", n), ("last", n)]
+    stats = runtime.ingestor.stats()
+    assert stats["received"] == stats["processed"] == n and stats["dropped"] == 0 and stats["errors"] == 0
+    assert sum(1 for _ in read_journal(tmp_path / "feed.mfj")) == n
+    # TickRecorder 已在關閉時寫出全部 tick（含表頭）
+    assert (tmp_path / "ticks.csv").read_text(encoding="utf-8").count("\n") == n + 1
+
+
+def test_request_stop_ends_an_endless_feed(tmp_path):
+    runtime = build_fake_runtime(_config(tmp_path), count=None, interval=0.001)
+    thread = _run_in_thread(runtime)
+    deadline = time.monotonic() + 10
+    while runtime.ingestor.processed < 50:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    runtime.request_stop()
+    thread.join(10)
+    assert not thread.is_alive()
+    stats = runtime.ingestor.stats()
+    assert stats["processed"] == stats["received"] >= 50 and stats["depth"] == 0
@@ -0,0 +1,91 @@
+# strategy_v4/tests/test_decision_batch.py
+
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from DecisionEngine import DecisionEngine
+from FeatureMatrix import FEATURE_COLUMNS, build_feature_matrix, decode_feature_row
+from TickPatternTracker import TickPatternTracker
+from TickRecord import TickRecord
+
+VARIANTS = [
+    ("auto", {}),
+    ("auto", {"adx_consolidation": 10, "bull_score_min": 2, "neutral_score_abs": 2, "atr_low": 1}),
+    ("bullish", {"momentum_abs_min": 1}),
+    ("bearish", {"bear_score_max": 0, "adx_consolidation": 0}),
+]
+
+
+@pytest.fixture(scope="module")
+def market():
+    """跳動較大（含半點）的隨機行情與其指標矩陣，讓各條件分支都會出現"""
+    rng = random.Random(3)
+    price, ts = 22000.0, datetime(2025, 11, 13, 8, 45, 0)
+    timestamps, prices, volumes = [], [], []
+    for _ in range(20000):
+        price += rng.choice([-15, -8, -4, -2, -1, 0, 1, 2, 4, 8, 12]) + rng.choice([0.0, 0.5])
+        ts += timedelta(seconds=rng.choice([1, 2, 5]))
+        timestamps.append(ts)
+        prices.append(price)
+        volumes.append(float(rng.randint(1, 12)))
+    return prices, volumes, build_feature_matrix(timestamps, prices, volumes)
+
+
+def _per_tick(engine: DecisionEngine, prices, volumes, matrix):
+    bias, score, enter, momentum, direction = [], [], [], [], []
+    for i in range(len(prices)):
+        engine.tick_tracker.update(prices[i])
+        tick = TickRecord(price=prices[i], volume=volumes[i], is_ready=i + 1 >= 30)
+        tick.update(decode_feature_row(matrix[i].tolist()))
+        bias.append(DecisionEngine.BIAS_CODES[engine.detect_market_bias(tick)])
+        score.append(engine.score_entry(tick))
+        enter.append(engine.should_enter(tick))
+        # 盤整時 entry_strength_score 提早回傳 -99、不寫 tick.momentum，改直接讀 tracker
+        momentum.append(engine.tick_tracker.get_momentum())
+        direction.append(engine.tick_tracker.get_direction_score())
+    return bias, score, enter, momentum, direction
+
+
+@pytest.mark.parametrize("market_bias, overrides", VARIANTS)
+def test_batch_matches_per_tick(market, market_bias, overrides):
+    prices, volumes, matrix = market
+    engine = DecisionEngine(market_bias, {}, TickPatternTracker())
+    engine.cfg.update(overrides)
+    batch = engine.evaluate_batch(matrix, volume=volumes)
+    bias, score, enter, momentum, direction = _per_tick(engine, prices, volumes, matrix)
+
+    np.testing.assert_array_equal(batch["bias"], bias)
+    np.testing.assert_array_equal(batch["entry_score"], score)
+    np.testing.assert_array_equal(batch["enter"], enter)
+    np.testing.assert_array_equal(batch["momentum"], momentum)
+    np.testing.assert_array_equal(batch["direction_score"], direction)
+    assert batch["enter"].any()
+
+
+def test_batch_accepts_column_dict(market):
+    prices, volumes, matrix = market
+    engine = DecisionEngine("auto", {}, TickPatternTracker())
+    columns = {name: matrix[:, i] for i, name in enumerate(FEATURE_COLUMNS)}
+    from_matrix = engine.evaluate_batch(matrix, volume=volumes)
+    from_columns = engine.evaluate_batch(dict(columns, volume=volumes))
+    for key, values in from_matrix.items():
+        np.testing.assert_array_equal(from_columns[key], values)
+
+
+def test_dict_ticks_match_records_and_receive_outputs(market):
+    prices, volumes, matrix = market
+    engines = [DecisionEngine("auto", {}, TickPatternTracker()) for _ in range(2)]
+    for i in range(3000):
+        values = dict(decode_feature_row(matrix[i].tolist()), price=prices[i], volume=volumes[i], is_ready=i + 1 >= 30)
+        record, raw = TickRecord.from_dict(values), dict(values)
+        results = []
+        for engine, tick in zip(engines, (record, raw)):
+            engine.tick_tracker.update(prices[i])
+            results.append((engine.detect_market_bias(tick), engine.score_entry(tick), engine.should_enter(tick)))
+        assert results[1] == results[0]
+        # dict 呼叫端與舊版相同，就地收到 bias / momentum / direction_score
+        for name in ("bias", "momentum", "direction_score"):
+            assert raw.get(name) == record.get(name)
@@ -0,0 +1,70 @@
+# strategy_v4/tests/test_decision_engine_v2.py
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+from DecisionEngine_v2 import DecisionEngine_v2
+from FeatureMatrix import build_feature_matrix, decode_feature_row
+from ParamsStore import ParamsStore
+from StrategyLogging import get_logger
+from TickRecord import TickRecord
+
+
+def _store(tmp_path, version="v-test-1"):
+    store = ParamsStore(tmp_path / "params.json")
+    store.update(version, {"rsi": 1.5, "macd": 0.3, "vwap": 0.05, "intercept": 0.1})
+    return store
+
+
+def test_evaluate_tick_matches_evaluate_ticks(tmp_path, make_ticks):
+    ticks = make_ticks(5000, seed=5, start=datetime(2025, 11, 13, 8, 45, 0))
+    prices = [t["price"] for t in ticks]
+    volumes = [t["volume"] for t in ticks]
+    matrix = build_feature_matrix([t["timestamp"] for t in ticks], prices, volumes)
+    engine = DecisionEngine_v2(_store(tmp_path))
+    batch = engine.evaluate_ticks(matrix, volume=volumes)
+    for i in range(len(prices)):
+        tick = TickRecord(price=prices[i], volume=volumes[i])
+        tick.update(decode_feature_row(matrix[i].tolist()))
+        out = engine.evaluate_tick(tick)
+        assert abs(out["bias_prob"] - batch["bias_prob"][i]) < 1e-12, i
+        assert engine.BIAS_CODES[out["bias"]] == batch["bias"][i], i
+    assert (batch["bias"] == 1).any() and (batch["bias"] == -1).any()
+
+
+def test_evaluate_into_writes_integer_entry_score(tmp_path, make_ticks):
+    ticks = make_ticks(300, seed=6)
+    matrix = build_feature_matrix([t["timestamp"] for t in ticks], [t["price"] for t in ticks], [t["volume"] for t in ticks])
+    engine = DecisionEngine_v2(_store(tmp_path))
+    for row, raw in zip(matrix, ticks):
+        tick = TickRecord(price=raw["price"], volume=raw["volume"])
+        tick.update(decode_feature_row(row.tolist()))
+        engine.evaluate_into(tick, "long")
+        expected = engine.evaluate_tick(tick, "long")
+        assert isinstance(tick.entry_score, int) and -10 <= tick.entry_score <= 10
+        assert tick.entry_score == expected["entry_score"] == round(tick.entry_score_v2 * engine.ENTRY_SCORE_SCALE)
+        assert tick.exit_score_v2 == -tick.entry_score_v2
+
+
+def test_watcher_swaps_weights(tmp_path):
+    store = _store(tmp_path)
+    engine = DecisionEngine_v2(store)
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    get_logger("decision_v2").addHandler(handler)
+    engine.start_watcher(interval=0.05)
+    try:
+        ParamsStore(store.path).update("v-test-2", {"rsi": -1.5})
+        deadline = time.monotonic() + 5
+        while engine.version != "v-test-2" and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        engine.stop_watcher()
+        get_logger("decision_v2").removeHandler(handler)
+    assert engine.version == "v-test-2"
+    # 換版訊息經由 StrategyLogging 的 decision_v2 logger 輸出（watcher 執行緒不直接 print）
+    assert [r.getMessage() for r in records] == ["✅ 權重已更新：v-test-1 → v-test-2"]
+    assert not any(t.name == "params-watcher" and t.is_alive() for t in threading.enumerate())
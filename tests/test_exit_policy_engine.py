@@ -0,0 +1,115 @@
+# strategy_v4/tests/test_exit_policy_engine.py
+
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Clock import SimulatedClock
+from ExitPolicyEngine import DEFAULT_POLICY, END_RULE, EXIT_RULES, ExitPolicyEngine
+from ExitStrategySimulator import ExitStrategySimulator
+from StrategyState import StrategyState
+from TickEngine import TickEngine
+from TickRecorder import TickRecorder
+from TradeLogger import TradeLogger
+
+GRID = {
+    "hard_stop": [20, 40], "atr_stop": [None, 2.0], "take_profit": [None, 25, 50],
+    "trail_trigger": [None, 15], "trail_giveback": [8], "momentum_exit": [None, -6],
+    "max_ticks": [60, 200], "max_seconds": [None, 120],
+}
+
+
+def _simulate(path: pd.DataFrame, entry: float, direction: str, policy: dict):
+    """逐 tick 套用出場規則（向量化結果的對照）"""
+    p = {**DEFAULT_POLICY, **policy}
+    sign = -1 if direction == "short" else 1
+    best = float("-inf")
+    for j, row in enumerate(path.itertuples()):
+        profit = (row.price - entry) * sign
+        best = max(best, profit)
+        held = (row.timestamp - path["timestamp"].iloc[0]).total_seconds()
+        checks = [
+            p["hard_stop"] is not None and profit <= -p["hard_stop"],
+            p["atr_stop"] is not None and row.atr > 0 and profit <= -row.atr * p["atr_stop"],
+            p["take_profit"] is not None and profit >= p["take_profit"],
+            p["trail_trigger"] is not None and p["trail_giveback"] is not None
+            and best >= p["trail_trigger"] and profit <= best - p["trail_giveback"],
+            p["momentum_exit"] is not None and row.momentum * sign <= p["momentum_exit"],
+            (p["max_ticks"] is not None and j + 1 >= p["max_ticks"]) or (p["max_seconds"] is not None and held >= p["max_seconds"]),
+        ]
+        if any(checks):
+            return profit, checks.index(True)
+    return profit, END_RULE
+
+
+@pytest.fixture(scope="module")
+def paths():
+    rng = random.Random(11)
+    paths, entry_prices, directions = [], [], []
+    base = pd.Timestamp("2025-11-13 09:00:00")
+    for _ in range(200):
+        price, t, rows = 22000.0, base, []
+        for _ in range(rng.randint(1, 300)):
+            price += rng.choice([-6, -3, -1, 0, 1, 3, 6])
+            t += pd.Timedelta(seconds=rng.choice([0.2, 0.5, 1, 3]))
+            rows.append({"timestamp": t, "price": price, "momentum": rng.uniform(-8, 8), "atr": rng.choice([0, 5, 10, 15])})
+        paths.append(pd.DataFrame(rows))
+        entry_prices.append(22000.0)
+        directions.append(rng.choice(["long", "short"]))
+    return paths, entry_prices, directions
+
+
+def test_evaluate_matches_tick_by_tick_simulation(paths):
+    frames, entry_prices, directions = paths
+    engine = ExitPolicyEngine.from_paths(frames, entry_prices, directions)
+    result = engine.evaluate(GRID)
+    assert len(result.policies) == 192
+    for i in random.Random(2).sample(range(len(result.policies)), 10):
+        for t in range(len(frames)):
+            profit, rule = _simulate(frames[t], entry_prices[t], directions[t], result.policies[i])
+            assert result.pnl[i, t] == pytest.approx(profit - engine.fee, abs=1e-9), (i, t)
+            assert result.exit_rule[i, t] == rule, (i, t)
+
+
+def test_missing_prices_carry_the_previous_price():
+    price = np.array([[100.0, np.nan, 99.0, 98.0], [np.nan, 101.0, 103.0, np.nan]])
+    engine = ExitPolicyEngine(price, [100.0, 100.0], ["long", "long"], lengths=[4, 3], fee_per_trade=0.0)
+    result = engine.evaluate({"hard_stop": [1.5], "take_profit": [2.5], "max_ticks": [None], "max_seconds": [None]})
+    # 第 1 筆缺價沿用 100；第二筆交易開頭缺價視為進場價
+    assert result.exit_index.tolist() == [[3, 2]]
+    assert [EXIT_RULES[r] for r in result.exit_rule[0]] == ["hard_stop", "take_profit"]
+    assert result.pnl.tolist() == [[-2.0, 3.0]]
+    summary = result.summary().iloc[0]
+    assert (summary["total_pnl"], summary["avg_pnl"], summary["win_rate"]) == (1.0, 0.5, 50.0)
+
+
+def test_default_lengths_keep_interior_gaps():
+    price = np.array([[100.0, np.nan, 104.0, np.nan]])
+    engine = ExitPolicyEngine(price, [100.0], ["short"], fee_per_trade=0.0)
+    assert engine.lengths.tolist() == [3]
+    result = engine.evaluate([{"hard_stop": None, "max_ticks": None, "max_seconds": None}])
+    assert result.exit_rule.tolist() == [[END_RULE]] and result.pnl.tolist() == [[-4.0]]
+
+
+def test_from_simulator_uses_recorded_trade_ids(tmp_path, make_ticks):
+    clock = SimulatedClock()
+    recorder = TickRecorder(tmp_path / "ticks.csv", clock=clock)
+    trade_logger = TradeLogger(str(tmp_path / "trades.csv"), tick_recorder=recorder, clock=clock)
+    engine = TickEngine(StrategyState(clock=clock), "auto", {}, trade_logger, recorder, clock=clock, verbose=False)
+    for tick in make_ticks(20000):
+        engine.on_tick(tick)
+    recorder.close()
+
+    trades = pd.read_csv(tmp_path / "trades.csv")
+    exits = trades[trades["action"] != "ENTER"]
+    assert len(exits) > 10
+
+    simulator = ExitStrategySimulator(str(tmp_path / "ticks.csv"), str(tmp_path / "trades.csv"))
+    policy_engine = ExitPolicyEngine.from_simulator(simulator)
+    # 每筆平倉的交易都有路徑：進場後第一筆到出場那筆，長度即出場時的 tick_since_entry
+    assert len(policy_engine.trade_ids) == len(exits)
+    assert policy_engine.lengths.tolist() == exits["tick_since_entry"].tolist()
+    result = policy_engine.evaluate([{}])
+    assert np.isfinite(result.pnl).all()
@@ -0,0 +1,153 @@
+# strategy_v4/tests/test_exit_strategy_simulator.py
+
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ExitStrategySimulator import EXIT_ACTIONS, ExitStrategySimulator
+
+FMT = "%Y-%m-%d %H:%M:%S"
+
+
+def _baseline_min_momentum(sim: ExitStrategySimulator, momentum_threshold, direction_score_filter):
+    """逐 trade_id groupby 的原始寫法（向量化結果的對照）"""
+    results, triggered_ids = [], []
+    for trade_id, group in sim.tick_df.groupby("trade_id"):
+        rows = sim.trade_df[sim.trade_df["trade_id"] == trade_id]
+        if rows.empty:
+            continue
+        entry_price, direction = rows.iloc[0]["price"], rows.iloc[0]["direction"]
+        exit_row = rows[rows["action"].isin(EXIT_ACTIONS)]
+        if exit_row.empty:
+            continue
+        exit_time = pd.to_datetime(exit_row.iloc[0]["timestamp"])
+        group = group.copy()
+        try:
+            group["momentum"] = group["momentum"].astype(float)
+            group["direction_score"] = group["direction_score"].astype(int)
+            group["price"] = group["price"].astype(float)
+        except Exception:
+            continue
+        if group["momentum"].isna().all():
+            continue
+        min_tick = group.loc[group["momentum"].idxmin()]
+        if pd.to_datetime(min_tick["timestamp"]) >= exit_time:
+            continue
+        exit_price = exit_row.iloc[0]["price"]
+        if min_tick["momentum"] <= momentum_threshold and \
+                (direction_score_filter is None or min_tick["direction_score"] == direction_score_filter):
+            exit_price = min_tick["price"]
+            triggered_ids.append(trade_id)
+        results.append(exit_price - entry_price if direction == "long" else entry_price - exit_price)
+    return results, triggered_ids
+
+
+def _baseline_scan(sim: ExitStrategySimulator, momentum_threshold, window_seconds):
+    ticks = sim.tick_df.assign(timestamp=pd.to_datetime(sim.tick_df["timestamp"]))
+    triggered = []
+    for _, row in sim.trade_df.iterrows():
+        ts = pd.to_datetime(row["timestamp"])
+        window = pd.Timedelta(seconds=window_seconds)
+        nearby = ticks[(ticks["timestamp"] >= ts - window) & (ticks["timestamp"] <= ts + window)]
+        wanted = 1 if "long" in row["trade_id"] else -1
+        if not nearby[(nearby["momentum"] <= momentum_threshold) & (nearby["direction_score"] == wanted)].empty:
+            triggered.append(row["trade_id"])
+    return triggered
+
+
+def _write_market(tmp_path, seed: int, n_trades: int = 150):
+    """
+    隨機交易與 tick：
+    - 交易之間夾著沒有 trade_id 的 tick；部分交易沒有出場列、部分 tick 的 trade_id 不在 trade log
+    - momentum 偶有 NaN（也有整筆皆 NaN 的交易）；部分交易在出場後仍有同 trade_id 的 tick（最弱 tick 可能落在出場時間之後）
+    """
+    rng = random.Random(seed)
+    t = pd.Timestamp("2025-11-13 09:00:00")
+    price = 22000.0
+    ticks, trades = [], []
+
+    def tick(trade_id, momentum):
+        ticks.append({"timestamp": t.strftime(FMT), "trade_id": trade_id, "price": price, "momentum": momentum,
+                      "direction_score": rng.choice([-1, 0, 1])})
+
+    for _ in range(n_trades):
+        for _ in range(rng.randint(0, 4)):
+            t += pd.Timedelta(seconds=1)
+            tick(None, rng.randint(-5, 3))
+        direction = rng.choice(["long", "short"])
+        t += pd.Timedelta(seconds=1)
+        trade_id = f"{t.strftime(FMT)}_{direction}_{price:.1f}"
+        if rng.random() > 0.05:
+            trades.append({"timestamp": t.strftime(FMT), "action": "ENTER", "direction": direction, "price": price,
+                           "trade_id": trade_id})
+        all_nan = rng.random() < 0.05
+        for _ in range(rng.randint(1, 15)):
+            price += rng.choice([-4, -2, -1, 0, 1, 2, 4])
+            tick(trade_id, np.nan if all_nan or rng.random() < 0.1 else rng.randint(-6, 3))
+            t += pd.Timedelta(seconds=rng.choice([0, 1, 2]))
+        if rng.random() > 0.1:
+            trades.append({"timestamp": t.strftime(FMT), "action": rng.choice(EXIT_ACTIONS), "direction": direction,
+                           "price": price, "trade_id": trade_id})
+        if rng.random() < 0.2:
+            t += pd.Timedelta(seconds=1)
+            tick(trade_id, -9)
+    tick_file, trade_file = tmp_path / f"ticks_{seed}.csv", tmp_path / f"trades_{seed}.csv"
+    pd.DataFrame(ticks).to_csv(tick_file, index=False)
+    pd.DataFrame(trades).to_csv(trade_file, index=False)
+    return ExitStrategySimulator(tick_file, trade_file)
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_min_momentum_matches_groupby_baseline(tmp_path, seed):
+    sim = _write_market(tmp_path, seed)
+    for threshold in (-2, -5):
+        for score in (-1, None):
+            results, triggered_ids = _baseline_min_momentum(sim, threshold, score)
+            got = sim.simulate_exit_by_min_momentum(threshold, score)
+            assert got["triggered_ids"] == triggered_ids
+            assert got["avg_pnl"] == pytest.approx(np.mean(results))
+            assert got["win_rate"] == pytest.approx(sum(r > 0 for r in results) / len(results) * 100)
+
+
+def test_trade_index_skips_nan_and_late_minimums(tmp_path):
+    sim = _write_market(tmp_path, 4)
+    index = sim._build_trade_index()
+    exits = sim.trade_df[sim.trade_df["action"].isin(EXIT_ACTIONS)].set_index("trade_id")
+    assert index["min_momentum"].notna().all()
+    assert (index["min_time"] < pd.to_datetime(exits.loc[index["trade_id"], "timestamp"]).to_numpy()).all()
+    # 整筆 momentum 皆 NaN、或最弱 tick 在出場之後的交易都不在索引內
+    momentum = sim.tick_df.groupby("trade_id")["momentum"]
+    all_nan = set(momentum.apply(lambda m: m.isna().all()).loc[lambda s: s].index)
+    assert all_nan and not all_nan & set(index["trade_id"])
+    late = set(sim.tick_df.loc[sim.tick_df["momentum"] == -9, "trade_id"]) & set(exits.index)
+    assert late and not late & set(index["trade_id"])
+    assert sim.tick_df["trade_id"].isna().any()
+    assert sim.ticks_for(index["trade_id"][0])["trade_id"].eq(index["trade_id"][0]).all()
+
+
+@pytest.mark.parametrize("window_seconds", [0, 3])
+def test_scan_trade_log_matches_baseline(tmp_path, window_seconds):
+    sim = _write_market(tmp_path, 5)
+    for threshold in (-1, -4):
+        assert sim.scan_trade_log_by_momentum(threshold, window_seconds) == _baseline_scan(sim, threshold, window_seconds)
+
+
+def test_scan_window_edges_are_inclusive(tmp_path):
+    ticks = pd.DataFrame({
+        "timestamp": ["2025-11-13 09:00:07", "2025-11-13 09:00:10", "2025-11-13 09:00:13", "2025-11-13 09:00:14"],
+        "trade_id": [None, None, None, None], "price": [1.0] * 4, "momentum": [-5, 0, -5, -5],
+        "direction_score": [1, 1, -1, 1],
+    })
+    trades = pd.DataFrame({
+        "timestamp": ["2025-11-13 09:00:10", "2025-11-13 09:00:10"], "action": ["ENTER", "ENTER"],
+        "direction": ["long", "short"], "price": [1.0, 1.0],
+        "trade_id": ["2025-11-13 09:00:10_long_1.0", "2025-11-13 09:00:10_short_1.0"],
+    })
+    ticks.to_csv(tmp_path / "ticks.csv", index=False)
+    trades.to_csv(tmp_path / "trades.csv", index=False)
+    sim = ExitStrategySimulator(tmp_path / "ticks.csv", tmp_path / "trades.csv")
+    # long：09:00:07 剛好在 -3 秒邊界上；short：09:00:13 剛好在 +3 秒邊界上；09:00:14 在視窗外
+    assert sim.scan_trade_log_by_momentum(-2, 3) == trades["trade_id"].tolist()
+    assert sim.scan_trade_log_by_momentum(-2, 2) == []
@@ -0,0 +1,82 @@
+# strategy_v4/tests/test_feed_journal.py
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from FeedJournal import HEADER, RECORD, FeedJournalWriter, read_journal, read_warmup, write_warmup
+from main import build_replay_runtime
+
+
+def _fop_ticks(make_ticks, n: int, seed: int = 3):
+    """make_ticks 轉成 TickFOPv1 同名欄位（close、volume、bid_price、ask_price、datetime）"""
+    return [SimpleNamespace(close=t["price"], volume=t["volume"], bid_price=t["price"] - 1, ask_price=t["price"] + 1,
+                            datetime=t["timestamp"]) for t in make_ticks(n, seed=seed)]
+
+
+def _kbars(n: int, end: datetime):
+    return [{"datetime": end - timedelta(minutes=n - i), "open": 22000.0 + i, "high": 22003.0 + i, "low": 21998.0 + i,
+             "close": np.float64(22001.0 + i), "volume": np.int64(10 + i), "amount": 1.0} for i in range(n)]
+
+
+def _write_journal(path, ticks):
+    writer = FeedJournalWriter(path)
+    for i, tick in enumerate(ticks):
+        writer.append(tick, received_ns=i * 1_000_000)
+    writer.close()
+
+
+def test_warmup_round_trip(tmp_path):
+    journal = tmp_path / "feed.mfj"
+    kbars = _kbars(3, datetime(2025, 11, 13, 9, 0))
+    write_warmup(journal, {"rsi": np.float64(61.5), "macd": 1.25}, kbars)
+    indicators, restored = read_warmup(journal)
+    assert indicators == {"rsi": 61.5, "macd": 1.25}
+    assert [bar["datetime"] for bar in restored] == [bar["datetime"] for bar in kbars]
+    assert [bar["close"] for bar in restored] == [22001.0, 22002.0, 22003.0]
+    assert "amount" not in restored[0]
+    assert read_warmup(tmp_path / "other.mfj") == ({}, [])
+
+
+def test_replay_is_deterministic(tmp_path, make_ticks):
+    journal = tmp_path / "feed.mfj"
+    ticks = _fop_ticks(make_ticks, 3000)
+    _write_journal(journal, ticks)
+    write_warmup(journal, {"rsi": 55.0}, _kbars(40, ticks[0].datetime))
+
+    outputs = []
+    for _ in range(2):
+        runtime = build_replay_runtime({"mode": "rule_based"}, str(journal), speed=None)
+        tick_engine = runtime.ingestor.handler.__self__
+        # 預熱 40 根 1 分 K：5m 週期已有收盤 K 棒
+        assert tick_engine.mtf_engine.closed_count[5] > 0
+        runtime.run()
+        assert runtime.quote_source.sent == len(ticks) and runtime.ingestor.processed == len(ticks)
+        outputs.append((tmp_path / "feed.replay_trades.csv").read_bytes())
+    assert outputs[0] and outputs[0] == outputs[1]
+
+
+def test_reopen_truncates_partial_last_record(tmp_path, make_ticks):
+    journal = tmp_path / "feed.mfj"
+    ticks = _fop_ticks(make_ticks, 10)
+    _write_journal(journal, ticks[:5])
+    with journal.open("ab") as f:
+        f.write(b"\x01" * (RECORD.size // 2))  # 寫到一半當機
+
+    _write_journal(journal, ticks[5:])
+    assert journal.stat().st_size == HEADER.size + RECORD.size * len(ticks)
+    restored = [tick for _, tick in read_journal(journal)]
+    assert [(t.close, t.volume, t.datetime) for t in restored] == [(t.close, t.volume, t.datetime) for t in ticks]
+
+
+def test_append_after_close_is_ignored(tmp_path, make_ticks):
+    journal = tmp_path / "feed.mfj"
+    ticks = _fop_ticks(make_ticks, 4)
+    writer = FeedJournalWriter(journal)
+    writer.append(ticks[0])
+    writer.close()
+    writer.append(ticks[1])
+    writer.close()
+    assert writer.count == 1
+    assert [tick.close for _, tick in read_journal(journal)] == [ticks[0].close]
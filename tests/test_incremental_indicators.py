@@ -0,0 +1,133 @@
+# strategy_v4/tests/test_incremental_indicators.py
+
+import random
+
+import pytest
+
+from IncrementalIndicatorEngine import IncrementalIndicatorEngine
+from IndicatorEngine import compute_all_indicators
+
+
+def _series(n: int, seed: int, with_range: bool):
+    """整數點跳動（微台最小跳動 1 點）；compute_all_indicators 四捨五入到小數 2 位，半點價格會讓加總順序不同的結果落在進位邊界"""
+    rng = random.Random(seed)
+    price, rows = 22000.0, []
+    for _ in range(n):
+        price += rng.choice([-3, -2, -1, 0, 1, 2, 3])
+        spread = rng.choice([0.0, 1.0, 3.0]) if with_range else 0.0
+        rows.append((price, price + spread, price - spread, float(rng.randint(1, 20))))
+    return rows
+
+
+def _assert_same(expected: dict, actual: dict, where):
+    assert set(actual) >= set(expected)
+    for key, value in expected.items():
+        if isinstance(value, str):
+            assert actual[key] == value, (where, key)
+        else:
+            assert actual[key] == pytest.approx(value, rel=1e-9, abs=1e-9), (where, key)
+
+
+@pytest.mark.parametrize("with_range", [False, True], ids=["close_only", "high_low"])
+def test_compat_matches_compute_all_indicators(with_range):
+    engine = IncrementalIndicatorEngine(mode="compat")
+    closes, highs, lows, volumes = [], [], [], []
+    for i, (close, high, low, volume) in enumerate(_series(1500, 7, with_range)):
+        closes.append(close)
+        highs.append(high)
+        lows.append(low)
+        volumes.append(volume)
+        actual = engine.update(close, high, low, volume)
+        _assert_same(compute_all_indicators(closes, highs, lows, volumes), actual, i)
+
+
+def test_compat_stays_exact_past_rolling_resync():
+    # 滑動加總每 4096 筆重新同步一次，長時間運行後仍需與整段重算一致
+    rows = _series(10000, 11, True)
+    engine = IncrementalIndicatorEngine(mode="compat")
+    for i, (close, high, low, volume) in enumerate(rows, start=1):
+        actual = engine.update(close, high, low, volume)
+        if i % 997 == 0 or i == len(rows):
+            closes, highs, lows, volumes = (list(col) for col in zip(*rows[:i]))
+            _assert_same(compute_all_indicators(closes, highs, lows, volumes), actual, i)
+
+
+def test_reset_starts_a_new_series():
+    rows = _series(300, 5, True)
+    engine = IncrementalIndicatorEngine()
+    for row in _series(500, 6, True):
+        engine.update(*row)
+    engine.reset()
+    fresh = IncrementalIndicatorEngine()
+    for row in rows:
+        assert engine.update(*row) == fresh.update(*row)
+
+
+def _wilder(values, period: int):
+    """整段 Wilder 平滑：第 period 筆為前 period 筆的簡單平均，之後 avg = (avg * (n - 1) + x) / n；之前為 None"""
+    out, avg = [], None
+    for i, x in enumerate(values):
+        if i + 1 == period:
+            avg = sum(values[:period]) / period
+        elif avg is not None:
+            avg = (avg * (period - 1) + x) / period
+        out.append(avg)
+    return out
+
+
+def _wilder_reference(closes, highs, lows, period: int = 14):
+    """逐筆陣列版 Wilder RSI / ATR / ADX 與延續前值的 KD（IncrementalIndicatorEngine(mode="wilder") 的對照）"""
+    gains, losses, trs, plus_dms, minus_dms = [], [], [], [], []
+    for i in range(1, len(closes)):
+        delta = closes[i] - closes[i - 1]
+        gains.append(max(delta, 0.0))
+        losses.append(max(-delta, 0.0))
+        trs.append(max(highs[i] - lows[i], abs(highs[i] - closes[i - 1]), abs(lows[i] - closes[i - 1])))
+        up, down = highs[i] - highs[i - 1], lows[i - 1] - lows[i]
+        plus_dms.append(up if up > down and up > 0 else 0)
+        minus_dms.append(down if down > up and down > 0 else 0)
+    avg_gain, avg_loss, atr = _wilder(gains, period), _wilder(losses, period), _wilder(trs, period)
+    plus_avg, minus_avg = _wilder(plus_dms, period), _wilder(minus_dms, period)
+    dx = [IncrementalIndicatorEngine._dx(p, m, t) for p, m, t in zip(plus_avg, minus_avg, atr) if t is not None]
+    adx = [None] * (len(trs) - len(dx)) + _wilder(dx, period)
+
+    rows, k, d = [], 50.0, 50.0
+    for i in range(len(closes)):
+        j = i - 1  # 第 i 筆 tick 之前累積了 i 個差值
+        if j < 0 or avg_gain[j] is None:
+            rsi = 50.0
+        else:
+            rsi = 100.0 if avg_loss[j] == 0 else round(100 - 100 / (1 + avg_gain[j] / avg_loss[j]), 1)
+        if i + 1 >= 9:
+            low_min, high_max = min(lows[i - 8:i + 1]), max(highs[i - 8:i + 1])
+            rsv = (closes[i] - low_min) / (high_max - low_min) * 100 if high_max != low_min else 50
+            k = (2 / 3) * k + (1 / 3) * rsv
+            d = (2 / 3) * d + (1 / 3) * k
+            kd = (round(k, 1), round(d, 1))
+        else:
+            kd = (50.0, 50.0)
+        rows.append({
+            "rsi": rsi,
+            "atr": 0.0 if j < 0 or atr[j] is None else round(atr[j], 2),
+            "adx": 0.0 if j < 0 or adx[j] is None else round(adx[j], 2),
+            "kd_k": kd[0], "kd_d": kd[1],
+        })
+    return rows
+
+
+@pytest.mark.parametrize("spread", [0, 2], ids=["close_only", "high_low"])
+def test_wilder_matches_reference_recursion(make_ticks, spread):
+    ticks = make_ticks(3000, seed=13)
+    closes = [t["price"] for t in ticks]
+    highs = [t["price"] + spread * (t["volume"] % 3) for t in ticks]
+    lows = [t["price"] - spread * (t["volume"] % 2) for t in ticks]
+    expected = _wilder_reference(closes, highs, lows)
+
+    wilder, compat = IncrementalIndicatorEngine(mode="wilder"), IncrementalIndicatorEngine(mode="compat")
+    for i, t in enumerate(ticks):
+        actual = wilder.update(closes[i], highs[i], lows[i], t["volume"])
+        _assert_same(expected[i], actual, i)
+        # RSI / ATR / ADX / KD 以外的欄位兩種模式相同
+        same = compat.update(closes[i], highs[i], lows[i], t["volume"])
+        _assert_same({k: v for k, v in same.items() if k not in expected[i]}, actual, i)
+    assert expected[-1]["adx"] > 0 and expected[-1]["atr"] > 0
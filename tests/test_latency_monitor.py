@@ -0,0 +1,98 @@
+# strategy_v4/tests/test_latency_monitor.py
+
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from Clock import SimulatedClock
+from LatencyMonitor import LatencyHistogram, LatencyMonitor
+from StrategyState import StrategyState
+from TickEngine import TickEngine
+from TickRecorder import TickRecorder
+from TradeLogger import TradeLogger
+from main import make_tick_callback
+
+
+@pytest.fixture(scope="module")
+def samples():
+    rng = random.Random(7)
+    return [int(rng.lognormvariate(10, 1.2)) for _ in range(50_000)]
+
+
+def _engine(tmp_path):
+    clock = SimulatedClock()
+    recorder = TickRecorder(tmp_path / "ticks.csv", clock=clock)
+    trade_logger = TradeLogger(str(tmp_path / "trades.csv"), tick_recorder=recorder, clock=clock)
+    return TickEngine(StrategyState(clock=clock), "auto", {}, trade_logger, recorder, clock=clock, verbose=False)
+
+
+def test_percentile_error_is_within_bucket_resolution(samples):
+    h = LatencyHistogram()
+    for v in samples:
+        h.record(v)
+    ordered = sorted(samples)
+    for q in (50, 90, 99, 99.9):
+        exact = ordered[max(0, int(-(-len(ordered) * q // 100)) - 1)]
+        assert abs(h.percentile(q) - exact) / exact < 1 / h._sub, q
+    assert h.count == len(samples) and h.max == ordered[-1] and h.min == ordered[0]
+    assert h.percentile(100) <= h.max and (h.max - h.percentile(100)) / h.max < 1 / h._sub
+    assert LatencyHistogram().percentile(50) == 0
+
+
+def test_small_values_and_overflow_are_exact_or_clamped():
+    h = LatencyHistogram(max_ns=1_000_000)
+    for v in (-5, 0, 3, 31):
+        h.record(v)
+    assert [h.percentile(q) for q in (25, 50, 75, 100)] == [0, 0, 3, 31]
+    h.record(5_000_000)
+    # 超過 max_ns 記在最後一格；max 仍為精確值
+    assert h.counts[-1] == 1 and h.count == 5 and h.max == 5_000_000
+
+
+def test_merge_equals_recording_everything(samples):
+    whole, left, right = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i, v in enumerate(samples):
+        whole.record(v)
+        (left if i % 3 else right).record(v)
+    left.merge(right)
+    assert left.counts == whole.counts
+    assert (left.count, left.total, left.min, left.max) == (whole.count, whole.total, whole.min, whole.max)
+    assert left.summary() == whole.summary()
+    with pytest.raises(ValueError):
+        left.merge(LatencyHistogram(sub_bits=4))
+
+
+def test_disabled_engine_keeps_plain_on_tick(tmp_path, make_ticks):
+    engine = _engine(tmp_path)
+    assert engine.latency is None and "on_tick" not in engine.__dict__
+    assert engine.on_tick.__func__ is TickEngine.on_tick
+    for tick in make_ticks(200):
+        engine.on_tick(tick)
+    assert engine.latency is None
+
+
+def test_enable_latency_records_every_stage(tmp_path, make_ticks):
+    engine = _engine(tmp_path)
+    monitor = LatencyMonitor()
+    engine.enable_latency(monitor)
+    assert engine.on_tick.__func__ is TickEngine._on_tick_timed
+
+    # 與實盤相同經過 tick callback：記 feed lag 與 received_ns（queue_wait）
+    callback = make_tick_callback(SimpleNamespace(put=engine.on_tick), {}, monitor)
+    ticks = make_ticks(3000, seed=2)
+    for tick in ticks:
+        callback("TAIFEX", SimpleNamespace(close=tick["price"], volume=tick["volume"], datetime=tick["timestamp"]))
+    engine.tick_recorder.close()
+
+    snapshot = monitor.snapshot()
+    assert set(snapshot) == set(LatencyMonitor.STAGES)
+    for stage in LatencyMonitor.STAGES:
+        if stage != "logger":
+            assert snapshot[stage]["count"] == len(ticks), stage
+    assert snapshot["logger"]["count"] > 0
+
+    engine.disable_latency()
+    assert engine.on_tick.__func__ is TickEngine.on_tick and "log" not in engine.logger.__dict__
+    engine.on_tick(ticks[-1])
+    assert monitor.histograms["total"].count == len(ticks)
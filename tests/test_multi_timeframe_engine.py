@@ -0,0 +1,96 @@
+# strategy_v4/tests/test_multi_timeframe_engine.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from MultiTimeframeEngine import MultiTimeframeEngine, session_of
+
+D = datetime(2025, 11, 13)
+
+
+@pytest.mark.parametrize("ts, expected", [
+    (D.replace(hour=8, minute=44, second=59), None),
+    (D.replace(hour=8, minute=45), ("day", D.replace(hour=8, minute=45), D.replace(hour=13, minute=45))),
+    (D.replace(hour=13, minute=45), ("day", D.replace(hour=8, minute=45), D.replace(hour=13, minute=45))),
+    (D.replace(hour=13, minute=45, second=1), None),
+    (D.replace(hour=14, minute=59, second=59), None),
+    (D.replace(hour=15), ("night", D.replace(hour=15), D.replace(day=14, hour=5))),
+    (D.replace(hour=23, minute=59, second=59), ("night", D.replace(hour=15), D.replace(day=14, hour=5))),
+    # 跨過午夜仍屬前一天 15:00 開盤的夜盤
+    (D.replace(day=14), ("night", D.replace(hour=15), D.replace(day=14, hour=5))),
+    (D.replace(day=14, hour=5), ("night", D.replace(hour=15), D.replace(day=14, hour=5))),
+    (D.replace(day=14, hour=5, second=1), None),
+])
+def test_session_boundaries(ts, expected):
+    assert session_of(ts) == expected
+
+
+def _feed(engine, start: datetime, seconds: int):
+    price = 22000.0
+    for i in range(seconds + 1):
+        price += (-1) ** i * (i % 7)
+        engine.update(start + timedelta(seconds=i), price, 1.0)
+
+
+def test_bars_roll_over_on_session_aligned_boundaries():
+    engine = MultiTimeframeEngine()
+    closed = {"1m": [], "5m": [], "15m": [], "all": []}
+    engine.subscribe(lambda bar: closed["1m"].append(bar), "1m")
+    engine.subscribe(lambda bar: closed["5m"].append(bar), "5m")
+    engine.subscribe(lambda bar: closed["15m"].append(bar), "15m")
+    engine.subscribe(lambda bar: closed["all"].append(bar.timeframe))
+
+    _feed(engine, D.replace(hour=8, minute=45), 30 * 60)
+    assert [b.start.strftime("%H:%M") for b in closed["5m"]] == ["08:45", "08:50", "08:55", "09:00", "09:05", "09:10"]
+    assert [b.start.strftime("%H:%M") for b in closed["15m"]] == ["08:45", "09:00"]
+    assert engine.closed_count == {1: 30, 5: 6, 15: 2}
+    assert closed["all"].count("1m") == 30 and closed["all"].count("5m") == 6 and closed["all"].count("15m") == 2
+    bar = closed["5m"][0]
+    assert bar.session == "day" and bar.ticks == 300 and bar.volume == 300.0
+    # 5m K 棒的 OHLC 與其中 5 根 1m K 棒一致
+    minutes = closed["1m"][:5]
+    assert (bar.open, bar.high, bar.low, bar.close) == (
+        minutes[0].open, max(m.high for m in minutes), min(m.low for m in minutes), minutes[-1].close)
+    assert engine.builders[5].current.start == D.replace(hour=9, minute=15)
+
+
+def test_closing_tick_joins_the_last_bar_and_night_bars_cross_midnight():
+    engine = MultiTimeframeEngine()
+    closed = []
+    engine.subscribe(closed.append, "5m")
+    engine.update(D.replace(hour=13, minute=41), 22000.0, 1.0)
+    engine.update(D.replace(hour=13, minute=45), 22010.0, 1.0)   # 收盤那一筆併入 13:40 的 K 棒
+    assert closed == [] and engine.builders[5].current.close == 22010.0
+    engine.update(D.replace(hour=13, minute=50), 22020.0, 1.0)   # 盤後零星成交也併入目前 K 棒
+    assert closed == [] and engine.builders[5].current.ticks == 3
+
+    engine.update(D.replace(hour=23, minute=58), 22030.0, 1.0)
+    assert closed[-1].start == D.replace(hour=13, minute=40) and closed[-1].close == 22020.0
+    engine.update(D.replace(day=14, minute=2), 22040.0, 1.0)
+    assert closed[-1].start == D.replace(hour=23, minute=55) and closed[-1].session == "night"
+    assert engine.builders[5].current.start == D.replace(day=14) and engine.builders[15].current.start == D.replace(day=14)
+
+
+def test_warmup_from_kbars_matches_streaming_updates():
+    start = D.replace(hour=8, minute=45)
+    kbars = [{"datetime": start + timedelta(minutes=i), "open": 22000.0 + i, "high": 22005.0 + i, "low": 21995.0 + i,
+              "close": 22000.0 + (i * 7) % 11, "volume": 10 + i} for i in range(40)]
+    warmed = MultiTimeframeEngine()
+    warmed.warmup(kbars)
+    streamed = MultiTimeframeEngine()
+    for bar in kbars:
+        streamed.update(bar["datetime"], bar["close"], bar["volume"], bar["high"], bar["low"])
+    # 最後一根 K 棒仍未收
+    assert warmed.closed_count == streamed.closed_count == {1: 39, 5: 7, 15: 2}
+    assert warmed.builders[15].current.high == max(b["high"] for b in kbars[30:])
+
+    # 其他時間欄位名稱（ts / timestamp）也可預熱
+    renamed = MultiTimeframeEngine()
+    renamed.warmup([{"ts" if i % 2 else "timestamp": b["datetime"], "close": b["close"], "volume": b["volume"]}
+                    for i, b in enumerate(kbars)])
+    assert renamed.closed_count == warmed.closed_count
+
+    tick = start + timedelta(minutes=40, seconds=1)
+    assert warmed.update(tick, 22003.0, 1.0) == streamed.update(tick, 22003.0, 1.0)
+    assert warmed.indicators["is_ready_1m"] and not warmed.indicators["is_ready_5m"]
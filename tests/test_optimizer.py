@@ -0,0 +1,42 @@
+# strategy_v4/tests/test_optimizer.py
+
+import pytest
+
+from BacktestRunner import BacktestRunner
+from Optimizer import WORKER, Optimizer, expand_grid, split_params
+
+GRID = {"hard_stoploss": [10, 20], "max_ticks_hold": [60, 180], "bull_score_min": [2, 3]}
+
+
+@pytest.fixture
+def ticks(make_ticks):
+    return make_ticks(20000, seed=7)
+
+
+def test_parallel_results_match_plain_backtests(tmp_path, ticks, capsys):
+    cache_dir = tmp_path / "features"
+    best = Optimizer(ticks, workers=2, output_dir=str(tmp_path), cache_dir=cache_dir).find_best(GRID)
+    rerun = Optimizer(ticks, workers=2, output_dir=str(tmp_path), cache_dir=cache_dir).run(GRID)
+    # 第二次全部已完成，不會重跑
+    assert "待跑 0" in capsys.readouterr().out.splitlines()[-1]
+    assert len(rerun) == len(expand_grid(GRID)) and best in rerun
+    assert not WORKER
+
+    for row in rerun:
+        params = {k: row[k] for k in GRID}
+        state_params, decision_params = split_params(params)
+        plain = BacktestRunner("rule_based", state_params, decision_params).run(ticks).summary()
+        for key in ("trades", "win_rate", "avg_pnl", "total_pnl"):
+            assert plain[key] == row[key], (params, key)
+
+
+def test_single_worker_matches_pool(tmp_path, ticks):
+    grid = {"hard_stoploss": [10, 20], "bull_score_min": [2, 3]}
+    results = [
+        Optimizer(ticks, workers=workers, output_dir=str(tmp_path / str(workers)), cache_dir=None).run(grid)
+        for workers in (1, 2)
+    ]
+    timing = ("elapsed", "ticks_per_sec")
+    strip = [sorted(({k: v for k, v in r.items() if k not in timing} for r in rows), key=lambda r: r["run_id"])
+             for rows in results]
+    assert strip[0] == strip[1]
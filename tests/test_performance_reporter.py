@@ -0,0 +1,53 @@
+# strategy_v4/tests/test_performance_reporter.py
+
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from PerformanceReporter import PerformanceReporter, RunningPerformance
+from TradeAnalyzer import TradeAnalyzer
+from TradeLogger import EXIT_ACTIONS
+
+
+def _trade_rows(n: int, seed: int) -> list:
+    """含連續 ENTER、加碼與重複出場列的交易紀錄"""
+    rng = random.Random(seed)
+    rows, ts, price = [], datetime(2025, 11, 13, 9, 0, 0), 22000.0
+
+    def row(action, direction):
+        return {"timestamp": ts.strftime("%Y-%m-%d %H:%M:%S"), "action": action, "direction": direction, "price": price}
+
+    for _ in range(n):
+        ts += timedelta(seconds=rng.randint(5, 120))
+        direction = rng.choice(["long", "short"])
+        rows.append(row("ENTER", direction))
+        if rng.random() < 0.1:
+            continue
+        if rng.random() < 0.1:
+            rows.append(row("ADD", direction))
+        price += rng.choice([-30, -12, -5, -2, 0, 3, 6, 15, 40])
+        ts += timedelta(seconds=rng.randint(5, 300))
+        rows.append(row(rng.choice(EXIT_ACTIONS), direction))
+        if rng.random() < 0.05:
+            rows.append(row("EXIT", direction))
+    return rows
+
+
+def test_pairing_matches_trade_analyzer():
+    rows = _trade_rows(3000, 9)
+    reporter = PerformanceReporter(rows=rows)
+    report = reporter.report()
+    analyzer = TradeAnalyzer()
+    analyzer.analyze(rows)
+    assert len(analyzer.results) == report["trades"]
+    np.testing.assert_allclose(reporter.trades["net_pnl"], [r["net_pnl"] for r in analyzer.results])
+
+
+def test_running_metrics_match_batch_report():
+    reporter = PerformanceReporter(rows=_trade_rows(3000, 9))
+    report = reporter.report()
+    running = RunningPerformance()
+    for t in reporter.trades.itertuples():
+        running.on_trade_closed({"pnl": t.pnl, "entry_time": t.entry_time.to_pydatetime(), "exit_time": t.exit_time.to_pydatetime()})
+    assert running.metrics() == report
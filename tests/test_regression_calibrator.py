@@ -0,0 +1,88 @@
+# strategy_v4/tests/test_regression_calibrator.py
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from Clock import SimulatedClock
+from DecisionEngine_v2 import extract_feature_matrix, extract_record_features
+from FeatureMatrix import FEATURE_COLUMNS, build_feature_matrix
+from ParamsStore import ParamsStore
+from RegressionCalibrator import RegressionCalibrator, _FEATURE_INPUTS, _TICK_COLUMNS, _frame_columns
+from StrategyState import StrategyState
+from TickEngine import TickEngine
+from TickRecorder import TickRecorder, iter_tick_chunks
+from TradeLogger import MemoryTradeLogger
+
+
+def _write_day(path, ticks) -> pd.DataFrame:
+    """FeatureMatrix 欄位 + price、volume 寫成一天的 tick 檔"""
+    stamps = [t["timestamp"] for t in ticks]
+    prices = [t["price"] for t in ticks]
+    volumes = [float(t["volume"]) for t in ticks]
+    df = pd.DataFrame(build_feature_matrix(stamps, prices, volumes), columns=FEATURE_COLUMNS).drop(columns=["bband_signal"])
+    df.insert(0, "price", prices)
+    df.insert(0, "timestamp", stamps)
+    df["volume"] = volumes
+    df.to_csv(path, index=False)
+    return df
+
+
+def _record(tmp_path, ticks):
+    """以實盤相同的 TickEngine + TickRecorder 產生記錄檔，同時取得推論時的特徵"""
+    clock = SimulatedClock()
+    recorder = TickRecorder(tmp_path / "ticks.csv", clock=clock)
+    engine = TickEngine(StrategyState(clock=clock), "auto", {}, MemoryTradeLogger(tick_recorder=recorder, clock=clock),
+                        recorder, clock=clock, verbose=False)
+    live = [extract_record_features(engine.on_tick(tick)) for tick in ticks]
+    recorder.close()
+    return tmp_path / "ticks.csv", np.array(live)
+
+
+def test_recorded_ticks_reproduce_live_features(tmp_path, make_ticks):
+    path, live = _record(tmp_path, make_ticks(3000))
+    chunks = list(iter_tick_chunks(path, 700, _TICK_COLUMNS))
+    # 特徵所需欄位都有寫出（缺欄位時 extract_feature_matrix 會以中性常數代入）
+    assert set(_FEATURE_INPUTS) <= set(_frame_columns(chunks[-1]))
+    X = np.vstack([extract_feature_matrix(_frame_columns(chunk)) for chunk in chunks])
+    np.testing.assert_allclose(X, live, rtol=1e-12, atol=1e-12)
+
+
+def test_fit_tick_file_reads_recorder_output(tmp_path, make_ticks, capsys):
+    path, _ = _record(tmp_path, make_ticks(3000))
+    calibrator = RegressionCalibrator(chunk_rows=700)
+    used = calibrator.fit_tick_file(path)
+    assert used == 3000 - calibrator.horizon
+    assert "缺少特徵欄位" not in capsys.readouterr().out
+
+
+def test_chunked_fit_equals_single_fit(tmp_path, make_ticks):
+    day = _write_day(tmp_path / "day1.csv", make_ticks(6000, seed=1, start=datetime(2025, 11, 14, 8, 45)))
+    small = RegressionCalibrator(chunk_rows=700)
+    small.fit_tick_file(tmp_path / "day1.csv")
+    full = RegressionCalibrator()
+    X = extract_feature_matrix(_frame_columns(day))
+    p = day["price"].to_numpy()
+    full.partial_fit(X[:-20], np.sign(p[20:] - p[:-20]))
+    np.testing.assert_allclose(small.xtx, full.xtx)
+    np.testing.assert_allclose(small.xty, full.xty)
+
+
+def test_warm_start_equals_fitting_both_days(tmp_path, make_ticks):
+    start = datetime(2025, 11, 14, 8, 45)
+    for i in (1, 2):
+        _write_day(tmp_path / f"day{i}.csv", make_ticks(6000, seed=i, start=start + timedelta(days=i - 1)))
+    store = ParamsStore(tmp_path / "params.json")
+    first = RegressionCalibrator(chunk_rows=700)
+    first.fit_tick_file(tmp_path / "day1.csv")
+    first.publish(store, "v-day1", stats_path=tmp_path / "stats_day1.npz")
+
+    warm = RegressionCalibrator.load_stats(tmp_path / "stats_day1.npz")
+    warm.fit_tick_file(tmp_path / "day2.csv")
+    both = RegressionCalibrator()
+    both.fit_tick_files([tmp_path / "day1.csv", tmp_path / "day2.csv"])
+    np.testing.assert_allclose(warm.xtx, both.xtx)
+    np.testing.assert_allclose(list(warm.solve().values()), list(both.solve().values()))
+    warm.publish(store, "v-day2")
+    assert ParamsStore(store.path).get_version() == "v-day2"
@@ -0,0 +1,59 @@
+# strategy_v4/tests/test_ring_buffer.py
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+from RingBuffer import RingBuffer
+
+
+def test_matches_bounded_deque_through_wrap_around():
+    ring, ref = RingBuffer(5), deque(maxlen=5)
+    for i in range(23):
+        ring.append(float(i))
+        ref.append(float(i))
+        assert len(ring) == len(ref) and ring.is_full() == (len(ref) == 5)
+        assert ring.tolist() == list(ref) and list(ring) == list(ref)
+        assert ring.last() == ref[-1]
+        for n in range(1, 7):
+            assert ring.window(n).tolist() == list(ref)[-n:]
+        for index in range(-len(ref), len(ref)):
+            assert ring[index] == ref[index]
+        assert ring[1:-1].tolist() == list(ref)[1:-1]
+    with pytest.raises(IndexError):
+        ring[5]
+    with pytest.raises(IndexError):
+        ring[-6]
+
+
+def test_window_is_a_zero_copy_view():
+    ring = RingBuffer(4)
+    ring.extend([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    view = ring.window(3)
+    assert view.tolist() == [4.0, 5.0, 6.0]
+    assert isinstance(view, np.ndarray) and view.base is ring._buf and not view.flags.owndata
+    assert np.shares_memory(view, ring._buf) and view.flags.c_contiguous
+    assert ring.window().tolist() == [3.0, 4.0, 5.0, 6.0]
+    assert ring.window(0).tolist() == [] and ring.window(10).tolist() == [3.0, 4.0, 5.0, 6.0]
+
+
+def test_last_len_and_clear_before_and_after_filling():
+    ring = RingBuffer(3)
+    assert len(ring) == 0 and not ring and ring.last() is None and ring.last(50.0) == 50.0
+    assert ring.window().tolist() == []
+    ring.extend([7.0, 8.0])
+    assert len(ring) == 2 and ring and not ring.is_full() and ring.last() == 8.0
+    ring.extend([9.0, 10.0])
+    assert len(ring) == 3 and ring.is_full() and ring.last() == 10.0 and ring.tolist() == [8.0, 9.0, 10.0]
+    assert isinstance(ring[0], float) and isinstance(ring.last(), float)
+
+    ring.clear()
+    assert len(ring) == 0 and not ring and ring.last() is None and ring.tolist() == []
+    ring.append(1.0)
+    assert ring.tolist() == [1.0] and ring.last() == 1.0 and ring[-1] == 1.0 and ring[0] == 1.0
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
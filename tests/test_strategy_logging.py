@@ -0,0 +1,65 @@
+# strategy_v4/tests/test_strategy_logging.py
+
+import io
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+from Clock import SimulatedClock
+from StrategyLogging import RateLimitFilter, get_logger, log_key, setup_logging, should_log, shutdown_logging, silent
+from StrategyState import StrategyState
+
+
+def test_silent_only_affects_the_calling_thread():
+    log = get_logger("test")
+    buffer = io.StringIO()
+    with redirect_stdout(buffer), silent():
+        log.info("silenced")
+        assert not should_log(log, "TICK")
+        worker = threading.Thread(target=lambda: log.info("worker"))
+        worker.start()
+        worker.join()
+    assert buffer.getvalue().splitlines() == ["worker"]
+    assert should_log(log, "TICK")
+
+
+def test_sampling_reports_skipped_count():
+    log = get_logger("test")
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        setup_logging(rate_limits={"S": {"sample": 3}})
+        for i in range(7):
+            log.info("sample %d", i, extra=log_key("S"))
+        shutdown_logging()
+    assert buffer.getvalue().splitlines() == ["sample 0", "sample 3（略過 2 筆）", "sample 6（略過 2 筆）"]
+
+
+def test_entry_blocked_messages_are_rate_limited_separately():
+    clock = SimulatedClock(datetime(2025, 11, 13, 9, 0, 0))
+    state = StrategyState(clock=clock)
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        setup_logging()
+        state.enter("long", 22000.0)
+        state.enter("long", 22001.0)   # 已持倉
+        clock.advance_to(clock.now() + timedelta(seconds=1))
+        state.can_enter()              # 進場冷卻
+        state.can_enter()              # 同一 key 5 秒內不再輸出
+        shutdown_logging()
+    blocked = [line for line in buffer.getvalue().splitlines() if line.startswith("⚠️")]
+    assert blocked == ["⚠️ 已持倉，忽略重複進場", "⚠️ 進場冷卻中，跳過進場"]
+
+
+def test_rate_limit_filter_is_thread_safe():
+    limiter = RateLimitFilter({"S": {"sample": 10}})
+    allowed = []
+
+    def run():
+        allowed.append(sum(limiter.allow("S") for _ in range(10000)))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(allowed) == 4000
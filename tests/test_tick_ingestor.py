@@ -0,0 +1,102 @@
+# strategy_v4/tests/test_tick_ingestor.py
+
+import threading
+import time
+
+import pytest
+
+from TickIngestor import TickIngestor
+
+
+class StalledHandler:
+    """第一筆 tick 卡住直到 release()；id 為 fail_id 的 tick 拋例外"""
+
+    def __init__(self, fail_id: int = 6):
+        self.fail_id = fail_id
+        self.seen = []
+        self.busy = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self, tick):
+        self.busy.set()
+        self.released.wait(5)
+        self.seen.append((tick["id"], tick["volume"]))
+        if tick["id"] == self.fail_id:
+            raise RuntimeError("boom")
+
+    def release(self):
+        self.released.set()
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "逾時"
+        time.sleep(0.001)
+
+
+def _stalled(policy: str):
+    """maxsize=3；worker 卡在第 0 筆，之後放進的 tick 只能留在佇列"""
+    handler = StalledHandler()
+    ingestor = TickIngestor(handler, maxsize=3, policy=policy)
+    ingestor.start()
+    ingestor.put({"id": 0, "volume": 1})
+    assert handler.busy.wait(5)
+    return handler, ingestor
+
+
+def _ticks():
+    return [{"id": i, "volume": i * 10} for i in range(1, 7)]
+
+
+@pytest.mark.parametrize("policy, survivors, dropped, coalesced", [
+    ("drop_oldest", [(4, 40), (5, 50), (6, 60)], 3, 0),
+    ("coalesce", [(1, 10), (2, 20), (6, 30 + 40 + 50 + 60)], 0, 3),
+])
+def test_full_queue_policies(policy, survivors, dropped, coalesced):
+    handler, ingestor = _stalled(policy)
+    assert all(ingestor.put(tick) for tick in _ticks())
+    assert ingestor.depth == 3
+    handler.release()
+    ingestor.stop(drain=True)
+    assert handler.seen == [(0, 1)] + survivors
+    assert ingestor.stats() == {
+        "depth": 0, "max_depth": 3, "received": 7, "processed": 4,
+        "dropped": dropped, "coalesced": coalesced, "errors": 1, "policy": policy,
+    }
+
+
+def test_block_policy_waits_for_the_consumer():
+    handler, ingestor = _stalled("block")
+    producer = threading.Thread(target=lambda: [ingestor.put(tick) for tick in _ticks()])
+    producer.start()
+    # 佇列滿後第 4 筆在 put() 內等待空位
+    _wait_until(lambda: ingestor.received == 5)
+    time.sleep(0.05)
+    assert producer.is_alive() and ingestor.depth == 3 and ingestor.received == 5
+    handler.release()
+    producer.join(5)
+    ingestor.stop(drain=True)
+    assert handler.seen == [(0, 1)] + [(t["id"], t["volume"]) for t in _ticks()]
+    assert ingestor.stats() == {
+        "depth": 0, "max_depth": 3, "received": 7, "processed": 7,
+        "dropped": 0, "coalesced": 0, "errors": 1, "policy": "block",
+    }
+
+
+def test_stop_without_drain_counts_the_queue_as_dropped():
+    handler, ingestor = _stalled("drop_oldest")
+    for tick in _ticks()[:3]:
+        ingestor.put(tick)
+    handler.release()
+    ingestor.stop(drain=False)
+    assert not ingestor.put({"id": 9, "volume": 1})
+    stats = ingestor.stats()
+    assert stats["received"] == 4 and stats["processed"] + stats["dropped"] == 4 and stats["depth"] == 0
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        TickIngestor(print, policy="latest")
+    with pytest.raises(ValueError):
+        TickIngestor(print, maxsize=0)
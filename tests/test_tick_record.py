@@ -0,0 +1,62 @@
+# strategy_v4/tests/test_tick_record.py
+
+import pytest
+
+from IncrementalIndicatorEngine import IncrementalIndicatorEngine
+from MultiTimeframeEngine import MultiTimeframeEngine
+from TickRecord import FIELD_DEFAULTS, TickRecord, as_tick_record
+from TickRecorder import TICK_FIELDS_TUPLE
+
+
+def test_dict_round_trip_keeps_fields_and_extras():
+    raw = {"price": 22001.0, "volume": 3, "bid": 22000.0, "rsi": 61.5, "bias": "bullish", "note": "x"}
+    record = TickRecord.from_dict(raw)
+    assert record.price == 22001.0 and record.bias == "bullish" and record.extras == {"note": "x"}
+    values = record.to_dict()
+    assert {k: values[k] for k in raw} == raw
+    # 選填欄位未寫入（None）時不出現在 dict 中，其餘欄位帶預設值
+    assert "ask" not in values and "entry_score" not in values and values["kd_k"] == 50.0
+    assert record.keys() == list(values) and dict(record.items()) == values
+    assert TickRecord.from_dict(values).to_dict() == values
+    assert as_tick_record(record) is record and as_tick_record(raw).to_dict() == values
+
+
+def test_get_returns_defaults_for_missing_values():
+    record = TickRecord()
+    for name, default in FIELD_DEFAULTS.items():
+        assert record.get(name, "missing") == ("missing" if default is None else default)
+    assert record.get("bid") is None and record.get("bid", 0) == 0
+    assert record.get("unknown", 7) == 7
+    record.update({"bias": "bearish"}, unknown=1)
+    assert record.get("bias", "neutral") == "bearish" and record.get("unknown") == 1
+    record.bias = None
+    assert record.get("bias", "neutral") == "neutral" and "bias" not in record
+
+
+def test_getitem_treats_none_as_missing_key():
+    record = TickRecord(price=22000.0)
+    record["note"] = "x"
+    assert record["price"] == 22000.0 and record["rsi"] == 50.0 and record["note"] == "x"
+    assert "price" in record and "note" in record and "bid" not in record
+    for key in ("bid", "entry_score", "unknown"):
+        with pytest.raises(KeyError):
+            record[key]
+    record["bid"] = 21999.0
+    assert record["bid"] == 21999.0 and record.extras == {"note": "x"}
+
+
+def test_record_row_matches_dict_flow(make_ticks):
+    indicator_engine, mtf = IncrementalIndicatorEngine(), MultiTimeframeEngine()
+    for tick in make_ticks(500, seed=4):
+        price, ts, volume = tick["price"], tick["timestamp"], tick["volume"]
+        indicators = indicator_engine.update(price, price, price, volume)
+        timeframes = mtf.update(ts, price, volume)
+
+        state = {"is_ready": True, "recent_high": price, "max_profit": 0.0, "max_loss": 0.0, "tick_since_entry": 0,
+                 "unrealized_profit": 0.0, "bias": "neutral", "momentum": 1.0, "direction_score": 1, "entry_score": 2}
+        raw = dict(tick, **indicators, **timeframes, **state)
+        record = TickRecord(ts, price, volume)
+        record.set_indicators(indicators)
+        record.set_timeframes(timeframes)
+        record.update(state)
+        assert record.row(TICK_FIELDS_TUPLE, missing="") == [raw.get(name, "") for name in TICK_FIELDS_TUPLE]
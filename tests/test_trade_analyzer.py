@@ -0,0 +1,38 @@
+# strategy_v4/tests/test_trade_analyzer.py
+
+import csv
+
+from TradeAnalyzer import TradeAnalyzer
+
+FIELDS = ["timestamp", "action", "direction", "price", "entry_score", "bias", "momentum", "reversal", "direction_score"]
+
+
+def _write(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for timestamp, action, direction, price in rows:
+            writer.writerow([timestamp, action, direction, price, 3, "bullish", 1.0, "False", 1])
+
+
+def test_night_session_trade_spanning_files_is_paired(tmp_path):
+    # 夜盤持倉 23:58 進場、跨過午夜換檔後才出場
+    _write(tmp_path / "trade_log_20251113_day.csv", [
+        ("2025-11-13 09:00:00", "ENTER", "long", 22000),
+        ("2025-11-13 09:01:00", "EXIT", "long", 22010),
+    ])
+    _write(tmp_path / "trade_log_20251113_night.csv", [
+        ("2025-11-13 15:00:00", "ENTER", "short", 22050),
+        ("2025-11-13 15:02:00", "STOPLOSS", "short", 22070),
+        ("2025-11-13 23:58:00", "ENTER", "short", 22100),
+    ])
+    _write(tmp_path / "trade_log_20251114_day.csv", [
+        ("2025-11-14 00:02:00", "TAKEPROFIT", "short", 22060),
+        ("2025-11-14 09:00:00", "ENTER", "long", 22000),
+        ("2025-11-14 09:03:00", "TIME_EXIT", "long", 21995),
+    ])
+    frame = TradeAnalyzer(str(tmp_path / "trade_log_*.csv"), fee_per_trade=0.0).analyze()
+    assert frame["entry_time"].to_list() == [
+        "2025-11-13 09:00:00", "2025-11-13 15:00:00", "2025-11-13 23:58:00", "2025-11-14 09:00:00"]
+    assert frame["pnl"].to_list() == [10.0, -20.0, 40.0, -5.0]
+    assert frame["file"][2].endswith("trade_log_20251114_day.csv")
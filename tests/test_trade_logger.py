@@ -0,0 +1,105 @@
+# strategy_v4/tests/test_trade_logger.py
+
+import builtins
+import csv
+from datetime import datetime
+
+import pytest
+
+import TradeLogger as trade_logger_module
+from Clock import SimulatedClock
+from TradeLogger import TradeLogger
+
+
+class FlakyFile:
+    """包住真正的檔案：第 fail_on 次起的 failures 次 write() 只寫出一半就拋 OSError（模擬寫到一半的資料列）"""
+
+    def __init__(self, f, faults):
+        self._f = f
+        self._faults = faults
+
+    def write(self, data):
+        faults = self._faults
+        faults["writes"] += 1
+        if faults["writes"] >= faults["fail_on"] and faults["failures"] > 0:
+            faults["failures"] -= 1
+            self._f.write(data[:len(data) // 2])
+            self._f.flush()
+            raise OSError(28, "No space left on device")
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def _inject(monkeypatch, open_errors=0, write_fail_on=0, write_failures=0):
+    """TradeLogger 模組內的 open：前 open_errors 次拋 PermissionError，之後回傳 FlakyFile"""
+    faults = {"opens": 0, "writes": 0, "fail_on": write_fail_on, "failures": write_failures}
+
+    def flaky_open(path, mode="r", *args, **kwargs):
+        if "a" not in mode:
+            return builtins.open(path, mode, *args, **kwargs)
+        faults["opens"] += 1
+        if faults["opens"] <= open_errors:
+            raise PermissionError(13, "Permission denied", path)
+        return FlakyFile(builtins.open(path, mode, *args, **kwargs), faults)
+
+    monkeypatch.setattr(trade_logger_module, "open", flaky_open, raising=False)
+    return faults
+
+
+def _logger(path):
+    logger = TradeLogger(str(path), async_mode=True, fsync_interval_ms=10,
+                         clock=SimulatedClock(datetime(2025, 11, 13, 9, 0, 0)))
+    logger.retry_interval = 0.01
+    return logger
+
+
+def _log_trades(logger, n: int):
+    for i in range(n):
+        action = "ENTER" if i % 2 == 0 else "EXIT"
+        logger.log(action, {"direction": "long", "max_profit": i}, 22000.0 + i, {"rsi": 50.0, "volume": i})
+
+
+def _assert_written_once(logger, n: int):
+    with open(logger.filename, newline="") as f:
+        header, *rows = list(csv.reader(f))
+    assert header == logger.fields
+    # 每列完整、價格依序各出現一次：沒有殘缺列也沒有重複列
+    assert all(len(row) == len(header) for row in rows)
+    assert [float(row[header.index("price")]) for row in rows] == [22000.0 + i for i in range(n)]
+
+
+@pytest.mark.parametrize("write_fail_on, write_failures", [(1, 1), (3, 2), (5, 4)])
+def test_partial_writes_are_truncated_and_retried(tmp_path, monkeypatch, write_fail_on, write_failures):
+    path = tmp_path / "trades.csv"
+    faults = _inject(monkeypatch, write_fail_on=write_fail_on, write_failures=write_failures)
+    logger = _logger(path)
+    _log_trades(logger, 12)
+    logger.close()
+    assert faults["failures"] == 0 and logger.write_errors == write_failures
+    _assert_written_once(logger, 12)
+
+
+def test_open_errors_keep_rows_pending_until_the_file_opens(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "trades.csv"
+    faults = _inject(monkeypatch, open_errors=3)
+    logger = _logger(path)
+    _log_trades(logger, 6)
+    logger.close()
+    assert faults["opens"] == 4 and logger.write_errors == 3
+    assert "可能正在被 Excel 開啟中" in capsys.readouterr().out
+    _assert_written_once(logger, 6)
+
+
+def test_close_gives_up_after_close_retries_and_reports_dropped_rows(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "trades.csv"
+    faults = _inject(monkeypatch, open_errors=10**6)
+    logger = _logger(path)
+    logger.close_retries = 2
+    _log_trades(logger, 5)
+    logger.close()
+    # 關閉前的重試加上 close_retries + 1 次關閉時嘗試
+    assert faults["opens"] == logger.write_errors and logger.write_errors >= logger.close_retries + 1
+    assert "遺失 5 筆交易紀錄" in capsys.readouterr().out
+    _assert_written_once(logger, 0)
@@ -0,0 +1,44 @@
+# strategy_v4/tests/test_walkforward_tester.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from Optimizer import WORKER
+from ParamsStore import ParamsStore
+from WalkforwardTester import WalkforwardTester
+
+
+@pytest.fixture
+def five_days(make_ticks):
+    ticks = []
+    for day in range(5):
+        ticks += make_ticks(3000, seed=11 + day, start=datetime(2025, 11, 10, 8, 45, 0) + timedelta(days=day))
+    return ticks
+
+
+def test_reruns_hit_the_fold_cache_and_new_days_add_one_fold(tmp_path, five_days):
+    def tester():
+        return WalkforwardTester(tmp_path / "params.json", tmp_path / "missing.json", output_dir=str(tmp_path / "reports"),
+                                 cache_dir=tmp_path / "cache", workers=2)
+
+    four_days = five_days[:12000]
+    first = tester().run_walkforward(four_days, segment_size="day", train_segments=2)
+    again = tester().run_walkforward(four_days, segment_size="day", train_segments=2)
+    assert first and [r["avg_pnl"] for r in first] == [r["avg_pnl"] for r in again]
+    more = tester().run_walkforward(five_days, segment_size="day", train_segments=2)
+    assert len(more) == len(first) + 1
+    assert ParamsStore(tmp_path / "params.json").get_version().startswith("wf-live-")
+    assert not WORKER
+
+
+def test_single_process_matches_pool(tmp_path, five_days):
+    results = [
+        WalkforwardTester(tmp_path / f"params_{workers}.json", tmp_path / "missing.json",
+                          output_dir=str(tmp_path / f"reports_{workers}"), cache_dir=tmp_path / f"cache_{workers}",
+                          workers=workers).run_walkforward(five_days[:9000], segment_size="day", train_segments=1)
+        for workers in (1, 2)
+    ]
+    strip = [[{k: v for k, v in r.items() if k != "elapsed"} for r in rows] for rows in results]
+    assert strip[0] == strip[1]
+    assert not WORKER